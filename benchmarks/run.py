@@ -0,0 +1,287 @@
+"""
+Benchmarks for the hot paths of PySS: loading, validating and planning
+configuration files, evaluating environment variables and running scripts
+end to end with no-op commands.
+
+    $ python benchmarks/run.py
+    $ python benchmarks/run.py --save benchmarks/baseline.json
+    $ python benchmarks/run.py --compare benchmarks/baseline.json --threshold 0.25
+
+Every stage is run a number of times and reported with its median time.
+The peak memory allocated during the stage is measured in a separate run
+with tracemalloc, so that tracing does not distort the timings. When
+comparing against a baseline, the exit code is 1 if the median time or
+the peak memory of any stage regressed by more than the threshold.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+VARIABLES = 20
+VARIABLES_PER_COMMAND = 50
+
+
+def __command(index: int) -> str:
+    # 'true' ignores its arguments, so the commands can be run end to end.
+    variables = " ".join(
+        f"${{VAR_{(index + position) % VARIABLES}}}"
+        for position in range(VARIABLES_PER_COMMAND)
+    )
+    return f"true {variables}"
+
+
+def __environment() -> dict[str, str]:
+    return {f"VAR_{index}": f"value-{index}" for index in range(VARIABLES)}
+
+
+def generate_flat(size: int) -> str:
+    """
+    Returns a configuration with the given number of independent scripts.
+    """
+    lines = ["pyss:", "  min_version: 0.0.1", "env:"]
+    lines += [f"  {name}: {value}" for name, value in __environment().items()]
+    lines.append("scripts:")
+    for index in range(size):
+        lines += [
+            f"  - name: script-{index}",
+            f"    description: Script number {index}.",
+            "    env:",
+            f"      INDEX: {index}",
+            f"    command: {json.dumps(__command(index))}",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def generate_deep(size: int) -> str:
+    """
+    Returns a configuration in which script-0 depends on a chain of the
+    given number of scripts through alternating before/after references.
+    """
+    lines = ["env:"]
+    lines += [f"  {name}: {value}" for name, value in __environment().items()]
+    lines.append("scripts:")
+    for index in range(size + 1):
+        lines += [f"  - name: script-{index}"]
+        lines += ["    description: Entry point."] if index == 0 else []
+        lines += ["    internal: true"] if index > 0 else []
+        if index < size:
+            key = "before" if index % 2 == 0 else "after"
+            lines += [f"    {key}: script-{index + 1}"]
+        lines += [f"    command: {json.dumps(__command(index))}"]
+    return "\n".join(lines) + "\n"
+
+
+def generate_wide(size: int) -> str:
+    """
+    Returns a configuration in which script-0 runs the given number of
+    scripts before itself and runs one command after itself.
+    """
+    lines = ["env:"]
+    lines += [f"  {name}: {value}" for name, value in __environment().items()]
+    lines += [
+        "scripts:",
+        "  - name: script-0",
+        "    description: Entry point.",
+        "    before:",
+    ]
+    lines += [f"      - script-{index}" for index in range(1, size + 1)]
+    lines += ["    after:", '      - "true"', '    command: "true"']
+    for index in range(1, size + 1):
+        lines += [
+            f"  - name: script-{index}",
+            "    internal: true",
+            f"    command: {json.dumps(__command(index))}",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def __stages(directory: str) -> dict[str, tuple]:
+    """
+    Returns the stages to measure as (setup, run) pairs. setup is called
+    before every repetition and its result is passed to run.
+    """
+    from pyss._scripts import get_pyss_file, get_scripts, load_pyss_file
+    from pyss._validator import validate_pyss_data
+    from pyss._environment import Environment, evaluate_environment_variables
+    from pyss._execution import run_pyss
+    from pyss._types import PyssCfg
+    from pyss._plan import Plan
+
+    file_location = os.path.join(directory, "pyss.yaml")
+
+    def loaded():
+        return load_pyss_file(file_location, use_cache=False)
+
+    def validated():
+        return get_scripts(loaded())
+
+    def evaluate(scripts):
+        env = Environment.from_os().layer(scripts.pyss_file.env)
+        for script in scripts:
+            evaluate_environment_variables(
+                script["command"], env.layer(script.get("env"))
+            )
+
+    def run(scripts):
+        cfg = PyssCfg(scripts, "script-0", quiet=True, disable_output=True)
+        exit_code = run_pyss(cfg)
+        assert exit_code == 0, f"run_pyss() returned {exit_code}"
+
+    return {
+        "get_pyss_file": (lambda: None, lambda _: get_pyss_file(use_cache=False)),
+        "get_pyss_file (cached)": (
+            lambda: get_scripts(load_pyss_file(file_location)),
+            lambda _: get_pyss_file(),
+        ),
+        "validate_pyss_data": (lambda: dict(loaded()), validate_pyss_data),
+        "get_scripts": (loaded, get_scripts),
+        "plan": (validated, lambda scripts: Plan(scripts).resolve("script-0")),
+        "evaluate_environment_variables": (validated, evaluate),
+        "run_pyss": (validated, run),
+    }
+
+
+def __measure(setup, run, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        argument = setup()
+        started = time.perf_counter()
+        run(argument)
+        times.append(time.perf_counter() - started)
+
+    argument = setup()
+    tracemalloc.start()
+    try:
+        run(argument)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"median": statistics.median(times), "min": min(times), "peak": peak}
+
+
+def run_benchmarks(
+    sizes: list[int], graph_size: int, repeat: int, stages: list[str] | None
+) -> dict[str, dict]:
+    configs = {f"flat-{size}": generate_flat(size) for size in sizes}
+    if graph_size > 0:
+        configs[f"deep-{graph_size}"] = generate_deep(graph_size)
+        configs[f"wide-{graph_size}"] = generate_wide(graph_size)
+
+    results = {}
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as root:
+        os.environ["PYSS_CACHE_DIR"] = os.path.join(root, ".cache")
+        for name, content in configs.items():
+            directory = os.path.join(root, name)
+            os.makedirs(directory)
+            with open(os.path.join(directory, "pyss.yaml"), "w") as pyss_yaml:
+                pyss_yaml.write(content)
+
+            os.chdir(directory)
+            try:
+                for stage, (setup, run) in __stages(directory).items():
+                    if stages and stage not in stages:
+                        continue
+                    result = __measure(setup, run, repeat)
+                    results[f"{name}/{stage}"] = result
+                    print(
+                        f"{name:<12} {stage:<32} "
+                        f"{result['median'] * 1000:>10.2f}ms "
+                        f"{result['peak'] / (1 << 20):>9.2f}MiB",
+                        flush=True,
+                    )
+            finally:
+                os.chdir(working_directory)
+
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Returns a description of every stage whose median time or peak memory
+    exceeds the baseline by more than the threshold (e.g. 0.2 for 20%).
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric in ["median", "peak"]:
+            before, after = baseline[name][metric], result[metric]
+            if before > 0 and after > before * (1 + threshold):
+                regressions.append(
+                    f"{name}: {metric} {before:.6g} -> {after:.6g} "
+                    f"(+{(after / before - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks for PySS.")
+    parser.add_argument(
+        "--sizes",
+        default="10,1000,10000",
+        help="comma separated numbers of scripts of the flat configurations",
+    )
+    parser.add_argument(
+        "--graph-size",
+        type=int,
+        default=100,
+        help="number of scripts of the deep and wide dependency graphs (0 to skip)",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--stage", action="append", help="only run this stage")
+    parser.add_argument("--save", metavar="FILE", help="save the results as a baseline")
+    parser.add_argument(
+        "--compare", metavar="FILE", help="compare the results with a baseline"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="allowed regression relative to the baseline (default: 0.2)",
+    )
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(
+        [int(size) for size in args.sizes.split(",") if size],
+        args.graph_size,
+        args.repeat,
+        args.stage,
+    )
+
+    if args.save:
+        with open(args.save, "w") as baseline_file:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "results": results,
+                },
+                baseline_file,
+                indent=2,
+            )
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
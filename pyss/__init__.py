@@ -0,0 +1,39 @@
+"""
+PySS: Python Script Support Tool.
+
+The attributes below are imported on first access, so that importing the
+package (e.g. to run the command line interface) stays cheap.
+"""
+
+__all__ = [
+    "PyssCfg",
+    "Cancellation",
+    "load_pyss_file",
+    "get_scripts",
+    "run_pyss",
+    "run_pyss_async",
+]
+
+__modules = {
+    "PyssCfg": "pyss._types",
+    "Cancellation": "pyss._types",
+    "load_pyss_file": "pyss._scripts",
+    "get_scripts": "pyss._scripts",
+    "run_pyss": "pyss._execution",
+    "run_pyss_async": "pyss._async_execution",
+}
+
+
+def __getattr__(name: str):
+    if name not in __modules:
+        raise AttributeError(f"module 'pyss' has no attribute '{name}'")
+
+    import importlib
+
+    value = getattr(importlib.import_module(__modules[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted({*globals(), *__all__})
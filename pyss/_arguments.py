@@ -1,9 +1,33 @@
 import argparse
 
-from importlib.metadata import version as app_version
+from pyss._constants import OUTPUT_MODES
 
 
-def parse_arguments() -> tuple[argparse.Namespace, lambda: None]:
+class VersionAction(argparse.Action):
+    """
+    Prints the program version. The version is only resolved when the
+    option is used, keeping importlib.metadata off the startup path.
+    """
+
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, help=None):
+        super(VersionAction, self).__init__(
+            option_strings=option_strings,
+            dest=dest,
+            default=argparse.SUPPRESS,
+            nargs=0,
+            help=help,
+        )
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        from pyss._version import pyss_version
+
+        print(f"{parser.prog} v{pyss_version()}")
+        parser.exit()
+
+
+def parse_arguments(
+    argv: list[str] | None = None,
+) -> tuple[argparse.Namespace, lambda: None]:
     parser = argparse.ArgumentParser(
         prog="pyss",
         usage="%(prog)s [options] [script_name]",
@@ -31,6 +55,14 @@ def parse_arguments() -> tuple[argparse.Namespace, lambda: None]:
         action="store_true",
         help="execute the script without any output",
     )
+    parser.add_argument(
+        "--output",
+        choices=OUTPUT_MODES,
+        default="stream",
+        metavar="MODE",
+        help="stream the output of commands ('stream', the default), show it "
+        "only for commands that fail ('on-failure') or discard it ('silent')",
+    )
     parser.add_argument(
         "-q",
         "--quiet",
@@ -38,16 +70,108 @@ def parse_arguments() -> tuple[argparse.Namespace, lambda: None]:
         help="execute the script while omitting the [pyss] header messages",
     )
 
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        metavar="N",
+        help="run dependency lists in parallel with at most N concurrent commands",
+    )
+
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="run scripts even if their outputs are up to date",
+    )
+
+    parser.add_argument(
+        "-w",
+        "--watch",
+        action="store_true",
+        help="run the script again whenever the files it watches change",
+    )
+
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="run the script in every member of the workspace that defines it",
+    )
+
+    parser.add_argument(
+        "--filter",
+        action="append",
+        metavar="GLOB",
+        help="run the script in the workspace members whose paths match GLOB",
+    )
+
+    parser.add_argument(
+        "--executor",
+        metavar="BACKEND",
+        help="run commands locally ('local', the default) or on pyss workers "
+        "('workers:HOST[:PORT],...' or 'workers:unix:PATH,...')",
+    )
+
+    parser.add_argument(
+        "--insecure",
+        action="store_true",
+        help="let ':worker' listen on an address other hosts can reach "
+        "without a token",
+    )
+
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="print the critical path of the script and an estimate of how "
+        "long it takes with -j",
+    )
+
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print a summary of where the time of the run was spent",
+    )
+
+    parser.add_argument(
+        "--trace-file",
+        metavar="FILE",
+        help="write a trace of the run in the Chrome Trace Event format",
+    )
+
+    parser.add_argument(
+        "--result-cache",
+        metavar="LOCATION",
+        help="directory or HTTP URL used to cache the results of scripts",
+    )
+
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="run in this process even if a pyss daemon is available",
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="do not read or write the compiled configuration cache",
+    )
+
     parser.add_argument(
         "-v",
         "--version",
         help="prints the program version to stdout",
-        action="version",
-        version=f"%(prog)s v{app_version('pyss')}",
+        action=VersionAction,
     )
 
     parser.add_argument(
         "script_name", nargs="?", help="the name of the script to execute"
     )
 
-    return parser.parse_args(), lambda: parser.print_help()
+    parser.add_argument(
+        "arguments",
+        nargs="*",
+        help="arguments for built-in commands (e.g. 'pyss :cache clear', "
+        "'pyss :stats build', 'pyss :worker HOST:PORT')",
+    )
+
+    return parser.parse_args(argv), lambda: parser.print_help()
@@ -0,0 +1,206 @@
+import os
+import sys
+import asyncio
+import subprocess
+
+from pyss._types import PyssCfg, _terminate
+from pyss._output import PrefixedOutput, CapturedOutput
+from pyss._profile import wait_with_usage
+from pyss._session import ShellSession
+from pyss._environment import Environment
+from pyss._constants import RESULT_CACHE_MAX_STDOUT
+from pyss._execution import (
+    Engine,
+    communicate,
+    run_remote,
+    write_stdout,
+)
+
+
+async def run_pyss_async(cfg: PyssCfg) -> int:
+    """
+    Runs the script of the configuration like run_pyss(), but on the
+    running event loop: commands are awaited instead of blocking a thread,
+    so many scripts can run concurrently without a thread for each.
+
+    The number of concurrent commands is limited by cfg.job_slots if it is
+    an asyncio.Semaphore (which allows sharing a limit between runs), or by
+    cfg.max_jobs() otherwise. Cancelling the task terminates the commands
+    that are running, along with the processes they started.
+    """
+    return await AsyncEngine().run(cfg)
+
+
+class AsyncEngine(Engine):
+    """
+    Runs scripts on the running event loop. Commands start in a session of
+    their own, so that cancelling the task terminates their whole process
+    group.
+    """
+
+    def new_session(self, cfg: PyssCfg) -> bool:
+        return os.name == "posix"
+
+    def prepare(self, cfg: PyssCfg) -> PyssCfg:
+        cfg = super().prepare(cfg)
+        if not isinstance(cfg.job_slots, asyncio.Semaphore):
+            cfg = cfg.derive(job_slots=asyncio.Semaphore(cfg.max_jobs()))
+        return cfg
+
+    async def blocking(self, function, *args):
+        return await asyncio.to_thread(function, *args)
+
+    async def cleanup(self, function, *args):
+        return await asyncio.shield(asyncio.to_thread(function, *args))
+
+    async def acquire(self, job_slots):
+        await job_slots.acquire()
+
+    async def gather(self, jobs: list, workers: int):
+        remaining = iter(jobs)
+
+        async def worker():
+            for job in remaining:
+                await job()
+
+        await asyncio.gather(*(worker() for _ in range(max(workers, 1))))
+
+    async def communicate(
+        self,
+        cfg: PyssCfg,
+        proc: subprocess.Popen,
+        command_span,
+        captured: CapturedOutput | None,
+        multiplexed: bool,
+        capture: bytearray | None,
+    ) -> int:
+        if os.name != "posix":
+            return await self.__shielded(
+                proc,
+                asyncio.to_thread(
+                    communicate, cfg, proc, command_span, captured, multiplexed, capture
+                ),
+            )
+
+        outputs = []
+        if multiplexed:
+            outputs = [
+                PrefixedOutput(cfg.prefix, sys.stdout),
+                PrefixedOutput(cfg.prefix, sys.stderr),
+            ]
+
+        def on_stdout(data: bytes):
+            if capture is not None and len(capture) < RESULT_CACHE_MAX_STDOUT:
+                capture.extend(data)
+            if captured is not None:
+                captured.write(data)
+            elif multiplexed:
+                outputs[0].feed(data)
+            elif not cfg.disable_output:
+                write_stdout(data)
+
+        on_stderr = outputs[1].feed if multiplexed else None
+        if captured is not None:
+            on_stderr = captured.write
+
+        streams = [(proc.stdout, on_stdout), (proc.stderr, on_stderr)]
+        try:
+            await asyncio.gather(
+                *(_pump(stream, handler) for stream, handler in streams if stream)
+            )
+        except asyncio.CancelledError:
+            _terminate(proc, False)
+            await asyncio.shield(asyncio.to_thread(proc.wait))
+            raise
+        finally:
+            for output in outputs:
+                output.close()
+
+        return await self.__shielded(proc, _wait(proc, command_span))
+
+    async def __shielded(self, proc: subprocess.Popen, waiting) -> int:
+        """
+        Awaits the coroutine waiting for the process. If the task is
+        cancelled, the process group is terminated and waited for.
+        """
+        waiting = asyncio.ensure_future(waiting)
+        try:
+            return await asyncio.shield(waiting)
+        except asyncio.CancelledError:
+            _terminate(proc, False)
+            await waiting
+            raise
+
+    async def run_in_session(self, session: ShellSession, command: str) -> int:
+        running = asyncio.ensure_future(asyncio.to_thread(session.run, command))
+        try:
+            return await asyncio.shield(running)
+        except asyncio.CancelledError:
+            _terminate(session.proc, False)
+            await running
+            raise
+
+    async def run_remote(
+        self,
+        cfg: PyssCfg,
+        command: str,
+        argv: list[str] | None,
+        shell: str | None,
+        env: Environment,
+        capture: bytearray | None,
+        resolve: bool,
+    ) -> int:
+        from pyss._workers import RemoteCommand
+
+        remote = RemoteCommand()
+        running = asyncio.ensure_future(
+            asyncio.to_thread(
+                run_remote, cfg, command, argv, shell, env, capture, remote, resolve
+            )
+        )
+        try:
+            return await asyncio.shield(running)
+        except asyncio.CancelledError:
+            remote.terminate()
+            await running
+            raise
+
+
+async def _pump(stream, handler):
+    """
+    Passes the data read from the pipe of a process to the handler until
+    the process closes it, without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    transport, _ = await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), stream
+    )
+    try:
+        while chunk := await reader.read(1 << 16):
+            handler(chunk)
+    finally:
+        transport.close()
+
+
+async def _wait(proc: subprocess.Popen, command_span) -> int:
+    """
+    Waits for the process to exit and reaps it with wait_with_usage(), so
+    that its resource usage is recorded like with the SyncEngine. Where
+    pidfds are available the event loop is told when the process exits;
+    otherwise a thread waits for it.
+    """
+    try:
+        pidfd = os.pidfd_open(proc.pid)
+    except (AttributeError, OSError):
+        return await asyncio.to_thread(wait_with_usage, proc, command_span)
+
+    loop = asyncio.get_running_loop()
+    exited = loop.create_future()
+    loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+    try:
+        await exited
+    finally:
+        loop.remove_reader(pidfd)
+        os.close(pidfd)
+    return wait_with_usage(proc, command_span)
@@ -0,0 +1,157 @@
+import os
+import sys
+import pickle
+import hashlib
+
+from pyss._version import pyss_version
+from pyss._constants import CACHE_DIRECTORY_ENV, CONFIG_CACHE_FORMAT
+
+
+def get_cache_directory() -> str:
+    """
+    Returns the directory in which PySS stores its caches. This can be
+    overridden with the PYSS_CACHE_DIR environment variable.
+    """
+    cache_directory = os.environ.get(CACHE_DIRECTORY_ENV)
+    if cache_directory:
+        return cache_directory
+
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser(
+            os.path.join("~", "AppData", "Local")
+        )
+    elif sys.platform == "darwin":
+        base = os.path.expanduser(os.path.join("~", "Library", "Caches"))
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(
+            os.path.join("~", ".cache")
+        )
+
+    return os.path.join(base, "pyss")
+
+
+def config_cache_key(file_location: str, content: bytes, stat: os.stat_result):
+    """
+    Builds the key identifying a compiled configuration file. A cached
+    entry is only used when every field of the key matches, and the files
+    it includes, stored under "includes" once the file has been parsed,
+    have not changed either.
+    """
+    return {
+        "format": CONFIG_CACHE_FORMAT,
+        "path": os.path.abspath(file_location),
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha256": hashlib.sha256(content).hexdigest(),
+        "version": pyss_version(),
+    }
+
+
+def file_stats(locations: list[str]) -> tuple:
+    """
+    Returns the location, modification time and size of each file, with
+    None for the time and size of the files that can not be read.
+    """
+    stats = []
+    for location in locations:
+        try:
+            stat = os.stat(location)
+        except OSError:
+            stats.append((location, None, None))
+        else:
+            stats.append((location, stat.st_mtime_ns, stat.st_size))
+    return tuple(stats)
+
+
+def __config_cache_location(key: dict) -> str:
+    name = hashlib.sha256(key["path"].encode("utf-8")).hexdigest()
+    return os.path.join(get_cache_directory(), "config", f"{name}.pickle")
+
+
+def load_cached_config(key: dict) -> tuple[dict, bool, set | None] | None:
+    """
+    Loads the parsed configuration stored for the key, along with whether
+    all of it has been validated and the names of the scripts validated
+    on their own, or returns None if there is no usable entry.
+    """
+    try:
+        with open(__config_cache_location(key), "rb") as cache_file:
+            entry = pickle.load(cache_file)
+    except Exception:
+        return None
+
+    if not isinstance(entry, dict) or not isinstance(entry.get("key"), dict):
+        return None
+
+    stored = dict(entry["key"])
+    includes = stored.pop("includes", ())
+    if stored != key or file_stats([stat[0] for stat in includes]) != includes:
+        return None
+
+    valid_scripts = entry.get("valid_scripts")
+    return (
+        entry.get("data"),
+        entry.get("validated", False),
+        None if valid_scripts is None else set(valid_scripts),
+    )
+
+
+def store_cached_config(
+    key: dict, data: dict, validated: bool = True, valid_scripts: set | None = None
+):
+    """
+    Stores the parsed configuration for the key, along with whether all
+    of it has been validated, or only the parts runs needed: its outline
+    and the scripts in valid_scripts. The entry is written to a temporary
+    file and moved into place so concurrent runs never observe a
+    partially written cache.
+    """
+    cache_location = __config_cache_location(key)
+    cache_directory = os.path.dirname(cache_location)
+
+    import tempfile
+
+    try:
+        os.makedirs(cache_directory, exist_ok=True)
+        fd, temp_location = tempfile.mkstemp(dir=cache_directory, prefix=".tmp-")
+    except OSError:
+        return
+
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            pickle.dump(
+                {
+                    "key": key,
+                    "data": data,
+                    "validated": validated,
+                    "valid_scripts": (
+                        None if valid_scripts is None else sorted(valid_scripts)
+                    ),
+                },
+                temp_file,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(temp_location, cache_location)
+    except Exception:
+        try:
+            os.remove(temp_location)
+        except OSError:
+            pass
+
+
+def clear_cache() -> int:
+    """
+    Removes every cached configuration and returns the number of entries
+    that were removed.
+    """
+    import shutil
+
+    config_directory = os.path.join(get_cache_directory(), "config")
+    if not os.path.isdir(config_directory):
+        return 0
+
+    removed = sum(
+        1 for entry in os.listdir(config_directory) if entry.endswith(".pickle")
+    )
+    shutil.rmtree(config_directory, ignore_errors=True)
+    return removed
@@ -1,4 +1,51 @@
-FILE_LOCATION_PATTERN = r"pyss\.(yml|yaml)$"
+FILE_LOCATION_PATTERN = r"pyss\.(yml|yaml|json)$"
+
+# Configuration can also live in the [tool.pyss] table of pyproject.toml.
+PYPROJECT_FILE = "pyproject.toml"
+PYPROJECT_SECTION_PATTERN = r"^\s*\[+\s*tool\s*\.\s*pyss\s*[.\]]"
+
+CACHE_DIRECTORY_ENV = "PYSS_CACHE_DIR"
+CONFIG_CACHE_FORMAT = 4
+
+RESULT_CACHE_ENV = "PYSS_RESULT_CACHE"
+RESULT_CACHE_SIZE_ENV = "PYSS_RESULT_CACHE_SIZE"
+RESULT_CACHE_DEFAULT_SIZE = 1 << 30
+RESULT_CACHE_MAX_STDOUT = 16 << 20
+RESULT_CACHE_FORMAT = 1
+RESULT_CACHE_TIMEOUT = 10
+
+OUTPUT_LINE_LIMIT = 64 << 10
+OUTPUT_MODES = ["stream", "on-failure", "silent"]
+OUTPUT_CAPTURE_ENV = "PYSS_OUTPUT_CAPTURE_SIZE"
+OUTPUT_CAPTURE_DEFAULT_SIZE = 16 << 20
+OUTPUT_CAPTURE_MEMORY = 1 << 20
+
+DAEMON_SOCKET_ENV = "PYSS_DAEMON_SOCKET"
+NO_DAEMON_ENV = "PYSS_NO_DAEMON"
+DAEMON_START_TIMEOUT = 5
+
+WATCH_POLL_ENV = "PYSS_WATCH_POLL"
+WATCH_POLL_INTERVAL = 0.5
+WATCH_DEBOUNCE = 0.2
+WATCH_KILL_TIMEOUT = 5
+
+WORKSPACE_INDEX_FORMAT = 1
+
+# Runs are recorded in <project>/.pyss/history.sqlite3.
+HISTORY_DIRECTORY = ".pyss"
+HISTORY_FILE = "history.sqlite3"
+HISTORY_ENV = "PYSS_HISTORY"
+HISTORY_FORMAT = 2
+HISTORY_TIMEOUT = 5
+HISTORY_STATS_RUNS = 50
+
+# Durations such as '90s', '1m30s', '1.5h' or '250ms'.
+DURATION_PATTERN = r"^\s*(\d+(\.\d+)?\s*(ms|s|m|h)\s*)+$"
+
+WORKER_ENV = "PYSS_WORKER"
+WORKER_TOKEN_ENV = "PYSS_WORKER_TOKEN"
+WORKER_PORT = 7341
+WORKER_CONNECT_TIMEOUT = 5
 
 NOT_FOUND_COLOR = "red"
 FOUND_COLOR = "green"
@@ -0,0 +1,440 @@
+import os
+import sys
+
+from pyss._cache import get_cache_directory
+from pyss._logging import log_error, log_info
+from pyss._constants import DAEMON_SOCKET_ENV, NO_DAEMON_ENV, DAEMON_START_TIMEOUT
+
+FORWARDED_SIGNALS = ["SIGINT", "SIGTERM", "SIGHUP", "SIGQUIT"]
+
+
+def get_socket_location() -> str:
+    """
+    Returns the location of the Unix domain socket the daemon listens on.
+    This can be overridden with the PYSS_DAEMON_SOCKET environment variable.
+    """
+    return os.environ.get(DAEMON_SOCKET_ENV) or os.path.join(
+        get_cache_directory(), "daemon.sock"
+    )
+
+
+def is_supported() -> bool:
+    """
+    Returns True if the platform supports running scripts in the daemon,
+    which requires fork() and file descriptor passing over Unix sockets.
+    """
+    import socket
+
+    return hasattr(os, "fork") and hasattr(socket, "send_fds")
+
+
+class Channel:
+    """
+    Exchanges newline delimited JSON messages over a Unix domain socket.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.buffer = bytearray()
+
+    def send(self, message: dict, fds: list[int] | None = None):
+        import json
+        import socket
+
+        data = json.dumps(message).encode("utf-8") + b"\n"
+        if fds:
+            sent = socket.send_fds(self.connection, [data], fds)
+            data = data[sent:]
+        if data:
+            self.connection.sendall(data)
+
+    def receive(self, maxfds: int = 0) -> tuple[dict | None, list[int]]:
+        """
+        Returns the next message along with any file descriptors that
+        were passed with it. Returns None as the message once the other
+        side has closed the connection.
+        """
+        import json
+        import socket
+
+        fds = []
+        while b"\n" not in self.buffer:
+            if maxfds > 0:
+                data, received_fds, _, _ = socket.recv_fds(
+                    self.connection, 1 << 16, maxfds
+                )
+                fds.extend(received_fds)
+                maxfds -= len(received_fds)
+            else:
+                data = self.connection.recv(1 << 16)
+            if not data:
+                return None, fds
+            self.buffer.extend(data)
+
+        line, _, rest = bytes(self.buffer).partition(b"\n")
+        self.buffer = bytearray(rest)
+        return json.loads(line), fds
+
+
+def __connect(location: str):
+    import socket
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(location)
+    except OSError:
+        connection.close()
+        return None
+    return connection
+
+
+def run_in_daemon(argv: list[str]) -> int | None:
+    """
+    Forwards the invocation to a running daemon along with the working
+    directory, the environment and the standard streams, then waits for
+    it to finish. Returns the exit code of the script, or None if no
+    daemon is available and the invocation should run in this process.
+    """
+    if os.environ.get(NO_DAEMON_ENV) or not hasattr(os, "fork"):
+        return None
+
+    location = get_socket_location()
+    if not os.path.exists(location) or not is_supported():
+        return None
+
+    connection = __connect(location)
+    if connection is None:
+        return None
+
+    import signal
+
+    with connection:
+        channel = Channel(connection)
+        request = {
+            "type": "run",
+            "argv": argv,
+            "cwd": os.getcwd(),
+            "env": dict(os.environ),
+        }
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        try:
+            channel.send(request, fds=[0, 1, 2])
+        except OSError:
+            return None
+
+        def forward_signal(signum, frame):
+            try:
+                channel.send({"type": "signal", "signal": signum})
+            except OSError:
+                pass
+
+        for name in FORWARDED_SIGNALS:
+            signal.signal(getattr(signal, name), forward_signal)
+
+        try:
+            response, _ = channel.receive()
+        except (OSError, ValueError):
+            response = None
+
+    if response is None:
+        log_error("The pyss daemon closed the connection unexpectedly.")
+        return 1
+
+    return response["exit_code"]
+
+
+class Daemon:
+    """
+    A resident server that keeps parsed and validated configuration files
+    in memory and runs scripts on behalf of clients. Every run happens in
+    a forked worker process, which inherits the loaded modules and
+    configurations and takes over the client's standard streams.
+    """
+
+    location: str
+    configs: dict[str, tuple[tuple, any]]
+
+    def __init__(self, location: str):
+        self.location = location
+        self.configs = {}
+
+    def serve(self):
+        import socket
+        import signal
+
+        # Forked workers are reaped automatically.
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+        # Load everything a run needs once, so workers start warm.
+        import pyss.main  # noqa: F401
+        import pyss._execution  # noqa: F401
+        import sqlite3  # noqa: F401
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        os.makedirs(os.path.dirname(os.path.abspath(self.location)), exist_ok=True)
+        if os.path.exists(self.location):
+            os.remove(self.location)
+
+        umask = os.umask(0o077)
+        try:
+            server.bind(self.location)
+        finally:
+            os.umask(umask)
+        server.listen()
+
+        log_info("daemon", f"Listening on {self.location} (pid {os.getpid()})")
+        sys.stdout.flush()
+
+        try:
+            while True:
+                connection, _ = server.accept()
+                try:
+                    if not self.__handle(connection):
+                        break
+                except Exception as e:
+                    log_error(e, title="Daemon Error")
+                finally:
+                    connection.close()
+        finally:
+            server.close()
+            try:
+                os.remove(self.location)
+            except OSError:
+                pass
+
+    def __handle(self, connection) -> bool:
+        channel = Channel(connection)
+        message, fds = channel.receive(maxfds=3)
+        if message is None:
+            return True
+
+        if message["type"] == "status":
+            channel.send({"pid": os.getpid(), "configs": sorted(self.configs)})
+        elif message["type"] == "stop":
+            channel.send({"pid": os.getpid()})
+            return False
+        elif message["type"] == "run" and len(fds) == 3:
+            pyss_file = self.__load(message["cwd"])
+            if os.fork() == 0:
+                exit_code = 1
+                try:
+                    exit_code = _run_worker(channel, message, fds, pyss_file)
+                finally:
+                    os._exit(exit_code)
+
+        for fd in fds:
+            os.close(fd)
+        return True
+
+    def __load(self, cwd: str):
+        """
+        Returns the validated configuration file for the directory from
+        memory, reloading it if the file has changed. Returns None if the
+        file can not be loaded, in which case the worker loads it itself
+        and reports any errors to the client.
+        """
+        import io
+        import contextlib
+
+        from pyss._scripts import find_pyss_file, load_pyss_file, get_scripts
+
+        file_location = find_pyss_file(cwd)
+        if file_location is None:
+            return None
+
+        try:
+            stat = os.stat(file_location)
+        except OSError:
+            return None
+
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_location in self.configs:
+            cached_key, pyss_file = self.configs[file_location]
+            if cached_key == key + self.__include_stats(pyss_file):
+                return pyss_file
+
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                pyss_file = load_pyss_file(file_location)
+                get_scripts(pyss_file, scoped=True)
+        except (SystemExit, Exception):
+            self.configs.pop(file_location, None)
+            return None
+
+        self.configs[file_location] = (key + self.__include_stats(pyss_file), pyss_file)
+        return pyss_file
+
+    def __include_stats(self, pyss_file) -> tuple:
+        # The files a configuration includes are part of it, so editing one
+        # of them invalidates the configuration as well.
+        if not pyss_file.header.include:
+            return ()
+
+        from pyss._cache import file_stats
+        from pyss._include import include_entries
+
+        return file_stats([location for location, _ in include_entries(pyss_file)])
+
+
+def _run_worker(channel: Channel, message: dict, fds: list[int], pyss_file) -> int:
+    import signal
+    import threading
+
+    # A new session detaches the worker from the daemon's terminal, so
+    # the client's terminal can be used without job control getting in
+    # the way, and gives the run its own process group for signals.
+    os.setsid()
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    for name in FORWARDED_SIGNALS[1:]:
+        signal.signal(getattr(signal, name), signal.SIG_DFL)
+
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+
+    sys.stdin = open(0, "r", closefd=False)
+    sys.stdout = open(1, "w", buffering=1 if os.isatty(1) else -1, closefd=False)
+    sys.stderr = open(2, "w", buffering=1, closefd=False, errors="backslashreplace")
+
+    os.chdir(message["cwd"])
+    os.environ.clear()
+    os.environ.update(message["env"])
+
+    def forward_signals():
+        while True:
+            try:
+                request, _ = channel.receive()
+            except (OSError, ValueError):
+                request = None
+            if request is None:
+                os.killpg(os.getpgrp(), signal.SIGHUP)
+                return
+            if request.get("type") == "signal":
+                os.killpg(os.getpgrp(), request["signal"])
+
+    threading.Thread(target=forward_signals, daemon=True).start()
+
+    from pyss.main import main
+
+    try:
+        main(["--no-daemon", *message["argv"]], pyss_file=pyss_file)
+        exit_code = 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            exit_code = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except KeyboardInterrupt:
+        exit_code = 128 + signal.SIGINT
+    except BaseException:
+        import traceback
+
+        traceback.print_exc()
+        exit_code = 1
+
+    for stream in [sys.stdout, sys.stderr]:
+        try:
+            stream.flush()
+        except (OSError, ValueError):
+            pass
+
+    try:
+        channel.send({"exit_code": exit_code})
+    except OSError:
+        pass
+
+    return exit_code
+
+
+def __request(message: dict) -> dict | None:
+    connection = __connect(get_socket_location())
+    if connection is None:
+        return None
+
+    with connection:
+        channel = Channel(connection)
+        channel.send(message)
+        response, _ = channel.receive()
+        return response
+
+
+def __start() -> int:
+    import time
+
+    if os.fork() == 0:
+        os.setsid()
+        if os.fork() != 0:
+            os._exit(0)
+
+        log_location = os.path.join(get_cache_directory(), "daemon.log")
+        os.makedirs(os.path.dirname(log_location), exist_ok=True)
+        log_fd = os.open(log_location, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        null_fd = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(null_fd, 0)
+        os.dup2(log_fd, 1)
+        os.dup2(log_fd, 2)
+
+        exit_code = 1
+        try:
+            Daemon(get_socket_location()).serve()
+            exit_code = 0
+        finally:
+            os._exit(exit_code)
+
+    deadline = time.monotonic() + DAEMON_START_TIMEOUT
+    while time.monotonic() < deadline:
+        status = __request({"type": "status"})
+        if status is not None:
+            log_info("daemon", f"Started (pid {status['pid']}).")
+            return 0
+        time.sleep(0.05)
+
+    log_error("The pyss daemon did not start in time.")
+    return 1
+
+
+def run_daemon_command(arguments: list[str]) -> int:
+    usage = "Usage: pyss :daemon start|run|stop|status"
+    if len(arguments) != 1:
+        log_error(usage)
+        return 1
+
+    if not is_supported():
+        log_error("The pyss daemon is not supported on this platform.")
+        return 1
+
+    command = arguments[0]
+    if command in ["start", "run"]:
+        status = __request({"type": "status"})
+        if status is not None:
+            log_error(f"The pyss daemon is already running (pid {status['pid']}).")
+            return 1
+        if command == "start":
+            return __start()
+        Daemon(get_socket_location()).serve()
+        return 0
+
+    if command == "stop":
+        response = __request({"type": "stop"})
+        if response is None:
+            log_error("The pyss daemon is not running.")
+            return 1
+        log_info("daemon", f"Stopped (pid {response['pid']}).")
+        return 0
+
+    if command == "status":
+        status = __request({"type": "status"})
+        if status is None:
+            log_info("daemon", "Not running.")
+            return 1
+        log_info("daemon", f"Running (pid {status['pid']}).")
+        for config in status["configs"]:
+            log_info("daemon", f"Loaded {config}")
+        return 0
+
+    log_error(usage)
+    return 1
@@ -1,33 +1,108 @@
 import os
 import re
+import sys
 
+from collections.abc import Mapping
 
-def prime_environment(env: dict[str, any]):
-    """
-    Prime the environment with the provided environment variables.
-    """
-    for key, value in env.items():
-        os.environ[key] = f"{value}"
 
+def _normalize_key(key: str) -> str:
+    # Environment variable names are case-insensitive on Windows.
+    return key.upper() if sys.platform == "win32" else key
 
-def clear_environment(env: dict[str, any]):
+
+class Environment(Mapping):
     """
-    Clear the environment of the provided environment variables.
+    An immutable scope of environment variables layered on top of a
+    parent scope. The merged mapping that is handed to child processes is
+    computed at most once per scope, and a scope without variables of its
+    own shares the mapping of its parent, so fanning out many commands in
+    one scope does not copy the environment for each of them.
     """
-    for key in env.keys():
-        os.environ.pop(key, None)
 
+    __slots__ = ("parent", "values", "_materialized")
+
+    parent: "Environment | None"
+    values: dict[str, str]
+
+    def __init__(self, values: dict[str, str], parent: "Environment | None" = None):
+        self.parent = parent
+        self.values = values
+        self._materialized = None
+
+    @staticmethod
+    def from_os() -> "Environment":
+        """
+        Returns a base scope containing a snapshot of os.environ.
+        """
+        return Environment({_normalize_key(k): v for k, v in os.environ.items()})
+
+    def layer(self, env: dict[str, any] | None) -> "Environment":
+        """
+        Returns a new scope in which the variables of env override the
+        variables of this scope. Returns this scope if env is empty.
+        """
+        if not env:
+            return self
+
+        return Environment(
+            {_normalize_key(key): f"{value}" for key, value in env.items()}, self
+        )
 
-def evaluate_environment_variables(input: str) -> str:
+    def layers(self) -> list[dict[str, str]]:
+        """
+        Returns the variables of each scope above the base scope, from the
+        outermost one.
+        """
+        layers = []
+        scope = self
+        while scope.parent is not None:
+            layers.append(scope.values)
+            scope = scope.parent
+        return layers[::-1]
+
+    def materialize(self) -> dict[str, str]:
+        """
+        Returns the merged mapping of this scope, suitable for passing to
+        subprocess.Popen(env=...). The mapping must not be modified.
+        """
+        if self._materialized is None:
+            if self.parent is None:
+                self._materialized = self.values
+            else:
+                self._materialized = {**self.parent.materialize(), **self.values}
+        return self._materialized
+
+    def __getitem__(self, key: str) -> str:
+        key = _normalize_key(key)
+        scope = self
+        while scope is not None:
+            if scope._materialized is not None:
+                return scope._materialized[key]
+            if key in scope.values:
+                return scope.values[key]
+            scope = scope.parent
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.materialize())
+
+    def __len__(self) -> int:
+        return len(self.materialize())
+
+
+def evaluate_environment_variables(input: str, env: Mapping | None = None) -> str:
     """
     Evaluates all environment variables in the input string and replaces
-    them with their respective values.
+    them with their respective values from env (os.environ by default).
     """
+    if env is None:
+        env = os.environ
+
     env_var_pattern = re.compile(r"\${([a-zA-Z_][a-zA-Z0-9_]*)}")
     env_vars = env_var_pattern.findall(input)
 
     for env_var in env_vars:
-        env_var_value = os.getenv(env_var)
+        env_var_value = env.get(env_var)
         if env_var_value is None:
             raise ValueError(f"Environment variable '{env_var}' not set.")
         input = input.replace(f"${{{env_var}}}", env_var_value)
@@ -1,174 +1,1016 @@
 import os
 import sys
 import re
+import functools
+import contextlib
+import contextvars
 import subprocess
 
-from termcolor import colored
+from abc import ABC, abstractmethod
 
-from pyss._logging import log_error, log_info
+from pyss._logging import log_error, log_info, colored
 
-from pyss._environment import (
-    prime_environment,
-    clear_environment,
-    evaluate_environment_variables,
-)
+from pyss._environment import Environment, evaluate_environment_variables
 
-from pyss._constants import ENV_VAR_COLOR, DETAIL_COLOR
+from pyss._freshness import is_up_to_date, record_state
+from pyss._constants import ENV_VAR_COLOR, DETAIL_COLOR, RESULT_CACHE_MAX_STDOUT
 from pyss._types import PyssCfg, Command
+from pyss._output import PrefixedOutput, CapturedOutput, pump, dependency_name
+from pyss._profile import span, current_span, wait_with_usage
+from pyss._history import script_hash, dependency_hash
+from pyss._schedule import run_estimates
+from pyss._matrix import matrix_label, run_matrix
+from pyss._session import (
+    ShellSession,
+    session_shell,
+    session_command,
+    runs_in_session,
+)
+from pyss._plan import (
+    Plan,
+    PlanError,
+    ScriptNode,
+    DependencyNode,
+    DependencyList,
+)
 
 
 def run_pyss(cfg: PyssCfg) -> int:
-    if not any(script["name"] == cfg.script_name for script in cfg.scripts):
-        log_error(f"Script '{cfg.script_name}' not found.")
-        return 1
+    return run_sync(SyncEngine().run(cfg))
+
+
+def cached_result_key(cfg: PyssCfg, script: ScriptNode) -> str | None:
+    """
+    Returns the result cache key of the script, or None if some of its
+    inputs are missing. Raises a ValueError if one of its commands uses
+    an environment variable that is not set.
+    """
+    from pyss._results import result_key
+
+    definition = script.definition
+    settings = definition["cache"] if isinstance(definition["cache"], dict) else {}
+
+    evaluated_commands = [
+        (
+            evaluate_environment_variables(
+                command.get(), cfg.env.layer(command.get_env())
+            ),
+            resolve_shell(cfg, command),
+        )
+        for command in script.commands
+    ]
+
+    matrix = script.matrix or {}
+    env_names = sorted(
+        set(script.env or {})
+        | set(matrix.get("env", {}))
+        | set(settings.get("env", []))
+    )
+    return result_key(
+        evaluated_commands,
+        {name: cfg.env.get(name) for name in env_names},
+        definition.get("inputs", []),
+        os.path.dirname(cfg.scripts.pyss_file.file_location),
+    )
 
-    script = next(script for script in cfg.scripts if script["name"] == cfg.script_name)
 
-    if not cfg.quiet and not cfg.disable_output:
-        log_info("run script", script["name"], DETAIL_COLOR)
+def write_stdout(data: bytes, stream=None):
+    stream = stream or sys.stdout
+    stream.flush()
+    buffer = getattr(stream, "buffer", None)
+    if buffer is not None:
+        buffer.write(data)
+        buffer.flush()
+    else:
+        stream.write(data.decode(errors="replace"))
+        stream.flush()
+
+
+def capture_output(cfg: PyssCfg) -> CapturedOutput | None:
+    """
+    Returns the buffer for the output of a command if it is only to be
+    shown when the command fails ('--output=on-failure').
+    """
+    if cfg.output_on_failure and not cfg.disable_output:
+        return CapturedOutput()
+    return None
+
+
+def show_captured(cfg: PyssCfg, captured: CapturedOutput):
+    """
+    Writes the captured output of a failed command, prefixed like it would
+    have been if it had been streamed.
+    """
+    if cfg.prefix is None:
+        for chunk in captured.chunks():
+            write_stdout(chunk)
+        return
+
+    output = PrefixedOutput(cfg.prefix, sys.stdout)
+    for chunk in captured.chunks():
+        output.feed(chunk)
+    output.close()
+
+
+def resolve_shell(cfg: PyssCfg, input: Command) -> str | None:
+    shell = None
+    if cfg.scripts.pyss_file.header.shell is not None:
+        shell = cfg.scripts.pyss_file.header.shell.get()
 
-    if "env" in script:
-        prime_environment(script["env"])
+    _cmd_shell = input.get_shell()
+    if _cmd_shell is not None:
+        shell = _cmd_shell.get()
 
-    if "before" in script:
-        exit_code = __execute_dependencies(cfg, script["before"])
-        if exit_code != 0:
-            return exit_code
+    return shell
+
+
+# Characters that make a command depend on the shell: pipes, redirects,
+# compound operators, substitutions, globs, escapes and comments.
+SHELL_METACHARACTERS = frozenset("|&;<>()$`\\*?[]{}~#!\n")
+
+# Commands that only exist in the shell or change its state, and the
+# shell's reserved words.
+SHELL_BUILTINS = frozenset(
+    [
+        ".",
+        ":",
+        "alias",
+        "break",
+        "case",
+        "cd",
+        "command",
+        "continue",
+        "do",
+        "done",
+        "elif",
+        "else",
+        "esac",
+        "eval",
+        "exec",
+        "exit",
+        "export",
+        "fi",
+        "for",
+        "function",
+        "getopts",
+        "hash",
+        "if",
+        "local",
+        "read",
+        "readonly",
+        "return",
+        "set",
+        "shift",
+        "source",
+        "then",
+        "time",
+        "times",
+        "trap",
+        "type",
+        "ulimit",
+        "umask",
+        "unalias",
+        "unset",
+        "until",
+        "wait",
+        "while",
+    ]
+)
 
-    commands: list[Command] = []
-    if "command" in script:
-        command = script["command"]
-        commands.append(Command(command))
-    elif "commands" in script:
-        for command in script["commands"]:
-            commands.append(Command(command))
 
-    for command in commands:
-        exit_code = __execute_command(cfg, command)
-        if exit_code != 0:
-            return exit_code
+def direct_argv(
+    cfg: PyssCfg, input: Command, command: str, env: Environment, resolve: bool = True
+) -> list[str] | None:
+    """
+    Returns the arguments to execute the evaluated command with directly,
+    without starting a shell, or None if it has to run in a shell.
+
+    Commands run directly if their command object says so ('exec: true'
+    or 'shell: false'). Otherwise, on POSIX systems without a custom
+    shell, a command runs directly if it contains no shell
+    metacharacters, does not start with a builtin or a variable
+    assignment, and its program can be found. Without resolve, the
+    program is not looked up, which is left to where the command runs,
+    see resolve_program().
+    """
+    import shlex
+
+    forced = input.get_exec()
+    if forced is False:
+        return None
+
+    if forced is None:
+        if os.name != "posix" or resolve_shell(cfg, input) is not None:
+            return None
+        if not SHELL_METACHARACTERS.isdisjoint(command):
+            return None
 
-    if "after" in script:
-        exit_code = __execute_dependencies(cfg, script["after"])
-        if exit_code != 0:
-            return exit_code
+    try:
+        argv = shlex.split(command)
+    except ValueError:
+        return None
 
-    if "env" in script:
-        clear_environment(script["env"])
+    if forced or not argv:
+        return argv or None
 
-    return exit_code
+    program = argv[0]
+    if program in SHELL_BUILTINS or "=" in program:
+        return None
 
+    if not resolve:
+        return argv
 
-def __execute_command(
-    cfg: PyssCfg,
-    input: Command,
-) -> int:
-    command = input.get()
+    root = os.path.dirname(cfg.scripts.pyss_file.file_location)
+    return resolve_program(argv, root, env.get("PATH", os.defpath))
 
-    try:
-        evaluated_script_command = evaluate_environment_variables(command)
-    except ValueError as e:
-        log_error(e)
-        return 1
 
-    pyss_directory = os.path.dirname(cfg.scripts.pyss_file.file_location)
+def resolve_program(argv: list[str], root: str, path: str) -> list[str] | None:
+    """
+    Returns the arguments if their program can be found, relative to the
+    root directory or on the path, or None otherwise. Missing programs
+    are left to the shell, which reports them as usual.
+    """
+    program = argv[0]
+    if "/" in program:
+        location = os.path.join(root, program)
+        if not (os.path.isfile(location) and os.access(location, os.X_OK)):
+            return None
+    else:
+        import shutil
 
-    shell = None
-    if cfg.scripts.pyss_file.header.shell is not None:
-        shell = cfg.scripts.pyss_file.header.shell.get()
+        if shutil.which(program, path=path) is None:
+            return None
+
+    return argv
+
+
+def start_session(
+    cfg: PyssCfg,
+    shell: str,
+    new_session: bool,
+    capture: bytearray | None = None,
+    captured: CapturedOutput | None = None,
+) -> ShellSession | None:
+    """
+    Starts a shell session for the commands of a script, with its output
+    handled like the output of a single command, or written to `captured`
+    if given. With new_session, the shell starts in a session of its own.
+    Returns None if the run has been cancelled.
+    """
+    cancellation = cfg.cancellation
+    multiplexed = cfg.prefix is not None and not cfg.disable_output and captured is None
+
+    stdout = subprocess.DEVNULL if cfg.disable_output else sys.stdout
+    stderr = subprocess.DEVNULL if cfg.disable_output else sys.stderr
+    if capture is not None or multiplexed or captured is not None:
+        stdout = subprocess.PIPE
+    if multiplexed or captured is not None:
+        stderr = subprocess.PIPE
+
+    session = ShellSession(
+        shell,
+        os.path.dirname(cfg.scripts.pyss_file.file_location),
+        cfg.env.materialize(),
+        stdout,
+        stderr,
+        start_new_session=new_session,
+    )
+    if cancellation is not None and not cancellation.register(session.proc):
+        session.close()
+        return None
+
+    outputs = []
+    if multiplexed:
+        outputs = [
+            PrefixedOutput(cfg.prefix, sys.stdout),
+            PrefixedOutput(cfg.prefix, sys.stderr),
+        ]
+
+    def on_stdout(data: bytes):
+        if capture is not None and len(capture) < RESULT_CACHE_MAX_STDOUT:
+            capture.extend(data)
+        if captured is not None:
+            captured.write(data)
+        elif multiplexed:
+            outputs[0].feed(data)
+        elif not cfg.disable_output:
+            write_stdout(data)
+
+    on_stderr = outputs[1].feed if multiplexed else None
+    if captured is not None:
+        on_stderr = captured.write
+    session.pump(on_stdout, on_stderr, outputs)
+    return session
+
+
+def close_session(cfg: PyssCfg, session: ShellSession):
+    session.close()
+    if cfg.cancellation is not None:
+        cfg.cancellation.unregister(session.proc)
+
+
+def run_remote(
+    cfg: PyssCfg,
+    command: str,
+    argv: list[str] | None,
+    shell: str | None,
+    env: Environment,
+    capture: bytearray | None = None,
+    remote=None,
+    resolve: bool = False,
+) -> int:
+    """
+    Runs the evaluated command on the workers of cfg.executor, with its
+    output handled like the output of a command that runs locally. With
+    resolve, the worker runs argv directly only if it finds its program,
+    and runs the command in a shell otherwise.
+    """
+    captured = capture_output(cfg)
+    multiplexed = cfg.prefix is not None and not cfg.disable_output and captured is None
+
+    outputs = []
+    if multiplexed:
+        outputs = [
+            PrefixedOutput(cfg.prefix, sys.stdout),
+            PrefixedOutput(cfg.prefix, sys.stderr),
+        ]
+
+    def on_stdout(data: bytes):
+        if capture is not None and len(capture) < RESULT_CACHE_MAX_STDOUT:
+            capture.extend(data)
+        if captured is not None:
+            captured.write(data)
+        elif multiplexed:
+            outputs[0].feed(data)
+        elif not cfg.disable_output:
+            write_stdout(data)
+
+    def on_stderr(data: bytes):
+        if captured is not None:
+            captured.write(data)
+        elif multiplexed:
+            outputs[1].feed(data)
+        elif not cfg.disable_output:
+            write_stdout(data, sys.stderr)
+
+    # Workers run in the root of the project: the root of the workspace
+    # for its members, or the directory of the configuration file.
+    request = {
+        "command": command,
+        "argv": argv,
+        "resolve": resolve,
+        "shell": shell,
+        "cwd": cfg.member or ".",
+        "env": env.layers(),
+    }
+    try:
+        exit_code = cfg.executor.run(
+            request, on_stdout, on_stderr, cfg.cancellation, remote
+        )
+        if captured is not None and exit_code != 0:
+            show_captured(cfg, captured)
+        return exit_code
+    finally:
+        for output in outputs:
+            output.close()
+        if captured is not None:
+            captured.close()
 
-    _cmd_shell = input.get_shell()
-    if _cmd_shell is not None:
-        shell = _cmd_shell.get()
 
+def log_command(
+    command: str, shell: str | None, direct: bool = False, session: bool = False
+):
     env_var_pattern = re.compile(r"\${([a-zA-Z_][a-zA-Z0-9_]*)}")
     command_colored = env_var_pattern.sub(
         lambda match: colored(match.group(), ENV_VAR_COLOR),
         command,
     )
 
-    if not cfg.quiet and not cfg.disable_output:
-        if shell is None:
-            log_info("subprocess.Popen(shell=True)", command_colored)
+    if session:
+        log_info(f"session {shell or '/bin/sh'}", command_colored)
+    elif direct:
+        log_info("exec", command_colored)
+    elif shell is None:
+        log_info("subprocess.Popen(shell=True)", command_colored)
+    else:
+        log_info(shell, command_colored)
+
+
+def run_sync(coroutine):
+    """
+    Runs a coroutine of the SyncEngine to completion. Its steps block
+    instead of suspending, so no event loop is needed.
+    """
+    try:
+        coroutine.send(None)
+    except StopIteration as e:
+        return e.value
+    coroutine.close()
+    raise RuntimeError("A step of the synchronous engine was suspended.")
+
+
+class Engine(ABC):
+    """
+    Runs the scripts of a plan. The steps of a run (dependencies, matrix
+    combinations, the result cache, environment variables and output
+    handling) are written once, as coroutines, and the engines provide
+    the parts that block: running processes and waiting for them, running
+    steps concurrently and limiting the number of running commands.
+    """
+
+    def prepare(self, cfg: PyssCfg) -> PyssCfg:
+        if cfg.plan is None:
+            cfg = cfg.derive(plan=Plan(cfg.scripts))
+
+        if cfg.env is None:
+            base = Environment.from_os()
+            cfg = cfg.derive(env=base.layer(cfg.scripts.pyss_file.env))
+
+        if cfg.estimates is None:
+            cfg = cfg.derive(estimates=run_estimates(cfg))
+
+        return cfg
+
+    async def run(self, cfg: PyssCfg) -> int:
+        cfg = self.prepare(cfg)
+
+        try:
+            script = cfg.plan.resolve(cfg.script_name)
+        except PlanError as e:
+            log_error(e)
+            return 1
+
+        return await self.execute_script(cfg, script)
+
+    # The parts the engines provide.
+
+    @abstractmethod
+    def new_session(self, cfg: PyssCfg) -> bool:
+        """
+        Returns whether processes start in a session of their own, so that
+        cancelling the run terminates their whole process group.
+        """
+
+    @abstractmethod
+    async def blocking(self, function, *args):
+        """
+        Calls a function that blocks, e.g. on file system access.
+        """
+
+    @abstractmethod
+    async def cleanup(self, function, *args):
+        """
+        Calls a function that blocks and has to finish even if the run is
+        cancelled.
+        """
+
+    @abstractmethod
+    async def acquire(self, job_slots):
+        """
+        Waits for a free job slot and takes it.
+        """
+
+    @abstractmethod
+    async def gather(self, jobs: list, workers: int):
+        """
+        Runs the coroutine functions in jobs, at most workers at a time,
+        starting them in order.
+        """
+
+    @abstractmethod
+    async def communicate(
+        self,
+        cfg: PyssCfg,
+        proc: subprocess.Popen,
+        command_span,
+        captured: CapturedOutput | None,
+        multiplexed: bool,
+        capture: bytearray | None,
+    ) -> int:
+        """
+        Handles the output of the process and waits for it to exit.
+        """
+
+    @abstractmethod
+    async def run_in_session(self, session: ShellSession, command: str) -> int:
+        """
+        Runs the command in the shell session and returns its exit code.
+        """
+
+    @abstractmethod
+    async def run_remote(
+        self,
+        cfg: PyssCfg,
+        command: str,
+        argv: list[str] | None,
+        shell: str | None,
+        env: Environment,
+        capture: bytearray | None,
+        resolve: bool,
+    ) -> int:
+        """
+        Runs the command on the workers of cfg.executor, see run_remote().
+        """
+
+    # The steps of a run.
+
+    @contextlib.asynccontextmanager
+    async def job_slot(self, cfg: PyssCfg):
+        with span(cfg.profiler, "job slot", "wait"):
+            await self.acquire(cfg.job_slots)
+        try:
+            yield
+        finally:
+            cfg.job_slots.release()
+
+    async def execute_script(self, cfg: PyssCfg, script: ScriptNode) -> int:
+        with span(cfg.profiler, script.name, "script") as script_span:
+            if script.matrix is not None:
+                exit_code = await run_matrix(cfg, script, self)
+            else:
+                exit_code = await self.run_script(cfg, script)
+            script_span.set(exit_code=exit_code, hash=script_hash(script))
+            return exit_code
+
+    async def run_script(
+        self,
+        cfg: PyssCfg,
+        script: ScriptNode,
+        combination: dict[str, str] | None = None,
+    ) -> int:
+        """
+        Runs the script. A combination of its matrix is layered over the
+        environment of the script. The dependencies and the freshness of a
+        matrix script are handled by the matrix rather than by each
+        combination.
+        """
+        if not cfg.quiet and not cfg.disable_output:
+            name = script.name
+            if combination is not None:
+                name = matrix_label(name, combination)
+            log_info("run script", name, DETAIL_COLOR)
+
+        cfg = cfg.derive(env=cfg.env.layer(script.env).layer(combination))
+        if cfg.prefix is not None and combination is None:
+            cfg = cfg.prefixed(script.name)
+
+        if script.before is not None and combination is None:
+            exit_code = await self.execute_dependencies(cfg, script.before)
+            if exit_code != 0:
+                return exit_code
+
+        file_location = cfg.scripts.pyss_file.file_location
+        up_to_date = (
+            not cfg.force
+            and combination is None
+            and await self.blocking(is_up_to_date, script.definition, file_location)
+        )
+
+        if up_to_date:
+            exit_code = 0
+            current_span().set(outcome="up-to-date")
+            if not cfg.quiet and not cfg.disable_output:
+                log_info("up-to-date", script.name, DETAIL_COLOR)
+        elif script.definition.get("cache", False):
+            exit_code = await self.execute_cached_commands(cfg, script)
+            if exit_code != 0:
+                return exit_code
         else:
-            log_info(shell, command_colored)
-
-    proc = subprocess.Popen(
-        evaluated_script_command,
-        cwd=pyss_directory,
-        stdout=subprocess.DEVNULL if cfg.disable_output else sys.stdout,
-        stderr=subprocess.DEVNULL if cfg.disable_output else sys.stderr,
-        shell=True,
-        executable=shell,
-    )
+            exit_code = await self.execute_commands(cfg, script)
+            if exit_code != 0:
+                return exit_code
+
+        if not up_to_date and combination is None:
+            await self.blocking(record_state, script.definition, file_location)
 
-    return proc.wait()
+        if script.after is not None and combination is None:
+            exit_code = await self.execute_dependencies(cfg, script.after)
+            if exit_code != 0:
+                return exit_code
 
+        return exit_code
 
-def __execute_dependency(
-    cfg: PyssCfg,
-    dependency: dict | str,
-) -> int:
-    if isinstance(dependency, str):
-        exit_code = 0
-        if dependency in [script["name"] for script in cfg.scripts]:
-            exit_code = run_pyss(
-                PyssCfg(
-                    scripts=cfg.scripts,
-                    script_name=dependency,
-                    quiet=cfg.quiet,
-                    disable_output=cfg.disable_output,
-                )
+    async def execute_cached_commands(self, cfg: PyssCfg, script: ScriptNode) -> int:
+        """
+        Executes the commands of a script through the result cache. On a
+        hit the output files, exit code and stdout of the previous run are
+        restored instead of running the commands.
+        """
+        from pyss._results import get_result_cache, restore_result, store_result
+
+        definition = script.definition
+
+        settings = definition["cache"] if isinstance(definition["cache"], dict) else {}
+        replay = settings.get("replay", True)
+        pyss_directory = os.path.dirname(cfg.scripts.pyss_file.file_location)
+
+        try:
+            key = await self.blocking(cached_result_key, cfg, script)
+        except ValueError as e:
+            log_error(e)
+            return 1
+
+        if key is None:
+            return await self.execute_commands(cfg, script)
+
+        backend = get_result_cache(cfg.result_cache)
+
+        if not cfg.force:
+            result = await self.blocking(restore_result, backend, key, pyss_directory)
+            if result is not None:
+                exit_code, stdout = result
+                current_span().set(outcome="cached")
+                if not cfg.quiet and not cfg.disable_output:
+                    log_info("cached", script.name, DETAIL_COLOR)
+                if replay and stdout and not cfg.disable_output:
+                    if not cfg.output_on_failure:
+                        write_stdout(stdout)
+                return exit_code
+
+        stdout = bytearray() if replay else None
+        exit_code = await self.execute_commands(cfg, script, capture=stdout)
+        if exit_code != 0:
+            return exit_code
+
+        if stdout is None or len(stdout) < RESULT_CACHE_MAX_STDOUT:
+            await self.blocking(
+                store_result,
+                backend,
+                key,
+                pyss_directory,
+                definition.get("outputs", []),
+                exit_code,
+                None if stdout is None else bytes(stdout),
             )
-        else:
-            exit_code = __execute_command(cfg, Command(dependency))
-        return exit_code
-    elif isinstance(dependency, dict):
-        silent = cfg.disable_output
-        if "silent" in dependency:
-            silent = dependency["silent"]
 
-        if "env" in dependency:
-            prime_environment(dependency["env"])
+        return exit_code
 
+    async def execute_commands(
+        self, cfg: PyssCfg, script: ScriptNode, capture: bytearray | None = None
+    ) -> int:
+        """
+        Executes the commands of the script until one of them fails. With
+        'session: true' they run in one shell session if the shell supports
+        it.
+        """
+        shell = None
+        if script.definition.get("session", False):
+            shell = session_shell(cfg.scripts.pyss_file.header.shell.get())
+
+        session = None
+        captured = None
         exit_code = 0
-        if "script" in dependency:
-            script_name = dependency["script"]
-            if script_name not in [script["name"] for script in cfg.scripts]:
-                log_error(f"Script '{script_name}' not found.")
-                return 1
-            exit_code = run_pyss(
-                PyssCfg(
-                    scripts=cfg.scripts,
-                    script_name=script_name,
-                    quiet=cfg.quiet,
-                    disable_output=silent,
+        try:
+            for command in script.commands:
+                if shell is None or not runs_in_session(command, shell):
+                    exit_code = await self.execute_command(cfg, command, capture)
+                else:
+                    if session is None:
+                        captured = capture_output(cfg)
+                        session = start_session(
+                            cfg, shell, self.new_session(cfg), capture, captured
+                        )
+                        if session is None:
+                            return 1
+                    exit_code = await self.execute_session_command(
+                        cfg, session, shell, command
+                    )
+                if exit_code != 0:
+                    break
+        finally:
+            if session is not None:
+                await self.cleanup(close_session, cfg, session)
+            if captured is not None:
+                # The output of a session is shown as a whole once it has
+                # ended.
+                if exit_code != 0:
+                    show_captured(cfg, captured)
+                captured.close()
+
+        return exit_code
+
+    async def execute_session_command(
+        self, cfg: PyssCfg, session: ShellSession, shell: str, input: Command
+    ) -> int:
+        if cfg.cancellation is not None and cfg.cancellation.is_cancelled():
+            return 1
+
+        command = input.get()
+        try:
+            with span(cfg.profiler, "evaluate env", "pyss"):
+                evaluated_script_command = evaluate_environment_variables(
+                    command, cfg.env.layer(input.get_env())
                 )
+        except ValueError as e:
+            log_error(e)
+            return 1
+
+        if not cfg.quiet and not cfg.disable_output:
+            log_command(command, shell, session=True)
+
+        evaluated_script_command = session_command(
+            evaluated_script_command, input.get_env()
+        )
+
+        async with self.job_slot(cfg), span(
+            cfg.profiler, command, "command"
+        ) as command_span:
+            exit_code = await self.run_in_session(session, evaluated_script_command)
+            command_span.set(exit_code=exit_code)
+            return exit_code
+
+    async def execute_command(
+        self, cfg: PyssCfg, input: Command, capture: bytearray | None = None
+    ) -> int:
+        cancellation = cfg.cancellation
+        if cancellation is not None and cancellation.is_cancelled():
+            return 1
+
+        command = input.get()
+        env = cfg.env.layer(input.get_env())
+
+        try:
+            with span(cfg.profiler, "evaluate env", "pyss"):
+                evaluated_script_command = evaluate_environment_variables(command, env)
+        except ValueError as e:
+            log_error(e)
+            return 1
+
+        pyss_directory = os.path.dirname(cfg.scripts.pyss_file.file_location)
+
+        shell = resolve_shell(cfg, input)
+        # Whether the program of a command can be found is up to the
+        # worker that runs it.
+        argv = direct_argv(
+            cfg, input, evaluated_script_command, env, resolve=cfg.executor is None
+        )
+
+        if not cfg.quiet and not cfg.disable_output:
+            log_command(command, shell, direct=argv is not None)
+
+        if cfg.executor is not None:
+            async with self.job_slot(cfg), span(
+                cfg.profiler, command, "command"
+            ) as command_span:
+                exit_code = await self.run_remote(
+                    cfg,
+                    evaluated_script_command,
+                    argv,
+                    shell,
+                    env,
+                    capture,
+                    resolve=input.get_exec() is None,
+                )
+                command_span.set(exit_code=exit_code)
+                return exit_code
+
+        # Output of commands that run concurrently with others is prefixed
+        # line by line, and with --output=on-failure it is held back until
+        # the command has exited. Otherwise the command writes to our
+        # streams directly.
+        captured = capture_output(cfg)
+        multiplexed = (
+            cfg.prefix is not None and not cfg.disable_output and captured is None
+        )
+
+        stdout = subprocess.DEVNULL if cfg.disable_output else sys.stdout
+        stderr = subprocess.DEVNULL if cfg.disable_output else sys.stderr
+        if capture is not None or multiplexed or captured is not None:
+            stdout = subprocess.PIPE
+        if multiplexed or captured is not None:
+            stderr = subprocess.PIPE
+
+        try:
+            async with self.job_slot(cfg), span(
+                cfg.profiler, command, "command"
+            ) as command_span:
+                try:
+                    proc = subprocess.Popen(
+                        evaluated_script_command if argv is None else argv,
+                        cwd=pyss_directory,
+                        stdout=stdout,
+                        stderr=stderr,
+                        shell=argv is None,
+                        executable=shell if argv is None else None,
+                        env=env.materialize(),
+                        start_new_session=self.new_session(cfg),
+                    )
+                except OSError as e:
+                    log_error(e)
+                    return 127
+
+                if cancellation is not None and not cancellation.register(proc):
+                    await self.cleanup(proc.wait)
+                    return 1
+
+                try:
+                    exit_code = await self.communicate(
+                        cfg, proc, command_span, captured, multiplexed, capture
+                    )
+                finally:
+                    if cancellation is not None:
+                        cancellation.unregister(proc)
+
+                command_span.set(exit_code=exit_code)
+                if captured is not None and exit_code != 0:
+                    show_captured(cfg, captured)
+                return exit_code
+        finally:
+            if captured is not None:
+                captured.close()
+
+    async def execute_dependency(self, cfg: PyssCfg, dependency: DependencyNode) -> int:
+        with span(
+            cfg.profiler, dependency_name(dependency), "dependency"
+        ) as dependency_span:
+            exit_code = await self.run_dependency(cfg, dependency)
+            dependency_span.set(exit_code=exit_code, hash=dependency_hash(dependency))
+            return exit_code
+
+    async def run_dependency(self, cfg: PyssCfg, dependency: DependencyNode) -> int:
+        cfg = cfg.derive(
+            env=cfg.env.layer(dependency.env), **dependency.output_options()
+        )
+
+        exit_code = 0
+        if dependency.script is not None:
+            exit_code = await self.execute_script(
+                cfg.derive(script_name=dependency.script.name), dependency.script
             )
-        elif "command" in dependency:
-            exit_code = __execute_command(cfg, Command(dependency["command"]))
-        elif "commands" in dependency:
-            for command in dependency["commands"]:
-                exit_code = __execute_command(cfg, Command(command))
+        else:
+            for command in dependency.commands:
+                exit_code = await self.execute_command(cfg, command)
                 if exit_code != 0:
                     break
 
-        if "env" in dependency:
-            clear_environment(dependency["env"])
+        return exit_code
+
+    async def execute_dependencies_parallel(
+        self, cfg: PyssCfg, dependencies: list[DependencyNode]
+    ) -> int:
+        """
+        Executes the dependencies concurrently, starting those with the
+        longest expected path first. Once a dependency fails, no further
+        dependencies are started and the exit code of the first failure
+        is returned after the running dependencies have finished.
+        """
+        import threading
 
+        exit_code = 0
+        # The SyncEngine runs the dependencies on threads.
+        lock = threading.Lock()
+
+        async def execute(dependency: DependencyNode):
+            nonlocal exit_code
+            if exit_code != 0:
+                return
+            result = await self.execute_dependency(
+                cfg.prefixed(dependency_name(dependency)), dependency
+            )
+            with lock:
+                if result != 0 and exit_code == 0:
+                    exit_code = result
+
+        await self.gather(
+            [
+                functools.partial(execute, dependency)
+                for dependency in cfg.estimates.order(dependencies)
+            ],
+            min(len(dependencies), cfg.max_jobs()),
+        )
         return exit_code
 
+    async def execute_dependencies(
+        self, cfg: PyssCfg, dependencies: DependencyList
+    ) -> int:
+        entries = dependencies.entries
+        if len(entries) > 1 and (dependencies.parallel or (cfg.jobs or 1) > 1):
+            return await self.execute_dependencies_parallel(cfg, entries)
 
-def __execute_dependencies(
-    cfg: PyssCfg,
-    dependencies: list | dict | str,
-) -> int:
-    if isinstance(dependencies, list):
         exit_code = 0
-        for dependency in dependencies:
-            exit_code = __execute_dependency(cfg, dependency)
+        for dependency in entries:
+            exit_code = await self.execute_dependency(cfg, dependency)
             if exit_code != 0:
                 break
         return exit_code
 
-    return __execute_dependency(cfg, dependencies)
+
+class SyncEngine(Engine):
+    """
+    Runs scripts on the calling thread, and the entries of parallel
+    dependency lists and matrices on threads of their own.
+    """
+
+    def new_session(self, cfg: PyssCfg) -> bool:
+        # Processes stay in the foreground process group, where they get
+        # the Ctrl+C of the terminal, unless the run can be cancelled.
+        return cfg.cancellation is not None and os.name == "posix"
+
+    async def blocking(self, function, *args):
+        return function(*args)
+
+    async def cleanup(self, function, *args):
+        return function(*args)
+
+    async def acquire(self, job_slots):
+        job_slots.acquire()
+
+    async def gather(self, jobs: list, workers: int):
+        if workers <= 1:
+            for job in jobs:
+                await job()
+            return
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run, lambda job=job: run_sync(job())
+                )
+                for job in jobs
+            ]
+            for future in futures:
+                future.result()
+
+    async def communicate(
+        self,
+        cfg: PyssCfg,
+        proc: subprocess.Popen,
+        command_span,
+        captured: CapturedOutput | None,
+        multiplexed: bool,
+        capture: bytearray | None,
+    ) -> int:
+        return communicate(cfg, proc, command_span, captured, multiplexed, capture)
+
+    async def run_in_session(self, session: ShellSession, command: str) -> int:
+        return session.run(command)
+
+    async def run_remote(
+        self,
+        cfg: PyssCfg,
+        command: str,
+        argv: list[str] | None,
+        shell: str | None,
+        env: Environment,
+        capture: bytearray | None,
+        resolve: bool,
+    ) -> int:
+        return run_remote(cfg, command, argv, shell, env, capture, None, resolve)
+
+
+def communicate(
+    cfg: PyssCfg,
+    proc: subprocess.Popen,
+    command_span,
+    captured: CapturedOutput | None,
+    multiplexed: bool,
+    capture: bytearray | None,
+) -> int:
+    """
+    Handles the output of the process and waits for it to exit, blocking
+    the calling thread.
+    """
+    if captured is not None:
+        __pump_captured(proc, captured, capture)
+    elif multiplexed:
+        __pump_prefixed(cfg, proc, capture)
+    elif capture is not None:
+        for chunk in iter(lambda: proc.stdout.read1(1 << 16), b""):
+            if len(capture) < RESULT_CACHE_MAX_STDOUT:
+                capture.extend(chunk)
+            if not cfg.disable_output:
+                write_stdout(chunk)
+        proc.stdout.close()
+
+    return wait_with_usage(proc, command_span)
+
+
+def __pump_prefixed(cfg: PyssCfg, proc: subprocess.Popen, capture: bytearray | None):
+    stdout = PrefixedOutput(cfg.prefix, sys.stdout)
+    stderr = PrefixedOutput(cfg.prefix, sys.stderr)
+
+    def on_stdout(data: bytes):
+        if capture is not None and len(capture) < RESULT_CACHE_MAX_STDOUT:
+            capture.extend(data)
+        stdout.feed(data)
+
+    pump([(proc.stdout, on_stdout), (proc.stderr, stderr.feed)])
+    stdout.close()
+    stderr.close()
+    proc.stdout.close()
+    proc.stderr.close()
+
+
+def __pump_captured(
+    proc: subprocess.Popen, captured: CapturedOutput, capture: bytearray | None
+):
+    def on_stdout(data: bytes):
+        if capture is not None and len(capture) < RESULT_CACHE_MAX_STDOUT:
+            capture.extend(data)
+        captured.write(data)
+
+    pump([(proc.stdout, on_stdout), (proc.stderr, captured.write)])
+    proc.stdout.close()
+    proc.stderr.close()
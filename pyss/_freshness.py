@@ -0,0 +1,136 @@
+import os
+import glob
+import hashlib
+
+from pyss._cache import get_cache_directory
+
+
+def expand_paths(
+    patterns: list[str], root: str, strict: bool = True
+) -> list[str] | None:
+    """
+    Expands the glob patterns relative to the root directory into a
+    sorted list of files. Directories are expanded to the files they
+    contain. Returns None if any of the patterns does not match anything,
+    unless strict is False, in which case such patterns are ignored.
+    """
+    files = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern, root_dir=root, recursive=True)
+        if not matches and strict:
+            return None
+
+        for match in (os.path.join(root, match) for match in matches):
+            if os.path.isdir(match):
+                for directory, _, names in os.walk(match):
+                    files.update(os.path.join(directory, name) for name in names)
+            else:
+                files.add(match)
+
+    return sorted(files)
+
+
+def hash_files(files: list[str], root: str) -> str:
+    digest = hashlib.sha256()
+    for file in files:
+        digest.update(os.path.relpath(file, root).encode("utf-8"))
+        digest.update(b"\0")
+        file_digest = hashlib.sha256()
+        with open(file, "rb") as content:
+            for chunk in iter(lambda: content.read(1 << 20), b""):
+                file_digest.update(chunk)
+        digest.update(file_digest.digest())
+    return digest.hexdigest()
+
+
+def __state_location(file_location: str, script: dict) -> str:
+    key = f"{os.path.abspath(file_location)}\0{script['name']}"
+    name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return os.path.join(get_cache_directory(), "freshness", f"{name}.json")
+
+
+def __hash_state(script: dict, root: str) -> dict | None:
+    import json
+
+    inputs = expand_paths(script.get("inputs", []), root)
+    outputs = expand_paths(script["outputs"], root)
+    if inputs is None or outputs is None:
+        return None
+
+    return {
+        "script": hashlib.sha256(
+            json.dumps(script, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest(),
+        "inputs": hash_files(inputs, root),
+        "outputs": hash_files(outputs, root),
+    }
+
+
+def is_up_to_date(script: dict, file_location: str) -> bool:
+    """
+    Returns True if the declared outputs of the script are up to date
+    with its declared inputs. In the default 'mtime' mode the outputs
+    must exist and be at least as new as every input. In 'hash' mode the
+    contents of the inputs and outputs must match the ones recorded after
+    the last successful run.
+    """
+    if "outputs" not in script:
+        return False
+
+    root = os.path.dirname(file_location)
+
+    if script.get("freshness", "mtime") == "hash":
+        import json
+
+        state = __hash_state(script, root)
+        if state is None:
+            return False
+        try:
+            with open(__state_location(file_location, script)) as state_file:
+                return json.load(state_file) == state
+        except (OSError, ValueError):
+            return False
+
+    inputs = expand_paths(script.get("inputs", []), root)
+    outputs = expand_paths(script["outputs"], root)
+    if inputs is None or not outputs:
+        return False
+
+    oldest_output = min(os.stat(output).st_mtime_ns for output in outputs)
+    return all(os.stat(input).st_mtime_ns <= oldest_output for input in inputs)
+
+
+def record_state(script: dict, file_location: str):
+    """
+    Records the state of the inputs and outputs of a script after it has
+    run successfully. This is only required in 'hash' mode.
+    """
+    if "outputs" not in script or script.get("freshness", "mtime") != "hash":
+        return
+
+    state = __hash_state(script, os.path.dirname(file_location))
+    if state is None:
+        return
+
+    import json
+    import tempfile
+
+    state_location = __state_location(file_location, script)
+    state_directory = os.path.dirname(state_location)
+    try:
+        os.makedirs(state_directory, exist_ok=True)
+        fd, temp_location = tempfile.mkstemp(dir=state_directory, prefix=".tmp-")
+    except OSError:
+        return
+
+    # Scripts run on several threads at once, so each write gets a
+    # temporary file of its own.
+    try:
+        with os.fdopen(fd, "w") as state_file:
+            json.dump(state, state_file)
+        os.replace(temp_location, state_location)
+    except OSError:
+        try:
+            os.remove(temp_location)
+        except OSError:
+            pass
@@ -0,0 +1,390 @@
+import os
+import sys
+import hashlib
+
+from pyss._logging import log_error, log_info
+from pyss._constants import (
+    HISTORY_DIRECTORY,
+    HISTORY_FILE,
+    HISTORY_ENV,
+    HISTORY_FORMAT,
+    HISTORY_TIMEOUT,
+    HISTORY_STATS_RUNS,
+)
+
+# The kinds of spans that are recorded, see pyss._profile.
+RECORDED_CATEGORIES = ["script", "dependency", "command"]
+
+__schema = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    script TEXT,
+    command_hash TEXT,
+    started REAL NOT NULL,
+    duration REAL NOT NULL,
+    exit_code INTEGER,
+    cpu_time REAL,
+    max_rss INTEGER,
+    outcome TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_name ON runs (name, started);
+CREATE INDEX IF NOT EXISTS runs_script ON runs (script, started);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started);
+"""
+
+# The scripts that upgrade a history from each format to the next, the
+# first one from format 1 to format 2. Records are never dropped.
+__migrations = [
+    # Scripts that ran no command record why: 'up-to-date' or 'cached'.
+    "ALTER TABLE runs ADD COLUMN outcome TEXT;",
+]
+
+
+def command_hash(commands: list[str | None]) -> str:
+    """
+    Returns a short hash of the commands, which tells runs apart whose
+    commands have changed.
+    """
+    digest = hashlib.sha256()
+    for command in commands:
+        digest.update((command or "").encode())
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def script_hash(script) -> str:
+    return command_hash([command.get() for command in script.commands])
+
+
+def dependency_hash(dependency) -> str:
+    if dependency.script is not None:
+        return script_hash(dependency.script)
+    return command_hash([command.get() for command in dependency.commands])
+
+
+def history_location(directory: str) -> str:
+    """
+    Returns the location of the run history of the project whose
+    configuration file is in the directory.
+    """
+    return os.path.join(directory, HISTORY_DIRECTORY, HISTORY_FILE)
+
+
+def history_enabled() -> bool:
+    """
+    Returns whether runs are recorded in the history, which is opt-in.
+    """
+    return os.environ.get(HISTORY_ENV, "") not in ["", "0"]
+
+
+def __connect(location: str, check_same_thread: bool = True):
+    import sqlite3
+
+    connection = sqlite3.connect(
+        location, timeout=HISTORY_TIMEOUT, check_same_thread=check_same_thread
+    )
+    try:
+        # Committing a transaction in WAL mode with synchronous=NORMAL
+        # does not wait for the disk.
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        (version,) = connection.execute("PRAGMA user_version").fetchone()
+        if version > HISTORY_FORMAT:
+            # Written by a newer version of pyss, which is left alone.
+            raise sqlite3.DatabaseError(
+                f"The history has format {version}, which this version of "
+                f"pyss does not support."
+            )
+        if version < HISTORY_FORMAT:
+            script = __schema if version == 0 else "".join(__migrations[version - 1 :])
+            connection.executescript(
+                f"BEGIN; {script} PRAGMA user_version={HISTORY_FORMAT}; COMMIT;"
+            )
+    except BaseException:
+        connection.close()
+        raise
+    return connection
+
+
+def history_rows(profiler) -> list[tuple]:
+    """
+    Returns the rows to record for the scripts, dependencies and commands
+    in the spans of the profiler. The CPU time and peak memory usage of
+    scripts and dependencies are those of the commands they ran. Scripts
+    that ran no command record their outcome instead: 'up-to-date' or
+    'cached'.
+    """
+    usage = {}
+    for span in profiler.spans:
+        if span.category != "command":
+            continue
+        cpu_time = None
+        if "user" in span.args:
+            cpu_time = span.args["user"] + span.args["sys"]
+        max_rss = span.args.get("max_rss")
+
+        ancestor = span
+        while ancestor is not None:
+            entry = usage.setdefault(id(ancestor), [None, None])
+            if cpu_time is not None:
+                entry[0] = (entry[0] or 0.0) + cpu_time
+            if max_rss is not None:
+                entry[1] = max(entry[1] or 0, max_rss)
+            ancestor = ancestor.parent
+
+    rows = []
+    for span in profiler.spans:
+        if span.category not in RECORDED_CATEGORIES:
+            continue
+        if id(span) not in usage and "exit_code" not in span.args:
+            continue
+
+        script = span.parent
+        while script is not None and script.category != "script":
+            script = script.parent
+
+        digest = span.args.get("hash")
+        if digest is None and span.category == "command":
+            digest = command_hash([span.name])
+
+        cpu_time, max_rss = usage.get(id(span), (None, None))
+        rows.append(
+            (
+                span.category,
+                span.name,
+                None if script is None else script.name,
+                digest,
+                profiler.started + (span.start - profiler.origin),
+                span.end - span.start,
+                span.args.get("exit_code"),
+                cpu_time,
+                max_rss,
+                span.args.get("outcome"),
+            )
+        )
+    return rows
+
+
+def record_history(location: str, profiler):
+    """
+    Writes the runs in the spans of the profiler to the history, in a
+    single transaction at the end of the run. A history that can not be
+    written is ignored, so that it never fails a run.
+    """
+    import sqlite3
+
+    rows = history_rows(profiler)
+    if not rows:
+        return
+
+    directory = os.path.dirname(location)
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, ".gitignore"), "w") as gitignore:
+                gitignore.write("*\n")
+
+        connection = __connect(location)
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT INTO runs (kind, name, script, command_hash, started, "
+                    "duration, exit_code, cpu_time, max_rss, outcome) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+        finally:
+            connection.close()
+    except (OSError, sqlite3.Error):
+        pass
+
+
+def __percentile(durations: list[float], fraction: float) -> float:
+    # Nearest-rank percentile of the sorted durations.
+    index = max(0, -(-len(durations) * fraction // 1) - 1)
+    return durations[int(index)]
+
+
+def __median(durations: list[float]) -> float:
+    return __percentile(sorted(durations), 0.5)
+
+
+def open_history(location: str):
+    """
+    Opens the history for reading, or returns None if there is none or it
+    can not be read. The connection may be used from any thread, one at a
+    time.
+    """
+    import sqlite3
+
+    if not os.path.exists(location):
+        return None
+    try:
+        return __connect(location, check_same_thread=False)
+    except sqlite3.Error:
+        return None
+
+
+def median_duration(
+    connection, kind: str, name: str, last: int = HISTORY_STATS_RUNS
+) -> float | None:
+    """
+    Returns the median duration of the last successful runs of the
+    script, dependency or command, or None if it has not run yet.
+    """
+    durations = [
+        duration
+        for (duration,) in connection.execute(
+            "SELECT duration FROM runs WHERE name = ? AND kind = ? "
+            "AND exit_code = 0 ORDER BY started DESC LIMIT ?",
+            (name, kind, last),
+        )
+    ]
+    if not durations:
+        return None
+    return __median(durations)
+
+
+def history_stats(
+    location: str, script: str | None = None, last: int = HISTORY_STATS_RUNS
+) -> list[dict]:
+    """
+    Returns the statistics of the scripts in the history, or of the
+    script and the dependencies and commands it ran, over their last
+    runs. The trend compares the median duration of the newer half of
+    those runs with that of the older half.
+    """
+    condition, parameters = "kind = 'script'", ()
+    if script is not None:
+        condition = "(kind = 'script' AND name = ?) OR script = ?"
+        parameters = (script, script)
+
+    connection = __connect(location)
+    try:
+        counts = {
+            (kind, name): count
+            for kind, name, count in connection.execute(
+                f"SELECT kind, name, COUNT(*) FROM runs WHERE {condition} "
+                "GROUP BY kind, name",
+                parameters,
+            )
+        }
+        runs = connection.execute(
+            "SELECT kind, name, duration, exit_code, outcome FROM ("
+            "SELECT *, ROW_NUMBER() OVER ("
+            "PARTITION BY kind, name ORDER BY started DESC) AS position "
+            f"FROM runs WHERE {condition}) "
+            "WHERE position <= ? ORDER BY started",
+            (*parameters, last),
+        ).fetchall()
+    finally:
+        connection.close()
+
+    recent = {}
+    for kind, name, duration, exit_code, outcome in runs:
+        recent.setdefault((kind, name), []).append((duration, exit_code, outcome))
+
+    stats = []
+    for (kind, name), entries in recent.items():
+        durations = [duration for duration, _, _ in entries]
+        ordered = sorted(durations)
+        half = len(durations) // 2
+
+        trend = None
+        if half >= 2:
+            older, newer = __median(durations[:half]), __median(durations[-half:])
+            if older > 0:
+                trend = newer / older - 1
+
+        stats.append(
+            {
+                "kind": kind,
+                "name": name,
+                "count": counts[(kind, name)],
+                "runs": len(entries),
+                "failure_rate": sum(
+                    exit_code not in (0, None) for _, exit_code, _ in entries
+                )
+                / len(entries),
+                "skip_rate": sum(outcome is not None for _, _, outcome in entries)
+                / len(entries),
+                "p50": __percentile(ordered, 0.5),
+                "p95": __percentile(ordered, 0.95),
+                "max": ordered[-1],
+                "trend": trend,
+            }
+        )
+
+    order = {kind: index for index, kind in enumerate(RECORDED_CATEGORIES)}
+    return sorted(stats, key=lambda row: (order[row["kind"]], row["name"]))
+
+
+def print_stats(stats: list[dict], stream=None):
+    stream = stream or sys.stdout
+
+    def duration(seconds: float) -> str:
+        if seconds >= 1:
+            return f"{seconds:.2f}s"
+        return f"{seconds * 1000:.1f}ms"
+
+    def trend(value: float | None) -> str:
+        if value is None:
+            return "-"
+        return f"{round(value * 100):+d}%"
+
+    lines = [
+        f"{'count':>7} {'failed':>7} {'skipped':>7} {'p50':>9} {'p95':>9} "
+        f"{'max':>9} {'trend':>7}  {'kind':<10} name"
+    ]
+    for row in stats:
+        name = row["name"].replace("\n", " ")
+        if len(name) > 60:
+            name = name[:57] + "..."
+        lines.append(
+            f"{row['count']:>7} {row['failure_rate'] * 100:>6.1f}% "
+            f"{row['skip_rate'] * 100:>6.1f}% {duration(row['p50']):>9} {duration(row['p95']):>9} "
+            f"{duration(row['max']):>9} {trend(row['trend']):>7}  "
+            f"{row['kind']:<10} {name}"
+        )
+
+    stream.write("\n".join(lines) + "\n")
+    stream.flush()
+
+
+def run_stats_command(arguments: list[str]) -> int:
+    import sqlite3
+
+    from pyss._scripts import find_pyss_file
+
+    usage = "Usage: pyss :stats [SCRIPT] [RUNS]"
+    if len(arguments) > 2 or (len(arguments) == 2 and not arguments[1].isdigit()):
+        log_error(usage)
+        return 1
+
+    script = arguments[0] if arguments else None
+    last = int(arguments[1]) if len(arguments) == 2 else HISTORY_STATS_RUNS
+
+    file_location = find_pyss_file(os.getcwd())
+    if file_location is None:
+        log_error("No PySS file found in the current directory or its parents.")
+        return 1
+
+    location = history_location(os.path.dirname(os.path.abspath(file_location)))
+    stats = []
+    if os.path.exists(location):
+        try:
+            stats = history_stats(location, script, max(last, 1))
+        except sqlite3.Error as e:
+            log_error(f"Can not read the run history '{location}': {e}")
+            return 1
+
+    if not stats:
+        subject = "any script" if script is None else f"script '{script}'"
+        log_error(f"No runs of {subject} have been recorded.")
+        return 1
+
+    log_info("stats", f"Duration of the last {last} runs ({location})")
+    print_stats(stats)
+    return 0
@@ -0,0 +1,164 @@
+import os
+import threading
+
+from pyss._types import PySSFile
+
+
+class IncludeError(Exception):
+    """
+    Raised when an included file can not be read or is not valid.
+    """
+
+
+class Fragment:
+    """
+    A file included by a configuration file. It holds scripts and an
+    environment that applies to them.
+    """
+
+    __slots__ = ("file_location", "env", "index")
+
+    file_location: str
+    env: dict[str, any] | None
+    index: dict[str, dict]
+
+    def __init__(self, pyss_file: PySSFile):
+        self.file_location = pyss_file.file_location
+        self.env = pyss_file.env
+        self.index = {}
+        for script in pyss_file["scripts"]:
+            self.index.setdefault(script["name"], script)
+
+    def get(self, name: str) -> dict | None:
+        """
+        Returns the definition of the script with the given name, with the
+        environment of the fragment below its own.
+        """
+        script = self.index.get(name)
+        if script is None or not self.env:
+            return script
+        return {**script, "env": {**self.env, **(script.get("env") or {})}}
+
+
+# Parsed fragments by location, along with the modification time and size
+# of the file they were parsed from. They are shared by every plan of the
+# process, so a fragment included by many workspace members is only read
+# once.
+__fragments: dict[str, tuple[int, int, Fragment]] = {}
+__fragments_lock = threading.Lock()
+
+
+def load_fragment(file_location: str, use_cache: bool = True) -> Fragment:
+    """
+    Returns the parsed and validated fragment at the location. Raises an
+    IncludeError if it can not be read or is not valid.
+    """
+    file_location = os.path.abspath(file_location)
+    try:
+        stat = os.stat(file_location)
+    except OSError:
+        raise IncludeError(f"Included file '{file_location}' not found.")
+
+    with __fragments_lock:
+        entry = __fragments.get(file_location)
+    if entry is not None and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+        return entry[2]
+
+    from pyss._scripts import load_pyss_file
+    from pyss._cache import store_cached_config
+    from pyss._validator import is_valid_fragment_data
+
+    try:
+        pyss_file = load_pyss_file(file_location, use_cache)
+    except Exception as e:
+        raise IncludeError(f"Included file '{file_location}' can not be read: {e}")
+
+    if not pyss_file.validated:
+        if not is_valid_fragment_data(pyss_file):
+            from jsonschema import ValidationError
+            from pyss._validator import validate_fragment_data
+
+            try:
+                validate_fragment_data(pyss_file)
+            except ValidationError as e:
+                raise IncludeError(
+                    f"Included file '{file_location}' is not valid: {e.message}"
+                )
+        pyss_file.validated = True
+        if pyss_file.cache_key is not None:
+            store_cached_config(pyss_file.cache_key, dict(pyss_file))
+
+    fragment = Fragment(pyss_file)
+    with __fragments_lock:
+        __fragments[file_location] = (stat.st_mtime_ns, stat.st_size, fragment)
+    return fragment
+
+
+def include_entries(pyss_file: PySSFile) -> list[tuple[str, list[str] | None]]:
+    """
+    Returns the location of each file the configuration file includes,
+    along with the names of the scripts taken from it, or None when all
+    of them are.
+    """
+    directory = os.path.dirname(pyss_file.file_location)
+    entries = []
+    for entry in pyss_file.header.include:
+        if isinstance(entry, str):
+            entry = {"path": entry}
+        entries.append((os.path.join(directory, entry["path"]), entry.get("scripts")))
+    return entries
+
+
+class Includes:
+    """
+    The files included by a configuration file. They are only loaded once
+    a script that is not defined by the configuration file itself is
+    looked up, and only as far as needed to find it: entries that list
+    their scripts are skipped unless they list it, and the others are
+    loaded in order until one of them defines it.
+    """
+
+    __slots__ = ("entries", "use_cache")
+
+    entries: list[tuple[str, list[str] | None]]
+    use_cache: bool
+
+    def __init__(self, pyss_file: PySSFile):
+        self.entries = include_entries(pyss_file)
+        self.use_cache = pyss_file.use_cache
+
+    def find(self, name: str) -> dict | None:
+        """
+        Returns the definition of the script with the given name from the
+        first included file that provides it, or None if none does.
+        """
+        for file_location, names in self.entries:
+            if names is not None and name not in names:
+                continue
+            script = load_fragment(file_location, self.use_cache).get(name)
+            if script is not None:
+                return script
+        return None
+
+    def names(self) -> list[str]:
+        """
+        Returns the names of the public scripts the included files provide.
+        This loads all of them.
+        """
+        return [script["name"] for script in self.scripts()]
+
+    def scripts(self) -> list[dict]:
+        """
+        Returns the definitions of the public scripts the included files
+        provide, taking each name from the first file that provides it.
+        This loads all of them.
+        """
+        scripts = {}
+        for file_location, listed in self.entries:
+            fragment = load_fragment(file_location, self.use_cache)
+            for name in fragment.index if listed is None else listed:
+                script = fragment.index.get(name)
+                if script is None or script.get("internal", False):
+                    continue
+                scripts.setdefault(name, script)
+        return list(scripts.values())
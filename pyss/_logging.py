@@ -1,11 +1,59 @@
-from termcolor import colored
+from pyss._constants import INFO_COLOR, DETAIL_COLOR, FOUND_COLOR, NOT_FOUND_COLOR
 
-from pyss._constants import INFO_COLOR
+
+def colored(text, color=None):
+    """
+    Colors the text using termcolor, which is only imported once output
+    is actually produced.
+    """
+    from termcolor import colored as termcolor_colored
+
+    return termcolor_colored(text, color)
+
+
+# Log lines are flushed as they are written, so that they come before the
+# output of the commands they announce, which write to the same stream
+# directly, even if the stream is block-buffered.
 
 
 def log_error(message, title="Error"):
-    print(f"{colored(title, 'red')}: {message}")
+    print(f"{colored(title, 'red')}: {message}", flush=True)
 
 
 def log_info(header, message, color=INFO_COLOR):
-    print(f"{colored(f'[pyss][{header}]', color)} {message}")
+    print(f"{colored(f'[pyss][{header}]', color)} {message}", flush=True)
+
+
+def log_summary(
+    header: str,
+    title: str,
+    results: list[tuple[str, int | None, float]],
+    elapsed: float,
+):
+    """
+    Logs the outcome of a set of runs given as (name, exit code, duration)
+    tuples, where the exit code is None for runs that were skipped.
+    """
+
+    def duration(seconds: float) -> str:
+        return f"{seconds:.2f}s"
+
+    passed = sum(1 for _, exit_code, _ in results if exit_code == 0)
+    failed = sum(1 for _, exit_code, _ in results if exit_code)
+    skipped = len(results) - passed - failed
+
+    log_info(
+        header,
+        f"{title}: {passed} passed, {failed} failed, "
+        f"{skipped} skipped in {duration(elapsed)}",
+        DETAIL_COLOR,
+    )
+    for name, exit_code, seconds in results:
+        if exit_code is None:
+            status, timing = "skipped", "-"
+        elif exit_code == 0:
+            status, timing = colored("passed ", FOUND_COLOR), duration(seconds)
+        else:
+            status, timing = colored("failed ", NOT_FOUND_COLOR), duration(seconds)
+            name += f" (exit code {exit_code})"
+        log_info(header, f"  {status} {timing:>9}  {name}", DETAIL_COLOR)
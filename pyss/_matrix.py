@@ -0,0 +1,225 @@
+import time
+import functools
+import itertools
+
+from pyss._logging import log_info, log_summary
+from pyss._freshness import is_up_to_date, record_state
+from pyss._profile import span, current_span
+from pyss._history import script_hash
+from pyss._types import PyssCfg
+from pyss._plan import ScriptNode
+from pyss._constants import DETAIL_COLOR
+
+
+def matrix_combinations(matrix: dict) -> list[dict[str, str]]:
+    """
+    Returns the environment assignments of a matrix: the cartesian product
+    of the values of its variables, in the order they are declared, minus
+    the combinations that match one of its 'exclude' entries. An entry
+    matches a combination if every variable it names has the given value.
+    """
+    variables = matrix.get("env", {})
+    names = list(variables)
+    excluded = [
+        {name: f"{value}" for name, value in entry.items()}
+        for entry in matrix.get("exclude", [])
+    ]
+
+    combinations = []
+    for values in itertools.product(*(variables[name] for name in names)):
+        combination = {name: f"{value}" for name, value in zip(names, values)}
+        if any(
+            all(combination.get(name) == value for name, value in entry.items())
+            for entry in excluded
+        ):
+            continue
+        combinations.append(combination)
+    return combinations
+
+
+def matrix_label(name: str, combination: dict[str, str]) -> str:
+    values = ",".join(f"{key}={value}" for key, value in combination.items())
+    return f"{name}[{values}]"
+
+
+class MatrixResult:
+    """
+    The outcome of one combination of a matrix. exit_code is None if the
+    combination was skipped after another one failed.
+    """
+
+    __slots__ = ("combination", "exit_code", "duration")
+
+    combination: dict[str, str]
+    exit_code: int | None
+    duration: float
+
+    def __init__(self, combination: dict[str, str]):
+        self.combination = combination
+        self.exit_code = None
+        self.duration = 0.0
+
+
+class MatrixRun:
+    """
+    The state of a script while it fans out over its matrix: the
+    combinations, their results and the fail-fast policy.
+    """
+
+    def __init__(self, cfg: PyssCfg, script: ScriptNode):
+        self.cfg = cfg
+        self.script = script
+        self.results = [
+            MatrixResult(combination)
+            for combination in matrix_combinations(script.matrix)
+        ]
+        self.fail_fast = script.matrix.get("fail_fast", True)
+        self.failed = False
+        self.started = time.perf_counter()
+
+        # Combinations that run next to each other prefix their output.
+        self.workers = min(
+            len(self.results),
+            script.matrix.get("max_parallel", cfg.max_jobs()),
+        )
+        if self.workers > 1 and not cfg.disable_output:
+            cfg = cfg.prefixed(script.name)
+        self.base = cfg
+
+    def up_to_date(self) -> bool:
+        """
+        Returns True if the outputs of the script are up to date, in which
+        case none of the combinations run. The freshness of a matrix
+        script is checked once for the whole matrix.
+        """
+        cfg = self.cfg
+        file_location = cfg.scripts.pyss_file.file_location
+        if cfg.force or not is_up_to_date(self.script.definition, file_location):
+            return False
+
+        if not cfg.quiet and not cfg.disable_output:
+            log_info("up-to-date", self.script.name, DETAIL_COLOR)
+        return True
+
+    def should_start(self) -> bool:
+        return not (self.failed and self.fail_fast)
+
+    def scheduled(self) -> list[MatrixResult]:
+        """
+        Returns the results in the order their combinations are started:
+        the longest first if they run in parallel, by their durations in
+        the history.
+        """
+        estimates = self.cfg.estimates
+        if self.workers <= 1 or estimates is None:
+            return self.results
+        return sorted(
+            self.results,
+            key=lambda result: estimates.combination(self.script, result.combination),
+            reverse=True,
+        )
+
+    def derive(self, result: MatrixResult) -> PyssCfg:
+        label = matrix_label(self.script.name, result.combination)
+        cfg = self.base
+        if cfg.prefix is not None:
+            cfg = cfg.prefixed(label)
+        return cfg
+
+    def finish(self, result: MatrixResult, exit_code: int, started: float):
+        result.exit_code = exit_code
+        result.duration = time.perf_counter() - started
+        if exit_code != 0:
+            self.failed = True
+
+    def exit_code(self) -> int:
+        """
+        Returns the exit code of the first combination that failed, in
+        the order of the matrix, or 0 if all of them passed.
+        """
+        for result in self.results:
+            if result.exit_code:
+                return result.exit_code
+        return 0
+
+    def record_state(self):
+        record_state(self.script.definition, self.cfg.scripts.pyss_file.file_location)
+
+    def print_summary(self):
+        if self.cfg.disable_output:
+            return
+
+        log_summary(
+            "matrix",
+            self.script.name,
+            [
+                (
+                    " ".join(
+                        f"{key}={value}" for key, value in result.combination.items()
+                    ),
+                    result.exit_code,
+                    result.duration,
+                )
+                for result in self.results
+            ],
+            time.perf_counter() - self.started,
+        )
+
+
+async def run_matrix(cfg: PyssCfg, script: ScriptNode, engine) -> int:
+    """
+    Runs the script once for every combination of its matrix, with the
+    values of the combination layered over the environment of the
+    script, on the engine of the run. The 'before' dependencies of the
+    script run once before the combinations, and its 'after' dependencies
+    once after all of them have passed.
+
+    At most 'max_parallel' combinations (cfg.max_jobs() by default) run
+    at once, and their commands share the job slots of the run. With
+    'fail_fast' (the default), no further combinations are started once
+    one has failed; otherwise all of them run.
+    """
+    dependencies_cfg = cfg.derive(env=cfg.env.layer(script.env))
+    if dependencies_cfg.prefix is not None:
+        dependencies_cfg = dependencies_cfg.prefixed(script.name)
+
+    if script.before is not None:
+        exit_code = await engine.execute_dependencies(dependencies_cfg, script.before)
+        if exit_code != 0:
+            return exit_code
+
+    matrix = MatrixRun(cfg, script)
+    if await engine.blocking(matrix.up_to_date):
+        current_span().set(outcome="up-to-date")
+        return await __run_after(engine, dependencies_cfg, script)
+
+    async def execute(result: MatrixResult):
+        if not matrix.should_start():
+            return
+        label = matrix_label(script.name, result.combination)
+        started = time.perf_counter()
+        with span(cfg.profiler, label, "script") as script_span:
+            exit_code = await engine.run_script(
+                matrix.derive(result), script, result.combination
+            )
+            script_span.set(exit_code=exit_code, hash=script_hash(script))
+        matrix.finish(result, exit_code, started)
+
+    await engine.gather(
+        [functools.partial(execute, result) for result in matrix.scheduled()],
+        matrix.workers,
+    )
+
+    matrix.print_summary()
+    exit_code = matrix.exit_code()
+    if exit_code != 0:
+        return exit_code
+
+    await engine.blocking(matrix.record_state)
+    return await __run_after(engine, dependencies_cfg, script)
+
+
+async def __run_after(engine, cfg: PyssCfg, script: ScriptNode) -> int:
+    if script.after is None:
+        return 0
+    return await engine.execute_dependencies(cfg, script.after)
@@ -0,0 +1,215 @@
+import os
+import threading
+
+from pyss._logging import colored
+from pyss._constants import (
+    SCRIPT_COLOR,
+    OUTPUT_LINE_LIMIT,
+    OUTPUT_CAPTURE_ENV,
+    OUTPUT_CAPTURE_DEFAULT_SIZE,
+    OUTPUT_CAPTURE_MEMORY,
+)
+
+# Serializes writes of complete lines, so that lines of commands running
+# at the same time never interleave.
+_write_lock = threading.Lock()
+
+
+def write_locked(stream, data: bytes):
+    with _write_lock:
+        stream.flush()
+        buffer = getattr(stream, "buffer", None)
+        if buffer is not None:
+            buffer.write(data)
+            buffer.flush()
+        else:
+            stream.write(data.decode(errors="replace"))
+            stream.flush()
+
+
+class PrefixedOutput:
+    """
+    Writes the output of a command to a stream line by line, prefixing
+    every line with the name of the command. A partial line is held back
+    until it is completed, but at most OUTPUT_LINE_LIMIT bytes of it, so a
+    command that never ends its lines can not grow the buffer without
+    limit.
+    """
+
+    prefix: bytes
+    stream: any
+    pending: bytearray
+
+    def __init__(self, name: str, stream):
+        self.prefix = f"{colored(f'[{name}]', SCRIPT_COLOR)} ".encode()
+        self.stream = stream
+        self.pending = bytearray()
+
+    def feed(self, data: bytes):
+        self.pending.extend(data)
+
+        end = self.pending.rfind(b"\n") + 1
+        if end == 0:
+            if len(self.pending) < OUTPUT_LINE_LIMIT:
+                return
+            self.pending.extend(b"\n")
+            end = len(self.pending)
+
+        lines = bytes(self.pending[:end])
+        del self.pending[:end]
+        self.__write(lines)
+
+    def close(self):
+        if self.pending:
+            self.pending.extend(b"\n")
+            lines = bytes(self.pending)
+            self.pending.clear()
+            self.__write(lines)
+
+    def __write(self, lines: bytes):
+        body = lines[:-1].replace(b"\n", b"\n" + self.prefix)
+        write_locked(self.stream, self.prefix + body + b"\n")
+
+
+class CapturedOutput:
+    """
+    Holds the combined output of a command, to be shown only if the
+    command fails. Up to OUTPUT_CAPTURE_MEMORY bytes are kept in memory.
+    Beyond that the output spills to a temporary file, which is used as a
+    ring buffer of `limit` bytes: only the end of the output is kept, so a
+    command that prints gigabytes can not fill the disk.
+    """
+
+    limit: int
+    memory: bytearray
+    file: any
+    position: int
+    size: int
+    total: int
+
+    def __init__(self, limit: int | None = None):
+        if limit is None:
+            limit = int(os.environ.get(OUTPUT_CAPTURE_ENV, OUTPUT_CAPTURE_DEFAULT_SIZE))
+        self.limit = max(limit, 1)
+        self.memory = bytearray()
+        self.file = None
+        self.position = 0
+        self.size = 0
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def write(self, data: bytes):
+        with self.lock:
+            self.total += len(data)
+            if self.file is None:
+                if len(self.memory) + len(data) <= min(
+                    self.limit, OUTPUT_CAPTURE_MEMORY
+                ):
+                    self.memory.extend(data)
+                    return
+                self.__spill()
+
+            data = data[-self.limit :]
+            while data:
+                count = min(len(data), self.limit - self.position)
+                self.file.seek(self.position)
+                self.file.write(data[:count])
+                self.position = (self.position + count) % self.limit
+                self.size = min(self.limit, self.size + count)
+                data = data[count:]
+
+    def __spill(self):
+        import tempfile
+
+        self.file = tempfile.TemporaryFile(prefix="pyss-output-")
+        self.file.write(self.memory)
+        self.size = len(self.memory)
+        self.position = self.size % self.limit
+        self.memory = bytearray()
+
+    def omitted(self) -> int:
+        """
+        Returns the number of bytes dropped from the start of the output.
+        """
+        return self.total - (len(self.memory) if self.file is None else self.size)
+
+    def chunks(self):
+        """
+        Yields the output that was kept, in order, preceded by a note if
+        its start was dropped.
+        """
+        omitted = self.omitted()
+        if omitted:
+            yield f"[... {omitted} bytes of output omitted ...]\n".encode()
+
+        if self.file is None:
+            yield bytes(self.memory)
+            return
+
+        ranges = [(0, self.size)]
+        if self.size == self.limit:
+            ranges = [(self.position, self.limit), (0, self.position)]
+        for start, end in ranges:
+            self.file.seek(start)
+            while start < end:
+                chunk = self.file.read(min(1 << 16, end - start))
+                if not chunk:
+                    break
+                start += len(chunk)
+                yield chunk
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.memory = bytearray()
+
+
+def pump(pipes: list[tuple[any, any]]):
+    """
+    Reads the pipes until all of them are closed and passes the data to
+    their handlers as it arrives, without blocking on any single pipe.
+    """
+    if os.name != "posix":
+        # Pipes can not be used with selectors on Windows.
+        threads = [
+            threading.Thread(target=pump, args=([pipe],), daemon=True)
+            for pipe in pipes[1:]
+        ]
+        for thread in threads:
+            thread.start()
+        pipe, handler = pipes[0]
+        for data in iter(lambda: pipe.read1(1 << 16), b""):
+            handler(data)
+        for thread in threads:
+            thread.join()
+        return
+
+    import selectors
+
+    with selectors.DefaultSelector() as selector:
+        for pipe, handler in pipes:
+            selector.register(pipe, selectors.EVENT_READ, handler)
+
+        while selector.get_map():
+            for key, _ in selector.select():
+                data = os.read(key.fd, 1 << 16)
+                if data:
+                    key.data(data)
+                else:
+                    selector.unregister(key.fileobj)
+
+
+def dependency_name(dependency) -> str:
+    """
+    Returns the name that prefixes the output of a dependency: the name of
+    its script, or the program its first command runs.
+    """
+    if dependency.script is not None:
+        return dependency.script.name
+
+    for command in dependency.commands:
+        words = (command.get() or "").split(maxsplit=1)
+        if words:
+            return words[0]
+    return "command"
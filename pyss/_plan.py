@@ -0,0 +1,367 @@
+from pyss._types import Scripts, Command
+from pyss._include import Includes, IncludeError
+
+
+class PlanError(Exception):
+    """
+    Raised when the scripts can not be compiled into an execution plan.
+    """
+
+
+class ScriptNode:
+    """
+    A script of the execution plan. Its before/after references are
+    resolved to other nodes when the plan is compiled.
+    """
+
+    __slots__ = (
+        "name",
+        "description",
+        "internal",
+        "env",
+        "matrix",
+        "commands",
+        "before",
+        "after",
+        "definition",
+    )
+
+    name: str
+    description: str | None
+    internal: bool
+    env: dict[str, any] | None
+    matrix: dict | None
+    commands: list[Command]
+    before: "DependencyList | None"
+    after: "DependencyList | None"
+    definition: dict
+
+    def __init__(self, definition: dict):
+        self.name = definition["name"]
+        self.description = definition.get("description")
+        self.internal = bool(definition.get("internal", False))
+        self.env = definition.get("env")
+        self.matrix = definition.get("matrix")
+        self.before = None
+        self.after = None
+        self.definition = definition
+
+        if "command" in definition:
+            self.commands = [Command(definition["command"])]
+        else:
+            self.commands = [Command(command) for command in definition["commands"]]
+
+
+class DependencyNode:
+    """
+    A single entry of a before/after list. It either runs a script or a
+    list of commands.
+    """
+
+    __slots__ = ("script", "commands", "env", "silent", "output")
+
+    script: ScriptNode | None
+    commands: list[Command]
+    env: dict[str, any] | None
+    silent: bool | None
+    output: str | None
+
+    def __init__(
+        self,
+        script: ScriptNode | None = None,
+        commands: list[Command] | None = None,
+        env: dict[str, any] | None = None,
+        silent: bool | None = None,
+        output: str | None = None,
+    ):
+        self.script = script
+        self.commands = commands or []
+        self.env = env
+        self.silent = silent
+        self.output = output
+
+    def output_options(self) -> dict[str, bool]:
+        """
+        Returns the PyssCfg fields set by the 'silent' and 'output' keys
+        of the dependency, 'output' taking precedence.
+        """
+        options = {}
+        if self.silent is not None:
+            options["disable_output"] = self.silent
+        if self.output is not None:
+            options["disable_output"] = self.output == "silent"
+            options["output_on_failure"] = self.output == "on-failure"
+        return options
+
+
+class DependencyList:
+    """
+    The resolved entries of a before/after list.
+    """
+
+    __slots__ = ("entries", "parallel")
+
+    entries: list[DependencyNode]
+    parallel: bool
+
+    def __init__(self, entries: list[DependencyNode], parallel: bool):
+        self.entries = entries
+        self.parallel = parallel
+
+
+class Plan:
+    """
+    The compiled form of the scripts in a configuration file. Scripts are
+    indexed by name and compiled on demand, so that the cost of resolving
+    a script is proportional to the part of the dependency graph that is
+    reachable from it.
+
+    Scripts that are not defined by the configuration file are looked up
+    in the files it includes, which are only loaded at that point.
+
+    If the configuration file has not been validated as a whole, each
+    script is validated when it is first looked up, unless an earlier run
+    validated it. The scripts validated by resolve() are written back to
+    the configuration cache.
+    """
+
+    __slots__ = (
+        "scripts",
+        "index",
+        "nodes",
+        "includes",
+        "definitions",
+        "validate",
+        "validated",
+    )
+
+    scripts: Scripts
+    index: dict[str, dict]
+    nodes: dict[str, ScriptNode]
+    includes: Includes | None
+    definitions: dict[str, dict | None]
+    validate: bool
+    validated: bool
+
+    def __init__(self, scripts: Scripts):
+        self.scripts = scripts
+        self.index = {}
+        self.nodes = {}
+        self.definitions = {}
+        self.validate = not scripts.pyss_file.validated
+        # Whether scripts have been validated since the cache was written.
+        self.validated = False
+        for script in scripts:
+            # Scripts without a name can not be looked up. If the file has
+            # not been validated, they are left out rather than failing
+            # every run.
+            if isinstance(script, dict) and isinstance(script.get("name"), str):
+                self.index.setdefault(script["name"], script)
+
+        self.includes = None
+        if scripts.pyss_file.header.include:
+            self.includes = Includes(scripts.pyss_file)
+
+    def get(self, name: str) -> dict | None:
+        """
+        Returns the definition of the script with the given name, with the
+        script it extends applied. Raises a PlanError if an included file
+        or an extended script can not be loaded.
+        """
+        return self.__definition(name)
+
+    def resolve(self, name: str) -> ScriptNode:
+        """
+        Compiles the script with the given name along with every script
+        reachable through its before/after references, and returns its
+        node. Raises a PlanError if a reference can not be resolved or the
+        references form a cycle.
+        """
+        if name in self.nodes:
+            return self.nodes[name]
+
+        if self.__definition(name) is None:
+            raise PlanError(f"Script '{name}' not found.")
+
+        # Iterative depth-first search so that deep dependency chains do
+        # not exhaust the interpreter's recursion limit.
+        compiling: dict[str, ScriptNode] = {}
+        path: list[str] = []
+        stack = [self.__create(name, compiling, path)]
+
+        while stack:
+            node, references, position = stack.pop()
+            if position < len(references):
+                stack.append((node, references, position + 1))
+                reference = references[position]
+                if reference in self.nodes:
+                    continue
+                if reference in compiling:
+                    cycle = path[path.index(reference) :] + [reference]
+                    raise PlanError(f"Dependency cycle detected: {' -> '.join(cycle)}")
+                stack.append(self.__create(reference, compiling, path))
+                continue
+
+            node.before = self.__dependencies(node.definition.get("before"))
+            node.after = self.__dependencies(node.definition.get("after"))
+            self.nodes[node.name] = compiling.pop(node.name)
+            path.pop()
+
+        if self.validated:
+            self.__store_validation()
+        return self.nodes[name]
+
+    def __definition(self, name: str, extending: tuple = ()) -> dict | None:
+        if name in self.definitions:
+            return self.definitions[name]
+
+        definition = self.index.get(name)
+        if definition is not None and self.validate:
+            valid_scripts = self.scripts.pyss_file.valid_scripts
+            if valid_scripts is None or name not in valid_scripts:
+                self.__validate(definition)
+                if valid_scripts is not None:
+                    valid_scripts.add(name)
+                    self.validated = True
+        if definition is None and self.includes is not None:
+            try:
+                definition = self.includes.find(name)
+            except IncludeError as e:
+                raise PlanError(str(e)) from e
+
+        if definition is not None and "extends" in definition:
+            definition = self.__extend(definition, extending + (name,))
+
+        self.definitions[name] = definition
+        return definition
+
+    def __store_validation(self):
+        from pyss._cache import store_cached_config
+
+        self.validated = False
+        pyss_file = self.scripts.pyss_file
+        if pyss_file.cache_key is not None:
+            store_cached_config(
+                pyss_file.cache_key, dict(pyss_file), False, pyss_file.valid_scripts
+            )
+
+    def __validate(self, definition: dict):
+        from pyss._validator import is_valid_script_data
+
+        if is_valid_script_data(definition):
+            return
+
+        from jsonschema import ValidationError
+        from pyss._validator import validate_script_data
+
+        try:
+            validate_script_data(definition)
+        except ValidationError as e:
+            raise PlanError(
+                f"Script '{definition['name']}' is not valid: {e.message}"
+            ) from e
+
+    def __extend(self, definition: dict, extending: tuple) -> dict:
+        base_name = definition["extends"]
+        if base_name in extending:
+            cycle = extending[extending.index(base_name) :] + (base_name,)
+            raise PlanError(f"Extends cycle detected: {' -> '.join(cycle)}")
+
+        base = self.__definition(base_name, extending)
+        if base is None:
+            raise PlanError(
+                f"Script '{base_name}' not found "
+                f"(extended by '{definition['name']}')."
+            )
+
+        # The script takes every setting of its base that it does not set
+        # itself, except for its visibility. Environments are merged.
+        extended = {
+            key: value
+            for key, value in base.items()
+            if key not in ("name", "internal")
+            and not (
+                key in ("command", "commands")
+                and ("command" in definition or "commands" in definition)
+            )
+        }
+        extended.update(
+            (key, value) for key, value in definition.items() if key != "extends"
+        )
+        if base.get("env") and definition.get("env"):
+            extended["env"] = {**base["env"], **definition["env"]}
+        return extended
+
+    def __is_script(self, dependency: str) -> bool:
+        if dependency in self.index:
+            return True
+        # Commands are not looked up in the included files, but a command
+        # without arguments can not be told apart from a script name.
+        if self.includes is None or any(c.isspace() for c in dependency):
+            return False
+        return self.__definition(dependency) is not None
+
+    def __create(self, name: str, compiling: dict, path: list) -> tuple:
+        node = ScriptNode(self.__definition(name))
+        compiling[name] = node
+        path.append(name)
+        return node, self.__references(node), 0
+
+    def __references(self, node: ScriptNode) -> list[str]:
+        references = []
+        for key in ["before", "after"]:
+            for dependency in self.__entries(node.definition.get(key)):
+                if isinstance(dependency, str):
+                    if self.__is_script(dependency):
+                        references.append(dependency)
+                elif "script" in dependency:
+                    if self.__definition(dependency["script"]) is None:
+                        raise PlanError(
+                            f"Script '{dependency['script']}' not found "
+                            f"(referenced by '{node.name}')."
+                        )
+                    references.append(dependency["script"])
+        return references
+
+    def __entries(self, dependencies: list | dict | str | None) -> list:
+        if dependencies is None:
+            return []
+        if isinstance(dependencies, dict) and "dependencies" in dependencies:
+            return dependencies["dependencies"]
+        if isinstance(dependencies, list):
+            return dependencies
+        return [dependencies]
+
+    def __dependencies(
+        self, dependencies: list | dict | str | None
+    ) -> DependencyList | None:
+        if dependencies is None:
+            return None
+
+        parallel = False
+        if isinstance(dependencies, dict) and "dependencies" in dependencies:
+            parallel = dependencies.get("parallel", False)
+
+        entries = []
+        for dependency in self.__entries(dependencies):
+            if isinstance(dependency, str):
+                if self.__is_script(dependency):
+                    entries.append(DependencyNode(script=self.nodes[dependency]))
+                else:
+                    entries.append(DependencyNode(commands=[Command(dependency)]))
+                continue
+
+            node = DependencyNode(
+                env=dependency.get("env"),
+                silent=dependency.get("silent"),
+                output=dependency.get("output"),
+            )
+            if "script" in dependency:
+                node.script = self.nodes[dependency["script"]]
+            elif "command" in dependency:
+                node.commands = [Command(dependency["command"])]
+            elif "commands" in dependency:
+                node.commands = [Command(command) for command in dependency["commands"]]
+            entries.append(node)
+
+        return DependencyList(entries, parallel)
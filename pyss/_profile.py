@@ -0,0 +1,317 @@
+import os
+import sys
+import time
+import threading
+import contextvars
+
+# Spans of pyss itself, as opposed to the scripts and commands it runs.
+OVERHEAD_CATEGORIES = ["pyss", "script", "dependency"]
+
+_current_span = contextvars.ContextVar("pyss_current_span", default=None)
+
+
+class Span:
+    """
+    A timed section of a run: the execution of a script, a dependency or
+    a command, or a step of pyss itself such as loading the configuration.
+    """
+
+    __slots__ = (
+        "profiler",
+        "name",
+        "category",
+        "args",
+        "parent",
+        "track",
+        "start",
+        "end",
+        "token",
+    )
+
+    name: str
+    category: str
+    args: dict[str, any]
+    parent: "Span | None"
+    track: int
+    start: float
+    end: float | None
+
+    def __init__(self, profiler: "Profiler", name: str, category: str):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.args = {}
+        self.parent = None
+        self.track = 0
+        self.start = 0.0
+        self.end = None
+        self.token = None
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self) -> "Span":
+        self.parent = _current_span.get()
+        self.track = _track()
+        self.token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.end = time.perf_counter()
+        _current_span.reset(self.token)
+        self.profiler.record(self)
+
+    async def __aenter__(self) -> "Span":
+        return self.__enter__()
+
+    async def __aexit__(self, *exc_info):
+        self.__exit__(*exc_info)
+
+
+class NoSpan:
+    """
+    Stands in for a span when profiling is disabled.
+    """
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self) -> "NoSpan":
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    async def __aenter__(self) -> "NoSpan":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+NO_SPAN = NoSpan()
+
+
+def _track() -> int:
+    # Spans of concurrent asyncio tasks run on the same thread, so each
+    # task gets a track of its own in the trace.
+    asyncio = sys.modules.get("asyncio")
+    if asyncio is not None:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is not None:
+            return id(task)
+    return threading.get_ident()
+
+
+def span(profiler: "Profiler | None", name: str, category: str) -> Span | NoSpan:
+    """
+    Returns a span to be used as a context manager, or a placeholder that
+    records nothing if profiler is None.
+    """
+    if profiler is None:
+        return NO_SPAN
+    return Span(profiler, name, category)
+
+
+def current_span() -> Span | NoSpan:
+    """
+    Returns the innermost span that is open in the calling context, or a
+    placeholder that records nothing if there is none.
+    """
+    return _current_span.get() or NO_SPAN
+
+
+def wait_with_usage(proc, span: Span | NoSpan) -> int:
+    """
+    Waits for the process like proc.wait(), and records the CPU time and
+    peak memory usage of the process on the span when it is profiled.
+    """
+    if span is NO_SPAN or not hasattr(os, "wait4"):
+        return proc.wait()
+
+    try:
+        _, status, usage = os.wait4(proc.pid, 0)
+    except ChildProcessError:
+        return proc.wait()
+
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS.
+    scale = 1 if sys.platform == "darwin" else 1024
+    span.set(
+        user=usage.ru_utime,
+        sys=usage.ru_stime,
+        max_rss=usage.ru_maxrss * scale,
+    )
+    return proc.returncode
+
+
+class Profiler:
+    """
+    Collects the spans of a run and reports them as a summary table or as
+    a trace in the Chrome Trace Event format.
+    """
+
+    spans: list[Span]
+
+    def __init__(self):
+        self.spans = []
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        # The wall clock time of the origin.
+        self.started = time.time()
+
+    def record(self, span: Span):
+        with self.lock:
+            self.spans.append(span)
+
+    def __children(self) -> dict[int, list[Span]]:
+        children = {}
+        for span in self.spans:
+            if span.parent is not None:
+                children.setdefault(id(span.parent), []).append(span)
+        return children
+
+    def __self_time(self, span: Span, children: list[Span]) -> float:
+        # Children may run in parallel, so the time covered by the union
+        # of their intervals is subtracted.
+        covered = 0.0
+        start = end = None
+        for child in sorted(children, key=lambda child: child.start):
+            if end is None or child.start > end:
+                if end is not None:
+                    covered += end - start
+                start, end = child.start, child.end
+            else:
+                end = max(end, child.end)
+        if end is not None:
+            covered += end - start
+        return max(0.0, (span.end - span.start) - covered)
+
+    def summary(self) -> list[dict]:
+        """
+        Returns the spans aggregated by category and name, sorted by the
+        time spent in them, excluding the time spent in their children.
+        """
+        children = self.__children()
+        rows = {}
+        for span in self.spans:
+            row = rows.setdefault(
+                (span.category, span.name),
+                {
+                    "category": span.category,
+                    "name": span.name,
+                    "count": 0,
+                    "total": 0.0,
+                    "self": 0.0,
+                    "user": None,
+                    "sys": None,
+                    "max_rss": None,
+                },
+            )
+            row["count"] += 1
+            row["total"] += span.end - span.start
+            row["self"] += self.__self_time(span, children.get(id(span), []))
+
+            for key in ["user", "sys"]:
+                if key in span.args:
+                    row[key] = (row[key] or 0.0) + span.args[key]
+            if "max_rss" in span.args:
+                row["max_rss"] = max(row["max_rss"] or 0, span.args["max_rss"])
+
+        return sorted(rows.values(), key=lambda row: row["self"], reverse=True)
+
+    def print_summary(self, stream=None, limit: int = 25):
+        stream = stream or sys.stderr
+        rows = self.summary()
+        if not rows:
+            return
+
+        wall = max(span.end for span in self.spans) - min(
+            span.start for span in self.spans
+        )
+        overhead = sum(
+            row["self"] for row in rows if row["category"] in OVERHEAD_CATEGORIES
+        )
+
+        def duration(seconds: float | None) -> str:
+            if seconds is None:
+                return "-"
+            if seconds >= 1:
+                return f"{seconds:.2f}s"
+            return f"{seconds * 1000:.1f}ms"
+
+        def size(value: int | None) -> str:
+            if value is None:
+                return "-"
+            return f"{value / (1 << 20):.1f}MiB"
+
+        lines = [
+            f"[pyss][profile] wall {duration(wall)}, "
+            f"pyss overhead {duration(overhead)}, {len(self.spans)} spans",
+            f"{'self':>9} {'total':>9} {'calls':>6} {'user':>9} {'sys':>9} "
+            f"{'max rss':>10}  {'kind':<10} name",
+        ]
+        for row in rows[:limit]:
+            name = row["name"].replace("\n", " ")
+            if len(name) > 60:
+                name = name[:57] + "..."
+            lines.append(
+                f"{duration(row['self']):>9} {duration(row['total']):>9} "
+                f"{row['count']:>6} {duration(row['user']):>9} "
+                f"{duration(row['sys']):>9} {size(row['max_rss']):>10}  "
+                f"{row['category']:<10} {name}"
+            )
+        if len(rows) > limit:
+            lines.append(f"... {len(rows) - limit} more")
+
+        stream.write("\n".join(lines) + "\n")
+        stream.flush()
+
+    def trace_events(self) -> list[dict]:
+        """
+        Returns the spans as complete events of the Chrome Trace Event
+        format, which can be opened with Perfetto or chrome://tracing.
+        """
+        pid = os.getpid()
+        tracks = {}
+        events = []
+        for span in sorted(self.spans, key=lambda span: span.start):
+            tid = tracks.setdefault(span.track, len(tracks) + 1)
+            event = {
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": round((span.start - self.origin) * 1e6, 3),
+                "dur": round((span.end - span.start) * 1e6, 3),
+                "pid": pid,
+                "tid": tid,
+            }
+            if span.args:
+                event["args"] = span.args
+            events.append(event)
+
+        for tid in tracks.values():
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": tid,
+                    "args": {"name": "pyss" if tid == 1 else f"worker {tid - 1}"},
+                }
+            )
+        return events
+
+    def write_trace(self, location: str):
+        import json
+
+        with open(location, "w") as trace_file:
+            json.dump(
+                {"traceEvents": self.trace_events(), "displayTimeUnit": "ms"},
+                trace_file,
+            )
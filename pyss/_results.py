@@ -0,0 +1,338 @@
+import io
+import os
+import sys
+import json
+import shutil
+import hashlib
+import tempfile
+
+from abc import ABC, abstractmethod
+
+from pyss._cache import get_cache_directory
+from pyss._freshness import expand_paths, hash_files
+from pyss._constants import (
+    RESULT_CACHE_ENV,
+    RESULT_CACHE_SIZE_ENV,
+    RESULT_CACHE_DEFAULT_SIZE,
+    RESULT_CACHE_FORMAT,
+    RESULT_CACHE_TIMEOUT,
+)
+
+
+class ResultCacheBackend(ABC):
+    """
+    Stores script results as archives addressed by their cache key.
+    """
+
+    @abstractmethod
+    def get(self, key: str, destination: str) -> bool:
+        """
+        Writes the archive stored for the key to the destination path and
+        returns True, or returns False if there is no such archive.
+        """
+
+    @abstractmethod
+    def put(self, key: str, source: str):
+        """
+        Stores the archive at the source path for the key.
+        """
+
+
+class DirectoryBackend(ResultCacheBackend):
+    """
+    Stores results in a directory, which may be local or on a shared file
+    system. Once the directory grows beyond max_size bytes, the least
+    recently used results are evicted. The total size of the results is
+    kept in a 'size' file next to them, so the directory is only walked
+    when it crosses max_size.
+    """
+
+    location: str
+    max_size: int
+
+    def __init__(self, location: str, max_size: int):
+        self.location = location
+        self.max_size = max_size
+
+    def __entry_location(self, key: str) -> str:
+        return os.path.join(self.location, key[:2], f"{key}.tar")
+
+    def __size_location(self) -> str:
+        return os.path.join(self.location, "size")
+
+    def __read_size(self) -> int | None:
+        try:
+            with open(self.__size_location(), "r") as size_file:
+                return int(size_file.read())
+        except (OSError, ValueError):
+            return None
+
+    def __write_size(self, size: int):
+        try:
+            fd, temp_location = tempfile.mkstemp(dir=self.location, prefix=".tmp-")
+            with os.fdopen(fd, "w") as temp_file:
+                temp_file.write(str(size))
+            os.replace(temp_location, self.__size_location())
+        except OSError:
+            pass
+
+    def get(self, key: str, destination: str) -> bool:
+        entry_location = self.__entry_location(key)
+        try:
+            shutil.copyfile(entry_location, destination)
+            os.utime(entry_location)
+        except OSError:
+            return False
+        return True
+
+    def put(self, key: str, source: str):
+        entry_location = self.__entry_location(key)
+        try:
+            replaced_size = os.path.getsize(entry_location)
+        except OSError:
+            replaced_size = 0
+        try:
+            os.makedirs(os.path.dirname(entry_location), exist_ok=True)
+            fd, temp_location = tempfile.mkstemp(
+                dir=os.path.dirname(entry_location), prefix=".tmp-"
+            )
+            os.close(fd)
+            shutil.copyfile(source, temp_location)
+            os.replace(temp_location, entry_location)
+            entry_size = os.path.getsize(entry_location)
+        except OSError:
+            return
+
+        # Concurrent runs may lose each other's updates, which only delays
+        # or hastens an eviction: evicting recounts the actual size.
+        size = self.__read_size()
+        if size is None:
+            self.evict()
+            return
+        size += entry_size - replaced_size
+        if size > self.max_size:
+            self.evict()
+        else:
+            self.__write_size(size)
+
+    def evict(self):
+        """
+        Removes the least recently used results until the directory is no
+        larger than max_size bytes, and records the size it is left with.
+        """
+        entries = []
+        for directory, _, names in os.walk(self.location):
+            for name in names:
+                if not name.endswith(".tar"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, directory, name))
+
+        total_size = sum(entry[1] for entry in entries)
+        for _, size, directory, name in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                continue
+            total_size -= size
+
+        self.__write_size(total_size)
+
+
+def _timed_out(error: OSError) -> bool:
+    import socket
+
+    # urllib wraps errors raised while connecting in a URLError.
+    reason = getattr(error, "reason", error)
+    return isinstance(error, socket.timeout) or isinstance(reason, socket.timeout)
+
+
+class HttpBackend(ResultCacheBackend):
+    """
+    Stores results on an HTTP server using GET and PUT requests to
+    '<url>/<key>'. Requests that fail are treated as cache misses, and
+    once a request times out, the server is not used again.
+    """
+
+    url: str
+    timeout: float
+    available: bool
+
+    def __init__(self, url: str, timeout: float = RESULT_CACHE_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.available = True
+
+    def get(self, key: str, destination: str) -> bool:
+        from urllib.request import urlopen
+
+        if not self.available:
+            return False
+        try:
+            with urlopen(f"{self.url}/{key}", timeout=self.timeout) as response:
+                with open(destination, "wb") as archive:
+                    shutil.copyfileobj(response, archive)
+        except OSError as e:
+            self.available = not _timed_out(e)
+            return False
+        return True
+
+    def put(self, key: str, source: str):
+        from urllib.request import Request, urlopen
+
+        if not self.available:
+            return
+        try:
+            with open(source, "rb") as archive:
+                request = Request(
+                    f"{self.url}/{key}",
+                    data=archive,
+                    method="PUT",
+                    headers={"Content-Length": str(os.path.getsize(source))},
+                )
+                urlopen(request, timeout=self.timeout).close()
+        except OSError as e:
+            self.available = not _timed_out(e)
+
+
+def get_result_cache(location: str | None) -> ResultCacheBackend:
+    """
+    Returns the backend for the result cache location. HTTP(S) URLs use
+    the HTTP backend, anything else is treated as a directory. Without a
+    location, the PYSS_RESULT_CACHE environment variable or a directory
+    in the PySS cache directory is used.
+    """
+    location = location or os.environ.get(RESULT_CACHE_ENV)
+    if location and location.startswith(("http://", "https://")):
+        return HttpBackend(location)
+
+    if location and location.startswith("file://"):
+        location = location[len("file://") :]
+
+    max_size = int(os.environ.get(RESULT_CACHE_SIZE_ENV, RESULT_CACHE_DEFAULT_SIZE))
+    return DirectoryBackend(
+        location or os.path.join(get_cache_directory(), "results"), max_size
+    )
+
+
+def result_key(
+    commands: list[tuple[str, str | None]],
+    env: dict[str, str | None],
+    inputs: list[str],
+    root: str,
+) -> str | None:
+    """
+    Computes the cache key of a script from its evaluated commands and
+    their shells, the relevant environment variables and the contents of
+    its input files. Returns None if an input pattern matches nothing.
+    """
+    input_files = expand_paths(inputs, root)
+    if input_files is None:
+        return None
+
+    digest = hashlib.sha256()
+    digest.update(
+        json.dumps(
+            {
+                "format": RESULT_CACHE_FORMAT,
+                "platform": sys.platform,
+                "commands": commands,
+                "env": env,
+            },
+            sort_keys=True,
+        ).encode("utf-8")
+    )
+    digest.update(hash_files(input_files, root).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def store_result(
+    backend: ResultCacheBackend,
+    key: str,
+    root: str,
+    outputs: list[str],
+    exit_code: int,
+    stdout: bytes | None,
+):
+    """
+    Archives the output files, exit code and captured stdout of a script
+    and stores them in the backend.
+    """
+    import tarfile
+
+    output_files = expand_paths(outputs, root)
+    if output_files is None:
+        return
+
+    metadata = {
+        "exit_code": exit_code,
+        "outputs": [os.path.relpath(file, root) for file in output_files],
+    }
+
+    fd, archive_location = tempfile.mkstemp(suffix=".tar")
+    os.close(fd)
+    try:
+        with tarfile.open(archive_location, "w") as archive:
+            for name, content in [
+                ("pyss-result.json", json.dumps(metadata).encode("utf-8")),
+                ("stdout", stdout),
+            ]:
+                if content is None:
+                    continue
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                archive.addfile(info, io.BytesIO(content))
+
+            for file, name in zip(output_files, metadata["outputs"]):
+                archive.add(file, arcname=f"outputs/{name}", recursive=False)
+
+        backend.put(key, archive_location)
+    finally:
+        os.remove(archive_location)
+
+
+def restore_result(
+    backend: ResultCacheBackend,
+    key: str,
+    root: str,
+) -> tuple[int, bytes | None] | None:
+    """
+    Restores the output files stored for the key into the root directory
+    and returns the recorded exit code and stdout, or None on a miss.
+    """
+    import tarfile
+
+    fd, archive_location = tempfile.mkstemp(suffix=".tar")
+    os.close(fd)
+    try:
+        if not backend.get(key, archive_location):
+            return None
+
+        with tarfile.open(archive_location, "r") as archive:
+            metadata = json.load(archive.extractfile("pyss-result.json"))
+
+            stdout = None
+            if "stdout" in archive.getnames():
+                stdout = archive.extractfile("stdout").read()
+
+            root_location = os.path.realpath(root)
+            for name in metadata["outputs"]:
+                destination = os.path.realpath(os.path.join(root, name))
+                if os.path.commonpath([root_location, destination]) != root_location:
+                    return None
+
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                with archive.extractfile(f"outputs/{name}") as source:
+                    with open(destination, "wb") as target:
+                        shutil.copyfileobj(source, target)
+
+        return metadata["exit_code"], stdout
+    except (OSError, KeyError, ValueError, tarfile.TarError):
+        return None
+    finally:
+        os.remove(archive_location)
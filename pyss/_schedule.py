@@ -0,0 +1,274 @@
+import os
+import re
+import sys
+import threading
+
+from pyss._logging import log_info
+from pyss._history import (
+    history_enabled,
+    history_location,
+    open_history,
+    median_duration,
+)
+from pyss._matrix import matrix_combinations, matrix_label
+from pyss._plan import ScriptNode, DependencyNode, DependencyList
+from pyss._types import Command
+from pyss._constants import DURATION_PATTERN, DETAIL_COLOR
+
+__duration_pattern = re.compile(DURATION_PATTERN)
+__duration_part = re.compile(r"(\d+(?:\.\d+)?)\s*(ms|s|m|h)")
+__duration_units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value: str | int | float) -> float:
+    """
+    Parses a duration such as '90s', '1m30s', '1.5h' or '250ms' into
+    seconds. Numbers are taken as seconds.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not __duration_pattern.match(value):
+        raise ValueError(f"Invalid duration '{value}'.")
+    return sum(
+        float(amount) * __duration_units[unit]
+        for amount, unit in __duration_part.findall(value)
+    )
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 1:
+        return f"{seconds * 1000:.0f}ms"
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    minutes, seconds = divmod(round(seconds), 60)
+    if minutes < 60:
+        return f"{minutes}m{seconds:02}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02}m"
+
+
+class Estimates:
+    """
+    The expected durations of the scripts and commands of a plan: the
+    median of their recent successful runs in the history or, for scripts
+    that have not run yet, their 'estimate'. Durations that are not known
+    count as zero.
+
+    The estimate of a script covers its 'before' and 'after' lists, which
+    take as long as their longest entry if they run in parallel, and as
+    long as all of their entries together otherwise. With `parallel`, all
+    lists run in parallel, as they do with -j above 1.
+    """
+
+    history_location: str | None
+    parallel: bool
+    unknown: set[str]
+
+    def __init__(self, history_location: str | None, parallel: bool = False):
+        self.history_location = history_location
+        self.parallel = parallel
+        self.connection = None
+        self.opened = False
+        self.medians = {}
+        self.totals = {}
+        self.unknown = set()
+        self.lock = threading.Lock()
+
+    def __median(self, kind: str, name: str) -> float | None:
+        key = (kind, name)
+        with self.lock:
+            if key not in self.medians:
+                # The history is only read once durations are needed.
+                if not self.opened:
+                    self.opened = True
+                    if self.history_location is not None:
+                        self.connection = open_history(self.history_location)
+
+                median = None
+                if self.connection is not None:
+                    import sqlite3
+
+                    try:
+                        median = median_duration(self.connection, kind, name)
+                    except sqlite3.Error:
+                        pass
+                self.medians[key] = median
+            return self.medians[key]
+
+    def own(self, script: ScriptNode) -> float:
+        """
+        Returns the expected duration of the commands of the script, or of
+        its longest combination if it is a matrix script.
+        """
+        names = [script.name]
+        # Recorded durations include the dependencies of the script, but
+        # not those of a combination, which run once for the matrix.
+        dependencies = self.dependencies(script.before) + self.dependencies(
+            script.after
+        )
+        if script.matrix is not None:
+            names = [
+                matrix_label(script.name, combination)
+                for combination in matrix_combinations(script.matrix)
+            ]
+            dependencies = 0.0
+
+        durations = [self.__median("script", name) for name in names]
+        durations = [
+            max(0.0, duration - dependencies)
+            for duration in durations
+            if duration is not None
+        ]
+        if durations:
+            return max(durations)
+
+        if "estimate" in script.definition:
+            return parse_duration(script.definition["estimate"])
+        self.unknown.add(script.name)
+        return 0.0
+
+    def total(self, script: ScriptNode) -> float:
+        """
+        Returns the expected duration of the script and its dependencies,
+        the length of the longest path through them.
+        """
+        if script.name not in self.totals:
+            self.totals[script.name] = (
+                self.dependencies(script.before)
+                + self.own(script)
+                + self.dependencies(script.after)
+            )
+        return self.totals[script.name]
+
+    def work(self, script: ScriptNode) -> float:
+        """
+        Returns the expected time spent in all the commands of the script
+        and its dependencies together.
+        """
+        cells = 1
+        if script.matrix is not None:
+            cells = len(matrix_combinations(script.matrix))
+
+        work = cells * self.own(script)
+        for dependencies in [script.before, script.after]:
+            for dependency in dependencies.entries if dependencies else []:
+                if dependency.script is not None:
+                    work += self.work(dependency.script)
+                else:
+                    work += self.dependency(dependency)
+        return work
+
+    def command(self, command: Command) -> float:
+        name = command.get() or ""
+        median = self.__median("command", name)
+        if median is None:
+            self.unknown.add(name)
+            return 0.0
+        return median
+
+    def dependency(self, dependency: DependencyNode) -> float:
+        if dependency.script is not None:
+            return self.total(dependency.script)
+        return sum(self.command(command) for command in dependency.commands)
+
+    def dependencies(self, dependencies: DependencyList | None) -> float:
+        if dependencies is None or not dependencies.entries:
+            return 0.0
+        durations = [self.dependency(entry) for entry in dependencies.entries]
+        if dependencies.parallel or self.parallel:
+            return max(durations)
+        return sum(durations)
+
+    def order(self, entries: list[DependencyNode]) -> list[DependencyNode]:
+        """
+        Returns the entries of a list that runs in parallel, those with
+        the longest path first, so that the short ones fill the job slots
+        around them instead of delaying their start.
+        """
+        return sorted(entries, key=self.dependency, reverse=True)
+
+    def combination(self, script: ScriptNode, combination: dict[str, str]) -> float:
+        label = matrix_label(script.name, combination)
+        return self.__median("script", label) or 0.0
+
+    def critical_path(self, script: ScriptNode) -> list[tuple[str, float]]:
+        """
+        Returns the scripts and commands on the longest path through the
+        script and its dependencies, in the order they run, with their
+        expected durations.
+        """
+        return [
+            *self.__path(script.before),
+            (script.name, self.own(script)),
+            *self.__path(script.after),
+        ]
+
+    def __path(self, dependencies: DependencyList | None) -> list[tuple[str, float]]:
+        if dependencies is None or not dependencies.entries:
+            return []
+
+        entries = dependencies.entries
+        if dependencies.parallel or self.parallel:
+            entries = [max(entries, key=self.dependency)]
+
+        path = []
+        for entry in entries:
+            if entry.script is not None:
+                path.extend(self.critical_path(entry.script))
+            else:
+                path.extend(
+                    (command.get() or "", self.command(command))
+                    for command in entry.commands
+                )
+        return path
+
+
+def run_estimates(cfg) -> Estimates:
+    """
+    Returns the estimates for a run of the configuration, read from the
+    history of its project.
+    """
+    location = None
+    if history_enabled():
+        location = history_location(
+            os.path.dirname(cfg.scripts.pyss_file.file_location)
+        )
+    return Estimates(location, parallel=(cfg.jobs or 1) > 1)
+
+
+def print_plan(estimates: Estimates, script: ScriptNode, jobs: int, stream=None):
+    """
+    Prints the critical path of the script and an estimate of how long it
+    takes with the given number of jobs: the length of the critical path,
+    or the total work spread over the jobs if that takes longer.
+    """
+    stream = stream or sys.stdout
+
+    total = estimates.total(script)
+    work = estimates.work(script)
+    makespan = max(total, work / jobs)
+
+    log_info("plan", f"Critical path of '{script.name}':", DETAIL_COLOR)
+    lines = [f"{'start':>9} {'duration':>9}  name"]
+    start = 0.0
+    for name, duration in estimates.critical_path(script):
+        name = name.replace("\n", " ")
+        if len(name) > 60:
+            name = name[:57] + "..."
+        lines.append(
+            f"{format_duration(start):>9} {format_duration(duration):>9}  {name}"
+        )
+        start += duration
+    stream.write("\n".join(lines) + "\n")
+    stream.flush()
+
+    log_info(
+        "plan",
+        f"Critical path {format_duration(total)}, total work "
+        f"{format_duration(work)}, estimated run time with -j {jobs}: "
+        f"{format_duration(makespan)}",
+        DETAIL_COLOR,
+    )
+    if estimates.unknown:
+        unknown = ", ".join(sorted(estimates.unknown))
+        log_info("plan", f"No duration is known for: {unknown}", DETAIL_COLOR)
@@ -1,18 +1,15 @@
 import os
 import sys
 import re
-import yaml
 
-from packaging import version
-from importlib.metadata import version as app_version
-from termcolor import colored
-from jsonschema import ValidationError
-
-from pyss._validator import validate_pyss_data
-from pyss._logging import log_error
+from pyss._logging import log_error, colored
+from pyss._version import pyss_version
+from pyss._cache import config_cache_key, load_cached_config, store_cached_config
 
 from pyss._constants import (
     FILE_LOCATION_PATTERN,
+    PYPROJECT_FILE,
+    PYPROJECT_SECTION_PATTERN,
     NOT_FOUND_COLOR,
     FOUND_COLOR,
     COMMAND_COLOR,
@@ -22,61 +19,202 @@ from pyss._constants import (
 from pyss._types import PySSFile, Scripts
 
 
-def get_pyss_file() -> PySSFile:
+def __has_pyproject_section(file_location: str) -> bool:
+    try:
+        with open(file_location, "r", encoding="utf-8") as pyproject:
+            content = pyproject.read()
+    except (OSError, UnicodeDecodeError):
+        return False
+    return re.search(PYPROJECT_SECTION_PATTERN, content, re.MULTILINE) is not None
+
+
+def pyss_file_in(directory: str) -> str | None:
+    """
+    Returns the location of the configuration file in the directory, or
+    None if it has none. A pyss.yaml, pyss.yml or pyss.json file takes
+    precedence over a [tool.pyss] table in pyproject.toml.
+    """
     file_location_pattern = re.compile(FILE_LOCATION_PATTERN, re.IGNORECASE)
+    pyproject = None
+
+    for file in sorted(os.listdir(directory)):
+        if file_location_pattern.match(file):
+            return os.path.join(directory, file)
+        if file == PYPROJECT_FILE:
+            pyproject = os.path.join(directory, file)
+
+    if pyproject is not None and __has_pyproject_section(pyproject):
+        return pyproject
+    return None
+
+
+def find_pyss_file(directory: str) -> str | None:
+    """
+    Returns the location of the configuration file for the directory by
+    searching it and each of its parents, or None if there is none.
+    """
     file_location = None
 
-    current_dir = os.getcwd()
+    current_dir = directory
     path_parts = current_dir.split(os.sep)
 
     for i in range(len(path_parts) - 1, -1, -1):
         path_part = path_parts[: i + 1]
-        current_dir = os.sep.join(path_part)
-        for file in os.listdir(current_dir):
-            if file_location_pattern.match(file):
-                file_location = os.path.join(current_dir, file)
-                break
+        current_dir = os.sep.join(path_part) or os.sep
+        file_location = pyss_file_in(current_dir)
 
         if file_location is not None:
             break
 
+    return file_location
+
+
+def get_pyss_file(use_cache: bool = True) -> PySSFile:
+    file_location = find_pyss_file(os.getcwd())
+
     if file_location is None:
         file_colored = colored("pyss.yaml", NOT_FOUND_COLOR)
         log_error(f"No PySS YAML ({file_colored}) file found in the current directory.")
         sys.exit(1)
 
-    scripts_config = yaml.load(open(file_location), Loader=yaml.FullLoader)
+    return load_pyss_file(file_location, use_cache)
+
+
+def load_pyss_file(file_location: str, use_cache: bool = True) -> PySSFile:
+    file_location = os.path.abspath(file_location)
+    with open(file_location, "rb") as pyss_yaml:
+        content = pyss_yaml.read()
+        stat = os.fstat(pyss_yaml.fileno())
+
+    cache_key = None
+    if use_cache:
+        cache_key = config_cache_key(file_location, content, stat)
+        cached = load_cached_config(cache_key)
+        if cached is not None:
+            pyss_file = PySSFile(cached[0], file_location)
+            pyss_file.validated = cached[1]
+            pyss_file.valid_scripts = cached[2]
+            pyss_file.cached = True
+            # The entry is updated once the whole file has been validated.
+            pyss_file.cache_key = (
+                None if cached[1] else __with_includes(cache_key, pyss_file)
+            )
+            return pyss_file
+
+    scripts_config = __parse(file_location, content)
+
+    pyss_file = PySSFile(scripts_config, file_location)
+    pyss_file.cache_key = cache_key and __with_includes(cache_key, pyss_file)
+    pyss_file.use_cache = use_cache
+    return pyss_file
 
-    return PySSFile(scripts_config, file_location)
 
+def __with_includes(cache_key: dict, pyss_file: PySSFile) -> dict:
+    # Scripts taken from included files are part of the configuration, so
+    # the entry is only valid as long as those files do not change.
+    if not pyss_file.header.include:
+        return cache_key
+
+    from pyss._cache import file_stats
+    from pyss._include import include_entries
 
-def get_scripts(pyss_file: PySSFile) -> Scripts:
     try:
-        validate_pyss_data(pyss_file)
-    except ValidationError as e:
-        log_error(e.message, title="Validation Error")
-        sys.exit(1)
+        locations = [location for location, _ in include_entries(pyss_file)]
+    except (KeyError, TypeError):
+        # The header is not valid, which validation reports.
+        return cache_key
+    return {**cache_key, "includes": file_stats(locations)}
 
-    script_header = pyss_file.header
 
-    if script_header.min_version is not None:
-        if version.parse(app_version("pyss")) < version.parse(
-            script_header.min_version
-        ):
-            log_error(
-                f"This PySS project requires at least version {script_header.min_version} of PySS."
-            )
-            log_error(f"Current version: {app_version('pyss')}.")
+def __parse(file_location: str, content: bytes) -> dict:
+    name = os.path.basename(file_location).lower()
+
+    if name.endswith(".json"):
+        import json
+
+        return json.loads(content)
+
+    if name == PYPROJECT_FILE:
+        try:
+            import tomllib
+        except ImportError:
+            # Python < 3.11
+            import tomli as tomllib
+
+        return tomllib.loads(content.decode("utf-8")).get("tool", {}).get("pyss", {})
+
+    import yaml
+
+    # The libyaml bindings are several times faster, but are not part of
+    # every PyYAML build.
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    return yaml.load(content, Loader=loader)
+
+
+def get_scripts(pyss_file: PySSFile, scoped: bool = False) -> Scripts:
+    """
+    Validates the configuration file and returns its scripts.
+
+    When scoped, only the header, the environment and the list of scripts
+    are validated here. The scripts themselves are validated by the Plan
+    once they are needed, so a run only pays for, and only fails on, the
+    scripts reachable from the one it runs.
+    """
+    if pyss_file.validated:
+        return Scripts(pyss_file, pyss_file["scripts"])
+
+    if scoped and pyss_file.valid_scripts is not None:
+        # The outline, and the version requirements, were checked by an
+        # earlier run.
+        return Scripts(pyss_file, pyss_file["scripts"])
+
+    from pyss._validator import is_valid_pyss_data, is_valid_pyss_outline
+
+    is_valid = is_valid_pyss_outline if scoped else is_valid_pyss_data
+    if not is_valid(pyss_file):
+        from jsonschema import ValidationError
+        from pyss._validator import validate_pyss_data, validate_pyss_outline
+
+        validate = validate_pyss_outline if scoped else validate_pyss_data
+        try:
+            validate(pyss_file)
+        except ValidationError as e:
+            log_error(e.message, title="Validation Error")
             sys.exit(1)
 
-    if script_header.max_version is not None:
-        if version.parse(app_version("pyss")) > version.parse(
-            script_header.max_version
-        ):
-            log_error(
-                f"PySS version {app_version('pyss')} is not supported by this PySS project."
+    script_header = pyss_file.header
+
+    if script_header.min_version is not None or script_header.max_version is not None:
+        from packaging import version
+
+        current_version = version.parse(pyss_version())
+
+        if script_header.min_version is not None:
+            if current_version < version.parse(script_header.min_version):
+                log_error(
+                    f"This PySS project requires at least version {script_header.min_version} of PySS."
+                )
+                log_error(f"Current version: {pyss_version()}.")
+                sys.exit(1)
+
+        if script_header.max_version is not None:
+            if current_version > version.parse(script_header.max_version):
+                log_error(
+                    f"PySS version {pyss_version()} is not supported by this PySS project."
+                )
+                sys.exit(1)
+
+    if scoped:
+        pyss_file.valid_scripts = set()
+        if pyss_file.cache_key is not None:
+            store_cached_config(
+                pyss_file.cache_key, dict(pyss_file), False, pyss_file.valid_scripts
             )
-            sys.exit(1)
+        return Scripts(pyss_file, pyss_file["scripts"])
+
+    pyss_file.validated = True
+    if pyss_file.cache_key is not None:
+        store_cached_config(pyss_file.cache_key, dict(pyss_file))
 
     return Scripts(pyss_file, pyss_file["scripts"])
 
@@ -87,18 +225,24 @@ def print_scripts(scripts: Scripts):
     file_location_colored = colored(scripts.pyss_file.file_location, FOUND_COLOR)
     print(f"Available Scripts found in {file_location_colored}:")
 
+    listed = [script for script in scripts if not script.get("internal", False)]
+    if scripts.pyss_file.header.include:
+        from pyss._include import Includes, IncludeError
+
+        names = {script["name"] for script in scripts}
+        try:
+            included = Includes(scripts.pyss_file).scripts()
+        except IncludeError as e:
+            log_error(str(e))
+            sys.exit(1)
+        listed += [script for script in included if script["name"] not in names]
+
     name_len = 0
-    for script in scripts:
-        if "internal" in script:
-            if script["internal"]:
-                continue
+    for script in listed:
         name_len = max(name_len, len(script["name"]))
 
-    for script in scripts:
-        if "internal" in script:
-            if script["internal"]:
-                continue
+    for script in listed:
         script_name = script["name"].ljust(name_len)
         script_name_colored = colored(script_name, SCRIPT_COLOR)
-        print(f"    - {script_name_colored} : {script['description']}")
+        print(f"    - {script_name_colored} : {script.get('description', '')}")
     sys.exit(0)
@@ -0,0 +1,272 @@
+import os
+import shlex
+import signal
+import select
+import threading
+import subprocess
+
+from pyss._output import pump
+from pyss._types import Command
+
+# Shells that understand the POSIX redirections the session protocol uses.
+POSIX_SHELLS = frozenset(["sh", "ash", "dash", "bash", "ksh", "mksh", "zsh", "yash"])
+
+SESSION_POLL_INTERVAL = 0.1
+
+
+def session_shell(shell: str | None) -> str | None:
+    """
+    Returns the shell to run a session in, given the resolved shell of the
+    script, or None if sessions are not supported by it, in which case the
+    commands run in a process of their own.
+    """
+    if os.name != "posix":
+        return None
+    if shell is None:
+        return "/bin/sh"
+    if os.path.basename(shell) not in POSIX_SHELLS:
+        return None
+    return shell
+
+
+def runs_in_session(command: Command, shell: str) -> bool:
+    """
+    Returns True if the command can run in the session of its script, a
+    session of the given shell. Commands that run without a shell
+    ('exec: true') or in a shell other than the session's run in a
+    process of their own.
+    """
+    if command.get_exec():
+        return False
+
+    own_shell = command.get_shell()
+    return own_shell is None or session_shell(own_shell.get()) == shell
+
+
+def session_command(command: str, env: dict[str, any] | None) -> str:
+    """
+    Returns the command to run in a session for a command with an env of
+    its own: a subshell that exports the variables, so that they do not
+    leak into the commands that follow.
+    """
+    if not env:
+        return command
+
+    exports = " ".join(
+        f"{name}={shlex.quote(f'{value}')}" for name, value in env.items()
+    )
+    # The newline ends a comment at the end of the command.
+    return f"(export {exports}; {command}\n)"
+
+
+def _descriptor(stream, mode: int) -> int:
+    """
+    Returns a new descriptor for a stream given like to subprocess.Popen,
+    numbered above the descriptors the session uses in the shell.
+    """
+    import fcntl
+
+    if stream == subprocess.DEVNULL:
+        fd = os.open(os.devnull, mode)
+    else:
+        try:
+            fd = os.dup(stream if isinstance(stream, int) else stream.fileno())
+        except OSError:
+            # The stream has been closed, e.g. the standard input.
+            fd = os.open(os.devnull, mode)
+
+    try:
+        return fcntl.fcntl(fd, fcntl.F_DUPFD_CLOEXEC, 10)
+    finally:
+        os.close(fd)
+
+
+class _SpawnedProcess:
+    """
+    The parts of subprocess.Popen that the session and cancellations use,
+    for a process started with os.posix_spawn().
+    """
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.returncode = None
+
+    def poll(self) -> int | None:
+        if self.returncode is None:
+            pid, status = os.waitpid(self.pid, os.WNOHANG)
+            if pid != 0:
+                self.returncode = os.waitstatus_to_exitcode(status)
+        return self.returncode
+
+    def wait(self) -> int:
+        if self.returncode is None:
+            _, status = os.waitpid(self.pid, 0)
+            self.returncode = os.waitstatus_to_exitcode(status)
+        return self.returncode
+
+    def terminate(self):
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+class ShellSession:
+    """
+    A shell process that runs the commands of a script one after another,
+    so that state such as the working directory, shell variables and
+    activated virtual environments carries over between them.
+
+    The shell reads its commands from a pipe on its standard input. Each
+    command is evaluated with its standard input redirected to the
+    original standard input (which the shell keeps on fd 4), and its exit
+    code is written as a line to a status pipe (fd 3) once it has
+    finished. Commands run with both descriptors closed, so they can not
+    interfere with the protocol. A command that exits the shell ends the
+    session with the exit code of the shell.
+
+    The shell is started with os.posix_spawn(), because subprocess can
+    not place descriptors at given numbers and not every shell can
+    redirect descriptors above 9.
+    """
+
+    proc: _SpawnedProcess
+    stdout: any
+    stderr: any
+    pump_thread: threading.Thread | None
+
+    def __init__(
+        self,
+        shell: str,
+        cwd: str,
+        env: dict[str, str],
+        stdout,
+        stderr,
+        start_new_session: bool = False,
+    ):
+        import shutil
+
+        self.stdout = self.stderr = None
+        self.pump_thread = None
+
+        # Descriptors of the shell, in the order of their numbers in it.
+        sources = []
+        control_read, control_write = os.pipe()
+        status_read, status_write = os.pipe()
+        try:
+            sources.append(_descriptor(control_read, os.O_RDONLY))
+            for stream, name in [(stdout, "stdout"), (stderr, "stderr")]:
+                if stream == subprocess.PIPE:
+                    read, write = os.pipe()
+                    setattr(self, name, os.fdopen(read, "rb", buffering=0))
+                    sources.append(_descriptor(write, os.O_WRONLY))
+                    os.close(write)
+                else:
+                    sources.append(_descriptor(stream, os.O_WRONLY))
+            sources.append(_descriptor(status_write, os.O_WRONLY))
+            sources.append(_descriptor(0, os.O_RDONLY))
+
+            # The sources are numbered above 9, so none of them is
+            # overwritten before it has been duplicated.
+            executable = shutil.which(shell, path=env.get("PATH", os.defpath))
+            pid = os.posix_spawn(
+                executable or shell,
+                [shell],
+                env,
+                file_actions=[
+                    (os.POSIX_SPAWN_DUP2, source, target)
+                    for target, source in enumerate(sources)
+                ],
+                setsid=start_new_session,
+            )
+        except BaseException:
+            for pipe in [self.stdout, self.stderr]:
+                if pipe is not None:
+                    pipe.close()
+            os.close(control_write)
+            os.close(status_read)
+            raise
+        finally:
+            for descriptor in [control_read, status_write, *sources]:
+                os.close(descriptor)
+
+        self.proc = _SpawnedProcess(pid)
+        self.control = os.fdopen(control_write, "wb")
+        self.status = status_read
+        self.buffer = b""
+        self.__send(f"cd -- {shlex.quote(cwd)} || exit\n")
+
+    def pump(self, stdout_handler=None, stderr_handler=None, outputs=()):
+        """
+        Passes the output of the shell to the handlers on a background
+        thread, for the streams that were opened as pipes. The outputs
+        are closed once the shell has closed its streams.
+        """
+        pipes = [
+            (pipe, handler)
+            for pipe, handler in [
+                (self.stdout, stdout_handler),
+                (self.stderr, stderr_handler),
+            ]
+            if pipe is not None
+        ]
+
+        def run():
+            pump(pipes)
+            for output in outputs:
+                output.close()
+
+        if pipes:
+            self.pump_thread = threading.Thread(target=run, daemon=True)
+            self.pump_thread.start()
+
+    def __send(self, line: str):
+        self.control.write(line.encode())
+        self.control.flush()
+
+    def run(self, command: str) -> int:
+        """
+        Runs the command in the shell and returns its exit code once it
+        has finished.
+        """
+        try:
+            self.__send(f"eval {shlex.quote(command)} 0<&4 3>&- 4<&-; echo $? >&3\n")
+        except (BrokenPipeError, ValueError):
+            return self.proc.wait()
+
+        while b"\n" not in self.buffer:
+            # Commands started in the background may keep a copy of the
+            # status pipe open, so the shell exiting is noticed by polling
+            # rather than by the end of the pipe.
+            readable, _, _ = select.select([self.status], [], [], SESSION_POLL_INTERVAL)
+            if readable:
+                data = os.read(self.status, 64)
+                if not data:
+                    return self.proc.wait()
+                self.buffer += data
+            elif self.proc.poll() is not None:
+                readable, _, _ = select.select([self.status], [], [], 0)
+                if not readable:
+                    return self.proc.returncode
+
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        return int(line)
+
+    def close(self):
+        """
+        Ends the session and waits for the shell to exit.
+        """
+        try:
+            self.control.close()
+        except BrokenPipeError:
+            pass
+        self.proc.wait()
+        if self.pump_thread is not None:
+            self.pump_thread.join()
+        for pipe in [self.stdout, self.stderr]:
+            if pipe is not None:
+                pipe.close()
+        if self.status >= 0:
+            os.close(self.status)
+            self.status = -1
@@ -1,5 +1,9 @@
 import os
 import sys
+import signal
+import threading
+
+from pyss._environment import Environment
 
 
 class PlatformSpecificValue:
@@ -23,17 +27,26 @@ class PyssFileHeader:
     min_version: str
     max_version: str
     shell: PlatformSpecificValue
+    include: list
 
     def __init__(self, data: dict):
         self.min_version = data.get("min_version")
         self.max_version = data.get("max_version")
         self.shell = PlatformSpecificValue(data.get("shell"))
+        self.include = data.get("include") or []
 
 
 class PySSFile(dict):
     file_location: str
     header: PyssFileHeader
     env: dict[str, any] = None
+    validated: bool = False
+    # The scripts that have been validated on their own, once the outline
+    # of the file has been validated.
+    valid_scripts: set[str] | None = None
+    cached: bool = False
+    cache_key: dict = None
+    use_cache: bool = True
 
     def __init__(self, data: dict, file_location: str):
         super(PySSFile, self).__init__(data)
@@ -50,11 +63,86 @@ class Scripts(list):
         self.pyss_file = pyss_file
 
 
+class Cancellation:
+    """
+    Cancels a run. Once cancelled, no further commands are started and
+    the commands that are running are terminated along with their
+    process groups.
+    """
+
+    event: threading.Event
+    processes: set
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.processes = set()
+        self.lock = threading.Lock()
+
+    def is_cancelled(self) -> bool:
+        return self.event.is_set()
+
+    def cancel(self, kill: bool = False):
+        with self.lock:
+            self.event.set()
+            processes = list(self.processes)
+
+        for process in processes:
+            _terminate(process, kill)
+
+    def register(self, process) -> bool:
+        """
+        Registers a running process so that it is terminated when the run
+        is cancelled. Returns False, after terminating the process, if the
+        run has already been cancelled.
+        """
+        with self.lock:
+            if not self.event.is_set():
+                self.processes.add(process)
+                return True
+
+        _terminate(process, False)
+        return False
+
+    def unregister(self, process):
+        with self.lock:
+            self.processes.discard(process)
+
+
+def _terminate(process, kill: bool):
+    # Commands running on workers have no local process.
+    if os.name != "posix" or process.pid is None:
+        if kill:
+            process.kill()
+        else:
+            process.terminate()
+        return
+
+    # Processes that can be cancelled are started in a session of their
+    # own, so the whole process group is signalled.
+    try:
+        os.killpg(process.pid, signal.SIGKILL if kill else signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
 class PyssCfg:
     scripts: Scripts
     script_name: str
     quiet: bool
     disable_output: bool
+    jobs: int | None
+    job_slots: threading.Semaphore
+    force: bool
+    result_cache: str | None
+    plan: "Plan | None"
+    env: Environment | None
+    cancellation: Cancellation | None
+    prefix: str | None
+    profiler: "Profiler | None"
+    member: str | None
+    executor: "WorkerPool | None"
+    output_on_failure: bool
+    estimates: "Estimates | None"
 
     def __init__(
         self,
@@ -62,11 +150,68 @@ class PyssCfg:
         script_name: str,
         quiet: bool,
         disable_output: bool,
+        jobs: int | None = None,
+        job_slots: threading.Semaphore | None = None,
+        force: bool = False,
+        result_cache: str | None = None,
+        plan: "Plan | None" = None,
+        env: Environment | None = None,
+        cancellation: Cancellation | None = None,
+        prefix: str | None = None,
+        profiler: "Profiler | None" = None,
+        member: str | None = None,
+        executor: "WorkerPool | None" = None,
+        output_on_failure: bool = False,
+        estimates: "Estimates | None" = None,
     ):
         self.scripts = scripts
         self.script_name = script_name
         self.quiet = quiet
         self.disable_output = disable_output
+        self.jobs = jobs
+        self.job_slots = job_slots
+        if self.job_slots is None:
+            self.job_slots = threading.BoundedSemaphore(self.max_jobs())
+        self.force = force
+        self.result_cache = result_cache
+        self.plan = plan
+        self.env = env
+        self.cancellation = cancellation
+        self.prefix = prefix
+        self.profiler = profiler
+        self.member = member
+        self.executor = executor
+        self.output_on_failure = output_on_failure
+        self.estimates = estimates
+
+    def derive(self, **overrides) -> "PyssCfg":
+        """
+        Returns a copy of this configuration with the given fields
+        replaced, sharing everything else (including the job slots).
+        """
+        cfg = PyssCfg.__new__(PyssCfg)
+        cfg.__dict__.update(self.__dict__)
+        cfg.__dict__.update(overrides)
+        return cfg
+
+    def prefixed(self, name: str) -> "PyssCfg":
+        """
+        Returns a copy of this configuration whose output is prefixed with
+        the name, qualified by the workspace member being run, if any.
+        """
+        if self.member is not None:
+            name = f"{self.member}:{name}"
+        return self.derive(prefix=name)
+
+    def max_jobs(self) -> int:
+        """
+        Returns the maximum number of commands that may run at once. When
+        no limit was given, this defaults to the number of CPUs plus two
+        so that I/O bound commands can overlap.
+        """
+        if self.jobs is not None:
+            return self.jobs
+        return (os.cpu_count() or 1) + 2
 
 
 class Command:
@@ -86,7 +231,29 @@ class Command:
             if sys.platform in self._value:
                 return self._value[sys.platform]
 
+    def get_env(self) -> dict[str, any] | None:
+        if isinstance(self._value, dict):
+            return self._value.get("env")
+        return None
+
     def get_shell(self) -> PlatformSpecificValue | None:
-        if "shell" in self._value:
+        if isinstance(self._value, dict) and isinstance(
+            self._value.get("shell"), (str, dict)
+        ):
             return PlatformSpecificValue(self._value.get("shell"))
         return None
+
+    def get_exec(self) -> bool | None:
+        """
+        Returns True if the command object requires running the command
+        without a shell ('exec: true' or 'shell: false'), False if it
+        requires a shell ('exec: false' or 'shell: true'), or None if
+        PySS may decide.
+        """
+        if not isinstance(self._value, dict):
+            return None
+        if "exec" in self._value:
+            return self._value["exec"]
+        if isinstance(self._value.get("shell"), bool):
+            return not self._value["shell"]
+        return None
@@ -1,13 +1,15 @@
-import jsonschema
 import re
 
-__version_format_checker = jsonschema.FormatChecker()
+from pyss._constants import OUTPUT_MODES, DURATION_PATTERN
+
+__version_pattern = re.compile(r"^\d+\.\d+\.\d+$")
+__duration_pattern = re.compile(DURATION_PATTERN)
 
 
-@__version_format_checker.checks("version")
 def __version_format(value):
-    pattern = r"^\d+\.\d+\.\d+$"
-    if not re.match(pattern, value):
+    import jsonschema
+
+    if not __version_pattern.match(value):
         message = f"'{value}' is not a valid version format. Expected format: Major.Minor.Patch (e.g., 1.0.0)"
         raise jsonschema.ValidationError(
             message, instance=value, schema_path=["properties", "version", "format"]
@@ -44,10 +46,40 @@ __shell = {
     ]
 }
 
+# A command object may also turn the shell off, or force it on.
+__command_shell = {"anyOf": [*__shell["anyOf"], {"type": "boolean"}]}
+
 __env = {
     "type": "object",
 }
 
+__matrix_value = {"type": ["string", "number", "boolean"]}
+
+__matrix = {
+    "type": "object",
+    "properties": {
+        # Values of each environment variable, combined into their
+        # cartesian product
+        "env": {
+            "type": "object",
+            "additionalProperties": {
+                "type": "array",
+                "items": __matrix_value,
+                "minItems": 1,
+            },
+            "minProperties": 1,
+        },
+        # Combinations to leave out
+        "exclude": {
+            "type": "array",
+            "items": {"type": "object", "additionalProperties": __matrix_value},
+        },
+        "max_parallel": {"type": "integer", "minimum": 1},
+        "fail_fast": {"type": "boolean"},
+    },
+    "required": ["env"],
+}
+
 __header = {
     "type": "object",
     "properties": {
@@ -55,6 +87,23 @@ __header = {
         "min_version": {"type": "string", "format": "version"},
         "max_version": {"type": "string", "format": "version"},
         "shell": __shell,
+        # Files with more scripts, loaded when one of them is needed
+        "include": {
+            "type": "array",
+            "items": {
+                "anyOf": [
+                    {"type": "string"},
+                    {
+                        "type": "object",
+                        "properties": {
+                            "path": {"type": "string"},
+                            "scripts": {"type": "array", "items": {"type": "string"}},
+                        },
+                        "required": ["path"],
+                    },
+                ]
+            },
+        },
     },
 }
 
@@ -74,7 +123,8 @@ __command = {
                 "cygwin": {"type": "string"},
                 "darwin": {"type": "string"},
                 "cmd": {"type": "string"},
-                "shell": __shell,
+                "shell": __command_shell,
+                "exec": {"type": "boolean"},
                 "env": __env,
             },
             "oneOf": [
@@ -114,6 +164,9 @@ __dependency = {
                 "silent": {
                     "type": "boolean",
                 },
+                "output": {
+                    "enum": OUTPUT_MODES,
+                },
             },
             "oneOf": [
                 {"required": ["script"]},
@@ -131,9 +184,87 @@ __dependencies = {
             "type": "array",
             "items": __dependency,
         },
+        {
+            "type": "object",
+            "properties": {
+                "parallel": {"type": "boolean"},
+                "dependencies": {
+                    "type": "array",
+                    "items": __dependency,
+                },
+            },
+            "required": ["dependencies"],
+        },
     ]
 }
 
+__script = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "description": {"type": "string"},
+        "internal": {"type": "boolean"},
+        "extends": {"type": "string"},
+        "before": __dependencies,
+        "after": __dependencies,
+        "command": __command,
+        "commands": {"type": "array", "items": __command},
+        "inputs": {"type": "array", "items": {"type": "string"}},
+        "outputs": {"type": "array", "items": {"type": "string"}},
+        "freshness": {"enum": ["mtime", "hash"]},
+        "watch": {"type": "array", "items": {"type": "string"}},
+        "matrix": __matrix,
+        "session": {"type": "boolean"},
+        "estimate": {
+            "anyOf": [
+                {"type": "number", "minimum": 0},
+                {"type": "string", "pattern": DURATION_PATTERN},
+            ]
+        },
+        "cache": {
+            "anyOf": [
+                {"type": "boolean"},
+                {
+                    "type": "object",
+                    "properties": {
+                        "env": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                        },
+                        "replay": {"type": "boolean"},
+                    },
+                },
+            ]
+        },
+    },
+    "required": ["name"],
+    "oneOf": [
+        {"required": ["command"]},
+        {"required": ["commands"]},
+        # Scripts that extend another one may take its commands.
+        {
+            "required": ["extends"],
+            "not": {"anyOf": [{"required": ["command"]}, {"required": ["commands"]}]},
+        },
+    ],
+    "allOf": [
+        {
+            "if": {
+                "not": {
+                    "anyOf": [
+                        {
+                            "properties": {"internal": {"const": True}},
+                            "required": ["internal"],
+                        },
+                        {"required": ["extends"]},
+                    ]
+                }
+            },
+            "then": {"required": ["description"]},
+        }
+    ],
+}
+
 __schema = {
     "type": "object",
     "properties": {
@@ -141,43 +272,338 @@ __schema = {
         "env": __env,
         # PySS Configuration
         "pyss": __header,
-        # Script Configuration
-        "scripts": {
-            "type": "array",
-            "items": {
-                "type": "object",
-                "properties": {
-                    "name": {"type": "string"},
-                    "description": {"type": "string"},
-                    "internal": {"type": "boolean"},
-                    "before": __dependencies,
-                    "after": __dependencies,
-                    "command": __command,
-                    "commands": {"type": "array", "items": __command},
-                },
-                "required": ["name"],
-                "oneOf": [{"required": ["command"]}, {"required": ["commands"]}],
-                "allOf": [
-                    {
-                        "if": {
-                            "not": {
-                                "properties": {"internal": {"const": True}},
-                                "required": ["internal"],
-                            }
-                        },
-                        "then": {"required": ["description"]},
-                    }
-                ],
+        # Directories of a monorepo with configuration files of their own
+        "workspace": {
+            "type": "object",
+            "properties": {
+                "members": {"type": "array", "items": {"type": "string"}},
             },
+            "required": ["members"],
         },
+        # Script Configuration
+        "scripts": {"type": "array", "items": __script},
     },
     "required": ["scripts"],
 }
 
+# Everything but the scripts themselves, which are validated one at a
+# time when a run needs them
+__outline_schema = {
+    **__schema,
+    "properties": {**__schema["properties"], "scripts": {"type": "array"}},
+}
 
-def validate_pyss_data(data: dict):
-    global __version_format_checker
+# Files included by a configuration file
+__fragment_schema = {
+    "type": "object",
+    "properties": {
+        "env": __env,
+        "scripts": {"type": "array", "items": __script},
+    },
+    "required": ["scripts"],
+}
+
+
+# jsonschema validators for the schemas, built on first use. Importing
+# jsonschema takes longer than checking a whole configuration by hand, so
+# it is only used to report errors.
+__validators: dict[str, any] = {}
+
+
+def __jsonschema_validator(name: str, schema: dict):
+    validator = __validators.get(name)
+    if validator is None:
+        import jsonschema
+
+        format_checker = jsonschema.FormatChecker()
+        format_checker.checks("version")(__version_format)
+
+        # The schemas are part of PySS, so they are not checked themselves.
+        validator_class = jsonschema.validators.validator_for(schema)
+        validator = validator_class(schema, format_checker=format_checker)
+        __validators[name] = validator
+    return validator
+
+
+def __jsonschema_validate(name: str, schema: dict, data: dict):
+    import jsonschema
+
+    validator = __jsonschema_validator(name, schema)
+    error = jsonschema.exceptions.best_match(validator.iter_errors(data))
+    if error is not None:
+        raise error
+
+
+# A hand-written check of the schemas. It accepts only data the schemas
+# accept, but may reject valid data in rare, ambiguous cases, which are
+# then left to jsonschema.
+
+__platforms = ("aix", "emscripten", "linux", "wasi", "win32", "cygwin", "darwin")
+__command_platforms = ("emscripten", "linux", "wasi", "win32", "cygwin", "darwin")
+__dependency_keys = ("script", "command", "commands")
+
+
+def __is_string_list(value) -> bool:
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
 
-    jsonschema.validate(
-        instance=data, schema=__schema, format_checker=__version_format_checker
+
+def __is_matrix_value(value) -> bool:
+    return isinstance(value, (str, int, float))
+
+
+def __valid_shell(value) -> bool:
+    if isinstance(value, str):
+        return True
+    if not isinstance(value, dict):
+        return False
+    present = [key for key in __platforms if key in value]
+    return len(present) == 1 and isinstance(value[present[0]], str)
+
+
+def __valid_command(value) -> bool:
+    if isinstance(value, str):
+        return True
+    if not isinstance(value, dict):
+        return False
+    for key in (*__platforms, "cmd"):
+        if key in value and not isinstance(value[key], str):
+            return False
+    if "shell" in value and not (
+        isinstance(value["shell"], bool) or __valid_shell(value["shell"])
+    ):
+        return False
+    if "exec" in value and not isinstance(value["exec"], bool):
+        return False
+    if "env" in value and not isinstance(value["env"], dict):
+        return False
+    return ("cmd" in value) != any(key in value for key in __command_platforms)
+
+
+def __valid_commands(value) -> bool:
+    return isinstance(value, list) and all(__valid_command(item) for item in value)
+
+
+def __valid_dependency(value) -> bool:
+    if isinstance(value, str):
+        return True
+    if not isinstance(value, dict):
+        return False
+    if "script" in value and not isinstance(value["script"], str):
+        return False
+    if "command" in value and not __valid_command(value["command"]):
+        return False
+    if "commands" in value and not __valid_commands(value["commands"]):
+        return False
+    if "env" in value and not isinstance(value["env"], dict):
+        return False
+    if "silent" in value and not isinstance(value["silent"], bool):
+        return False
+    if "output" in value and value["output"] not in OUTPUT_MODES:
+        return False
+    return sum(key in value for key in __dependency_keys) == 1
+
+
+def __valid_dependencies(value) -> bool:
+    if isinstance(value, list):
+        return all(__valid_dependency(item) for item in value)
+    if isinstance(value, dict) and "dependencies" in value:
+        # Objects that could also be read as a single dependency.
+        if any(key in value for key in __dependency_keys):
+            return False
+        if "parallel" in value and not isinstance(value["parallel"], bool):
+            return False
+        dependencies = value["dependencies"]
+        return isinstance(dependencies, list) and all(
+            __valid_dependency(item) for item in dependencies
+        )
+    return __valid_dependency(value)
+
+
+def __valid_matrix(value) -> bool:
+    if not isinstance(value, dict) or not isinstance(value.get("env"), dict):
+        return False
+    if not value["env"]:
+        return False
+    for values in value["env"].values():
+        if not isinstance(values, list) or not values:
+            return False
+        if not all(__is_matrix_value(item) for item in values):
+            return False
+    if "exclude" in value:
+        exclude = value["exclude"]
+        if not isinstance(exclude, list):
+            return False
+        for combination in exclude:
+            if not isinstance(combination, dict):
+                return False
+            if not all(__is_matrix_value(item) for item in combination.values()):
+                return False
+    if "max_parallel" in value:
+        max_parallel = value["max_parallel"]
+        if type(max_parallel) is not int or max_parallel < 1:
+            return False
+    if "fail_fast" in value and not isinstance(value["fail_fast"], bool):
+        return False
+    return True
+
+
+def __valid_cache(value) -> bool:
+    if isinstance(value, bool):
+        return True
+    if not isinstance(value, dict):
+        return False
+    if "env" in value and not __is_string_list(value["env"]):
+        return False
+    return "replay" not in value or isinstance(value["replay"], bool)
+
+
+def __valid_estimate(value) -> bool:
+    if isinstance(value, str):
+        return __duration_pattern.match(value) is not None
+    return (
+        isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0
     )
+
+
+def __valid_script(value) -> bool:
+    if not isinstance(value, dict) or not isinstance(value.get("name"), str):
+        return False
+    for key in ("description", "extends"):
+        if key in value and not isinstance(value[key], str):
+            return False
+    for key in ("internal", "session"):
+        if key in value and not isinstance(value[key], bool):
+            return False
+    for key in ("before", "after"):
+        if key in value and not __valid_dependencies(value[key]):
+            return False
+    for key in ("inputs", "outputs", "watch"):
+        if key in value and not __is_string_list(value[key]):
+            return False
+    if "command" in value and not __valid_command(value["command"]):
+        return False
+    if "commands" in value and not __valid_commands(value["commands"]):
+        return False
+    if "freshness" in value and value["freshness"] not in ("mtime", "hash"):
+        return False
+    if "matrix" in value and not __valid_matrix(value["matrix"]):
+        return False
+    if "cache" in value and not __valid_cache(value["cache"]):
+        return False
+    if "estimate" in value and not __valid_estimate(value["estimate"]):
+        return False
+
+    commands = ("command" in value) + ("commands" in value)
+    if commands != 1 and not (commands == 0 and "extends" in value):
+        return False
+    if value.get("internal") is not True and "extends" not in value:
+        return "description" in value
+    return True
+
+
+def __valid_scripts(value) -> bool:
+    return isinstance(value, list) and all(__valid_script(item) for item in value)
+
+
+def __valid_header(value) -> bool:
+    if not isinstance(value, dict):
+        return False
+    for key in ("min_version", "max_version"):
+        if key in value and not (
+            isinstance(value[key], str) and __version_pattern.match(value[key])
+        ):
+            return False
+    if "shell" in value and not __valid_shell(value["shell"]):
+        return False
+    if "include" in value:
+        include = value["include"]
+        if not isinstance(include, list):
+            return False
+        for entry in include:
+            if isinstance(entry, str):
+                continue
+            if not isinstance(entry, dict) or not isinstance(entry.get("path"), str):
+                return False
+            if "scripts" in entry and not __is_string_list(entry["scripts"]):
+                return False
+    return True
+
+
+def is_valid_pyss_outline(data: dict) -> bool:
+    """
+    Checks the configuration like is_valid_pyss_data(), except for the
+    scripts themselves.
+    """
+    if not isinstance(data, dict) or "scripts" not in data:
+        return False
+    if "env" in data and not isinstance(data["env"], dict):
+        return False
+    if "pyss" in data and not __valid_header(data["pyss"]):
+        return False
+    if "workspace" in data:
+        workspace = data["workspace"]
+        if not isinstance(workspace, dict) or "members" not in workspace:
+            return False
+        if not __is_string_list(workspace["members"]):
+            return False
+    return isinstance(data["scripts"], list)
+
+
+def is_valid_pyss_data(data: dict) -> bool:
+    """
+    Checks the configuration without jsonschema. Returns True if it is
+    valid. False means that it has to be validated with
+    validate_pyss_data() to tell, and to get the error.
+    """
+    return is_valid_pyss_outline(data) and __valid_scripts(data["scripts"])
+
+
+def is_valid_script_data(data: dict) -> bool:
+    """
+    Checks a single script like is_valid_pyss_data().
+    """
+    return __valid_script(data)
+
+
+def is_valid_fragment_data(data: dict) -> bool:
+    """
+    Checks an included file like is_valid_pyss_data().
+    """
+    if not isinstance(data, dict) or "scripts" not in data:
+        return False
+    if "env" in data and not isinstance(data["env"], dict):
+        return False
+    return __valid_scripts(data["scripts"])
+
+
+def validate_pyss_data(data: dict):
+    """
+    Raises a jsonschema.ValidationError if the configuration is not valid.
+    """
+    if not is_valid_pyss_data(data):
+        __jsonschema_validate("pyss", __schema, data)
+
+
+def validate_pyss_outline(data: dict):
+    """
+    Raises a jsonschema.ValidationError if the configuration, except for
+    the scripts themselves, is not valid.
+    """
+    if not is_valid_pyss_outline(data):
+        __jsonschema_validate("outline", __outline_schema, data)
+
+
+def validate_script_data(data: dict):
+    """
+    Raises a jsonschema.ValidationError if the script is not valid.
+    """
+    if not is_valid_script_data(data):
+        __jsonschema_validate("script", __script, data)
+
+
+def validate_fragment_data(data: dict):
+    """
+    Raises a jsonschema.ValidationError if the included file is not valid.
+    """
+    if not is_valid_fragment_data(data):
+        __jsonschema_validate("fragment", __fragment_schema, data)
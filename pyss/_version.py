@@ -0,0 +1,37 @@
+import os
+import re
+import sys
+
+from functools import lru_cache
+
+__dist_info_pattern = re.compile(r"^pyss-([^-]+)\.dist-info$", re.IGNORECASE)
+
+
+@lru_cache(maxsize=None)
+def pyss_version() -> str:
+    """
+    Returns the installed version of PySS. Regular installations keep
+    their dist-info directory next to the package, and editable ones in a
+    directory on sys.path, so the version is read from its name before
+    falling back to the much slower importlib.metadata lookup.
+    """
+    package_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for directory in [package_directory, *sys.path]:
+        try:
+            versions = [
+                match.group(1)
+                for match in map(
+                    __dist_info_pattern.match, os.listdir(directory or os.curdir)
+                )
+                if match is not None
+            ]
+        except OSError:
+            continue
+        if len(versions) == 1:
+            return versions[0]
+        if versions:
+            break
+
+    from importlib.metadata import version as app_version
+
+    return app_version("pyss")
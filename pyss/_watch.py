@@ -0,0 +1,382 @@
+import os
+import sys
+import glob
+import time
+import threading
+
+from pyss._logging import log_error, log_info
+from pyss._freshness import expand_paths
+from pyss._constants import (
+    DETAIL_COLOR,
+    WATCH_POLL_ENV,
+    WATCH_POLL_INTERVAL,
+    WATCH_DEBOUNCE,
+    WATCH_KILL_TIMEOUT,
+)
+from pyss._types import PyssCfg, Cancellation
+from pyss._plan import Plan, PlanError, ScriptNode
+
+# inotify(7) flags.
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_ONLYDIR = 0x1000000
+
+Snapshot = dict[str, tuple[int, int]]
+
+
+def watch_patterns(script: ScriptNode) -> list[str]:
+    """
+    Returns the glob patterns watched for the script: its 'watch' paths,
+    or its 'inputs' if it has none, along with the ones of every script
+    it depends on.
+    """
+    patterns = {}
+    seen = set()
+    stack = [script]
+    while stack:
+        node = stack.pop()
+        if node.name in seen:
+            continue
+        seen.add(node.name)
+
+        definition = node.definition
+        for pattern in definition.get("watch", definition.get("inputs", [])):
+            patterns.setdefault(pattern, None)
+
+        for dependencies in [node.before, node.after]:
+            if dependencies is not None:
+                stack.extend(
+                    entry.script
+                    for entry in dependencies.entries
+                    if entry.script is not None
+                )
+
+    return list(patterns)
+
+
+class PollingWatcher:
+    """
+    Detects changes by periodically comparing the modification times and
+    sizes of the watched files.
+    """
+
+    root: str
+    patterns: list[str]
+    file_location: str
+
+    def __init__(self, root: str, patterns: list[str], file_location: str):
+        self.root = root
+        self.patterns = patterns
+        self.file_location = file_location
+
+    def snapshot(self) -> Snapshot:
+        snapshot = {}
+        files = expand_paths(self.patterns, self.root, strict=False)
+        for file in [self.file_location, *files]:
+            try:
+                stat = os.stat(file)
+            except OSError:
+                continue
+            snapshot[file] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self, previous: Snapshot) -> Snapshot:
+        """
+        Blocks until the watched files differ from the previous snapshot
+        and have stopped changing, then returns the new snapshot.
+        """
+        while True:
+            time.sleep(WATCH_POLL_INTERVAL)
+            current = self.snapshot()
+            if current == previous:
+                continue
+
+            # Wait for a burst of changes to settle.
+            while True:
+                time.sleep(WATCH_DEBOUNCE)
+                settled = self.snapshot()
+                if settled == current:
+                    return current
+                current = settled
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(PollingWatcher):
+    """
+    Detects changes with inotify(7). Events only tell the watcher that
+    something happened in one of the watched directories; once they have
+    settled, the watched files are compared with the previous snapshot,
+    so changes to unrelated files in the same directories are ignored.
+    """
+
+    def __init__(self, root: str, patterns: list[str], file_location: str):
+        import ctypes
+        import ctypes.util
+
+        super(InotifyWatcher, self).__init__(root, patterns, file_location)
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.directories = set()
+
+        try:
+            self.refresh()
+        except OSError:
+            self.close()
+            raise
+
+    def __watched_directories(self) -> set[str]:
+        directories = {os.path.dirname(os.path.abspath(self.file_location))}
+        for pattern in self.patterns:
+            parts = pattern.replace(os.sep, "/").split("/")
+            static = []
+            for part in parts[:-1]:
+                if glob.has_magic(part):
+                    break
+                static.append(part)
+
+            base = os.path.normpath(os.path.join(self.root, *static))
+            recursive = len(static) < len(parts) - 1
+            if not glob.has_magic(parts[-1]) and not recursive:
+                # A literal path may name a directory, which matches every
+                # file it contains.
+                path = os.path.join(base, parts[-1])
+                if os.path.isdir(path):
+                    base, recursive = path, True
+
+            # Watch the closest existing directory so that the creation of
+            # missing directories is noticed.
+            while not os.path.isdir(base) and os.path.dirname(base) != base:
+                base, recursive = os.path.dirname(base), False
+
+            directories.add(base)
+            if recursive:
+                for directory, _, _ in os.walk(base):
+                    directories.add(directory)
+
+        return directories
+
+    def refresh(self):
+        """
+        Adds watches for directories that were created since the watcher
+        was started or last refreshed.
+        """
+        import ctypes
+
+        mask = (
+            IN_MODIFY
+            | IN_ATTRIB
+            | IN_CLOSE_WRITE
+            | IN_MOVED_FROM
+            | IN_MOVED_TO
+            | IN_CREATE
+            | IN_DELETE
+            | IN_DELETE_SELF
+            | IN_MOVE_SELF
+            | IN_ONLYDIR
+        )
+        for directory in self.__watched_directories() - self.directories:
+            if self.libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+                errno = ctypes.get_errno()
+                if os.path.isdir(directory):
+                    raise OSError(errno, os.strerror(errno), directory)
+                continue
+            self.directories.add(directory)
+
+    def __drain(self, timeout: float | None) -> bool:
+        import select
+
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+
+        try:
+            while os.read(self.fd, 1 << 16):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def wait(self, previous: Snapshot) -> Snapshot:
+        while True:
+            self.__drain(None)
+            while self.__drain(WATCH_DEBOUNCE):
+                pass
+
+            try:
+                self.refresh()
+            except OSError:
+                pass
+
+            current = self.snapshot()
+            if current != previous:
+                return current
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def create_watcher(
+    root: str, patterns: list[str], file_location: str
+) -> PollingWatcher:
+    """
+    Returns an inotify based watcher on Linux, falling back to polling on
+    other platforms, when inotify is unavailable (e.g. the watch limit has
+    been reached) or when PYSS_WATCH_POLL is set.
+    """
+    if sys.platform.startswith("linux") and not os.environ.get(WATCH_POLL_ENV):
+        try:
+            return InotifyWatcher(root, patterns, file_location)
+        except (OSError, AttributeError) as e:
+            log_error(f"Falling back to polling: {e}", title="Watch")
+
+    return PollingWatcher(root, patterns, file_location)
+
+
+class WatchRun:
+    """
+    A run of the watched script on a background thread.
+    """
+
+    def __init__(self, cfg: PyssCfg, report=None):
+        from pyss._execution import run_pyss
+        from pyss._profile import Profiler
+
+        self.cancellation = Cancellation()
+        cfg = cfg.derive(cancellation=self.cancellation)
+        if cfg.profiler is not None:
+            # Each run is profiled on its own, so that spans do not pile
+            # up for as long as the script is watched.
+            cfg = cfg.derive(profiler=Profiler())
+        self.thread = threading.Thread(target=self.__run, args=(run_pyss, cfg, report))
+        self.thread.start()
+
+    def __run(self, run_pyss, cfg: PyssCfg, report):
+        exit_code = run_pyss(cfg)
+        if self.cancellation.is_cancelled():
+            return
+        if report is not None and cfg.profiler is not None:
+            report(cfg.profiler)
+        if not cfg.quiet:
+            log_info(
+                "watch",
+                f"'{cfg.script_name}' exited with code {exit_code}, waiting for changes...",
+                DETAIL_COLOR,
+            )
+
+    def stop(self):
+        self.cancellation.cancel()
+        self.thread.join(WATCH_KILL_TIMEOUT)
+        if self.thread.is_alive():
+            self.cancellation.cancel(kill=True)
+            self.thread.join()
+
+
+def __reload(cfg: PyssCfg) -> PyssCfg:
+    import io
+    import contextlib
+
+    from pyss._scripts import load_pyss_file, get_scripts
+
+    file_location = cfg.scripts.pyss_file.file_location
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            pyss_file = load_pyss_file(file_location, cfg.scripts.pyss_file.use_cache)
+            scripts = get_scripts(pyss_file, scoped=True)
+    except (SystemExit, Exception) as e:
+        sys.stdout.write(output.getvalue())
+        if not isinstance(e, SystemExit):
+            log_error(e, title="Watch")
+        log_error(f"Keeping the previous version of {file_location}.", title="Watch")
+        return cfg
+
+    return cfg.derive(scripts=scripts, plan=Plan(scripts), env=None)
+
+
+def __resolve_patterns(cfg: PyssCfg) -> list[str] | None:
+    try:
+        script = cfg.plan.resolve(cfg.script_name)
+    except PlanError as e:
+        log_error(e, title="Plan Error")
+        return None
+
+    patterns = watch_patterns(script)
+    if not patterns:
+        log_error(
+            f"Script '{cfg.script_name}' does not declare any 'watch' or 'inputs' paths."
+        )
+        return None
+
+    return patterns
+
+
+def run_watch(cfg: PyssCfg, report=None) -> int:
+    """
+    Runs the script, then runs it again whenever the files it watches or
+    the configuration file change. A run that is still going when a change
+    arrives is cancelled and restarted. Returns once interrupted.
+
+    With a profiler, report is called with the profile of each run that
+    finished.
+    """
+    if cfg.plan is None:
+        cfg = cfg.derive(plan=Plan(cfg.scripts))
+
+    patterns = __resolve_patterns(cfg)
+    if patterns is None:
+        return 1
+
+    file_location = cfg.scripts.pyss_file.file_location
+    root = os.path.dirname(file_location)
+
+    run = None
+    try:
+        while True:
+            watcher = create_watcher(root, patterns or [], file_location)
+            try:
+                snapshot = watcher.snapshot()
+                if patterns is not None:
+                    run = WatchRun(cfg, report)
+
+                while True:
+                    current = watcher.wait(snapshot)
+                    reload = current.get(file_location) != snapshot.get(file_location)
+                    snapshot = current
+
+                    if run is not None:
+                        run.stop()
+                        run = None
+
+                    if not cfg.quiet:
+                        log_info(
+                            "watch", "Change detected, restarting...", DETAIL_COLOR
+                        )
+
+                    if reload:
+                        break
+                    run = WatchRun(cfg, report)
+            finally:
+                watcher.close()
+
+            cfg = __reload(cfg)
+            patterns = __resolve_patterns(cfg)
+    except KeyboardInterrupt:
+        if run is not None:
+            run.stop()
+        return 0
@@ -0,0 +1,459 @@
+import os
+import sys
+import hmac
+import base64
+import threading
+
+from pyss._logging import log_error, log_info
+from pyss._daemon import Channel
+from pyss._constants import (
+    WORKER_ENV,
+    WORKER_PORT,
+    WORKER_TOKEN_ENV,
+    WORKER_CONNECT_TIMEOUT,
+)
+
+
+def _host_port(address: str) -> tuple[str, int]:
+    host, separator, port = address.rpartition(":")
+    if not separator or "]" in port:
+        host, port = address, WORKER_PORT
+    try:
+        port = int(port)
+    except ValueError:
+        raise ValueError(f"Invalid worker address '{address}'.")
+    return host.strip("[]"), port
+
+
+def _is_loopback(address: str) -> bool:
+    """
+    Returns whether the address, given like to connect(), can only be
+    reached from this host.
+    """
+    import socket
+    import ipaddress
+
+    if address.startswith("unix:"):
+        return True
+
+    host, port = _host_port(address)
+    try:
+        addresses = socket.getaddrinfo(host or None, port, proto=socket.IPPROTO_TCP)
+    except OSError:
+        return False
+    # An empty host listens on every interface.
+    return bool(host) and all(
+        ipaddress.ip_address(info[4][0].split("%")[0]).is_loopback for info in addresses
+    )
+
+
+def connect(address: str):
+    """
+    Connects to the worker at the address, given as HOST[:PORT] or
+    unix:PATH.
+    """
+    import socket
+
+    if address.startswith("unix:"):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.settimeout(WORKER_CONNECT_TIMEOUT)
+            connection.connect(address[len("unix:") :])
+        except OSError:
+            connection.close()
+            raise
+    else:
+        connection = socket.create_connection(
+            _host_port(address), WORKER_CONNECT_TIMEOUT
+        )
+        # Workers on hosts that go away are noticed by keepalive probes.
+        connection.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+    connection.settimeout(None)
+    return connection
+
+
+def listen(address: str):
+    """
+    Returns a socket listening on the address, given like to connect().
+    """
+    import socket
+
+    if not address.startswith("unix:"):
+        return socket.create_server(_host_port(address))
+
+    location = address[len("unix:") :]
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    if os.path.exists(location):
+        os.remove(location)
+
+    umask = os.umask(0o077)
+    try:
+        server.bind(location)
+    finally:
+        os.umask(umask)
+    server.listen()
+    return server
+
+
+class RemoteCommand:
+    """
+    A command running on a worker, as far as cancellations are concerned.
+    Terminating it closes its connection, upon which the worker
+    terminates the command.
+    """
+
+    # There is no local process to signal.
+    pid = None
+
+    def __init__(self):
+        self.connection = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    def attach(self, connection) -> bool:
+        with self.lock:
+            if self.cancelled:
+                return False
+            self.connection = connection
+            return True
+
+    def detach(self):
+        with self.lock:
+            self.connection = None
+
+    def terminate(self):
+        import socket
+
+        with self.lock:
+            self.cancelled = True
+            if self.connection is not None:
+                try:
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    kill = terminate
+
+
+class WorkerPool:
+    """
+    The workers that commands are sent to. Each command goes to the worker
+    with the fewest commands running, the first one listed on a tie. A
+    worker that can not be reached, or goes away before the command has
+    finished, is not used again for the run, and the command is sent to
+    another worker.
+    """
+
+    addresses: list[str]
+    token: str | None
+    running: dict[str, int]
+    unavailable: set[str]
+
+    def __init__(self, addresses: list[str], token: str | None = None):
+        self.addresses = addresses
+        self.token = token
+        self.running = {address: 0 for address in addresses}
+        self.unavailable = set()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def from_executor(executor: str) -> "WorkerPool | None":
+        """
+        Returns the pool for an --executor value: 'local' (None) or
+        'workers:ADDRESS,...'. Raises a ValueError if it is not valid.
+        """
+        if executor == "local":
+            return None
+
+        kind, _, addresses = executor.partition(":")
+        addresses = [address for address in addresses.split(",") if address]
+        if kind != "workers" or not addresses:
+            raise ValueError(
+                f"Invalid executor '{executor}'. Expected 'local' or "
+                "'workers:HOST[:PORT],...'."
+            )
+        for address in addresses:
+            if not address.startswith("unix:"):
+                _host_port(address)
+
+        return WorkerPool(addresses, os.environ.get(WORKER_TOKEN_ENV))
+
+    def __acquire(self) -> str | None:
+        with self.lock:
+            available = [
+                address for address in self.addresses if address not in self.unavailable
+            ]
+            if not available:
+                return None
+            address = min(available, key=lambda address: self.running[address])
+            self.running[address] += 1
+            return address
+
+    def run(
+        self,
+        request: dict,
+        on_stdout,
+        on_stderr,
+        cancellation=None,
+        remote: RemoteCommand | None = None,
+    ) -> int:
+        """
+        Runs the command of the request on a worker, passing its output to
+        the handlers as it arrives, and returns its exit code.
+
+        The request holds the evaluated 'command', the 'argv' to run it
+        with directly (or None to use the 'shell'), whether to 'resolve'
+        the program of argv on the worker first, the working directory
+        relative to the root of the worker ('cwd') and the 'env' layers
+        above the environment of the worker.
+        """
+        remote = remote or RemoteCommand()
+        if cancellation is not None and not cancellation.register(remote):
+            return 1
+
+        try:
+            while True:
+                address = self.__acquire()
+                if address is None:
+                    log_error("No worker is available to run the command.")
+                    return 1
+
+                try:
+                    exit_code = self.__send(
+                        address, request, on_stdout, on_stderr, remote
+                    )
+                finally:
+                    with self.lock:
+                        self.running[address] -= 1
+
+                if exit_code is not None:
+                    return exit_code
+                if remote.cancelled:
+                    return 1
+
+                with self.lock:
+                    self.unavailable.add(address)
+                log_error(
+                    f"Worker {address} is unavailable, "
+                    "running the command on another worker."
+                )
+        finally:
+            if cancellation is not None:
+                cancellation.unregister(remote)
+
+    def __send(
+        self, address: str, request: dict, on_stdout, on_stderr, remote
+    ) -> int | None:
+        """
+        Returns the exit code of the command, or None if the worker could
+        not be reached or went away before the command finished.
+        """
+        try:
+            connection = connect(address)
+        except OSError:
+            return None
+
+        with connection:
+            if not remote.attach(connection):
+                return None
+
+            channel = Channel(connection)
+            try:
+                channel.send({**request, "type": "run", "token": self.token})
+                while True:
+                    message, _ = channel.receive()
+                    if message is None:
+                        return None
+                    if message["type"] == "output":
+                        handler = on_stdout
+                        if message["stream"] == "stderr":
+                            handler = on_stderr
+                        handler(base64.b64decode(message["data"]))
+                    elif message["type"] == "exit":
+                        return message["exit_code"]
+                    elif message["type"] == "error":
+                        log_error(f"Worker {address}: {message['message']}")
+                        return 1
+            except (OSError, ValueError):
+                return None
+            finally:
+                remote.detach()
+
+
+class Worker:
+    """
+    An agent that runs the commands pyss clients send it, each over a
+    connection of its own, and streams their output and exit code back.
+    Working directories are relative to the root of the worker, and the
+    environment layers of the client are applied over the environment of
+    the worker. A command is terminated if its client goes away.
+
+    Without a token, the worker refuses to listen on addresses that other
+    hosts can reach unless it is explicitly made insecure.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        root: str,
+        token: str | None = None,
+        insecure: bool = False,
+    ):
+        self.address = address
+        self.root = os.path.abspath(root)
+        self.token = token
+        self.insecure = insecure
+
+    def serve(self):
+        if self.token is None and not _is_loopback(self.address):
+            if not self.insecure:
+                raise ValueError(
+                    f"Refusing to listen on {self.address} without a token, as "
+                    f"anyone who can reach it could run commands. Set "
+                    f"{WORKER_TOKEN_ENV} or pass --insecure."
+                )
+            log_info("worker", f"No token is set ({WORKER_TOKEN_ENV}).")
+
+        server = listen(self.address)
+        log_info("worker", f"Listening on {self.address} (pid {os.getpid()})")
+        sys.stdout.flush()
+
+        try:
+            while True:
+                connection, _ = server.accept()
+                threading.Thread(
+                    target=self.__handle, args=(connection,), daemon=True
+                ).start()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            if self.address.startswith("unix:"):
+                try:
+                    os.remove(self.address[len("unix:") :])
+                except OSError:
+                    pass
+
+    def __handle(self, connection):
+        import socket
+
+        with connection:
+            channel = Channel(connection)
+            try:
+                request, _ = channel.receive()
+                if request is None or request.get("type") != "run":
+                    return
+                if self.token is not None and not hmac.compare_digest(
+                    str(request.get("token") or ""), self.token
+                ):
+                    channel.send({"type": "error", "message": "Invalid token."})
+                    return
+                self.__run(connection, channel, request)
+            except (OSError, ValueError):
+                pass
+            except Exception as e:
+                log_error(e, title="Worker Error")
+            finally:
+                # Wakes up the thread watching the connection.
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def __run(self, connection, channel: Channel, request: dict):
+        import subprocess
+
+        from pyss._output import pump
+        from pyss._types import _terminate
+        from pyss._environment import Environment
+
+        cwd = os.path.normpath(os.path.join(self.root, request["cwd"]))
+        if os.path.relpath(cwd, self.root).split(os.sep)[0] == "..":
+            channel.send(
+                {"type": "error", "message": f"'{request['cwd']}' is outside the root."}
+            )
+            return
+
+        env = Environment.from_os()
+        for layer in request["env"]:
+            env = env.layer(layer)
+        env = env.layer({WORKER_ENV: self.address})
+
+        lock = threading.Lock()
+        proc = None
+
+        def send(message: dict):
+            with lock:
+                try:
+                    channel.send(message)
+                except OSError:
+                    # The client went away; the command is terminated
+                    # below.
+                    pass
+
+        def output(stream: str):
+            def handler(data: bytes):
+                data = base64.b64encode(data).decode("ascii")
+                send({"type": "output", "stream": stream, "data": data})
+
+            return handler
+
+        argv = request.get("argv")
+        if argv is not None and request.get("resolve"):
+            from pyss._execution import resolve_program
+
+            # Runs the command in a shell if the worker lacks its program.
+            argv = resolve_program(argv, cwd, env.get("PATH", os.defpath))
+
+        try:
+            proc = subprocess.Popen(
+                request["command"] if argv is None else argv,
+                cwd=cwd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                shell=argv is None,
+                executable=request.get("shell") if argv is None else None,
+                env=env.materialize(),
+                start_new_session=os.name == "posix",
+            )
+        except OSError as e:
+            output("stderr")(f"{e}\n".encode())
+            send({"type": "exit", "exit_code": 127})
+            return
+
+        def watch():
+            # The client sends nothing after the request, so the end of
+            # the connection means that it went away or was cancelled.
+            try:
+                connection.recv(1)
+            except OSError:
+                pass
+            if proc.poll() is None:
+                _terminate(proc, False)
+
+        threading.Thread(target=watch, daemon=True).start()
+
+        pump([(proc.stdout, output("stdout")), (proc.stderr, output("stderr"))])
+        proc.stdout.close()
+        proc.stderr.close()
+        send({"type": "exit", "exit_code": proc.wait()})
+
+
+def run_worker_command(arguments: list[str], insecure: bool = False) -> int:
+    usage = "Usage: pyss :worker [HOST[:PORT]|unix:PATH]"
+    if len(arguments) > 1:
+        log_error(usage)
+        return 1
+
+    address = arguments[0] if arguments else f"127.0.0.1:{WORKER_PORT}"
+    try:
+        worker = Worker(
+            address, os.getcwd(), os.environ.get(WORKER_TOKEN_ENV), insecure
+        )
+        worker.serve()
+    except (OSError, ValueError) as e:
+        log_error(e, title="Worker Error")
+        return 1
+    return 0
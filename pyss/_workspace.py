@@ -0,0 +1,349 @@
+import os
+import glob
+import json
+import time
+import fnmatch
+import hashlib
+import threading
+import contextvars
+
+from pyss._logging import log_error, log_info, log_summary
+from pyss._cache import get_cache_directory
+from pyss._scripts import find_pyss_file, pyss_file_in, load_pyss_file, get_scripts
+from pyss._types import PySSFile, PyssCfg
+from pyss._constants import (
+    DETAIL_COLOR,
+    WORKSPACE_INDEX_FORMAT,
+)
+
+
+def find_workspace(directory: str, use_cache: bool = True) -> PySSFile | None:
+    """
+    Returns the configuration file that declares the workspace the
+    directory belongs to: the closest one in the directory or its parents
+    with a 'workspace' key. Returns None if there is none.
+    """
+    while True:
+        file_location = find_pyss_file(directory)
+        if file_location is None:
+            return None
+
+        pyss_file = load_pyss_file(file_location, use_cache)
+        if "workspace" in pyss_file:
+            get_scripts(pyss_file, scoped=True)
+            return pyss_file
+
+        directory = os.path.dirname(os.path.dirname(file_location))
+        if directory == os.path.dirname(file_location):
+            return None
+
+
+class WorkspaceMember:
+    """
+    A member of a workspace: a directory with a configuration file of its
+    own. scripts holds the names of the scripts it can run, or None if
+    its configuration file could not be read.
+    """
+
+    __slots__ = ("path", "file_location", "mtime", "size", "scripts")
+
+    path: str
+    file_location: str
+    mtime: int
+    size: int
+    scripts: list[str] | None
+
+    def __init__(
+        self,
+        path: str,
+        file_location: str,
+        mtime: int = 0,
+        size: int = 0,
+        scripts: list[str] | None = None,
+    ):
+        self.path = path
+        self.file_location = file_location
+        self.mtime = mtime
+        self.size = size
+        self.scripts = scripts
+
+    def defines(self, script_name: str) -> bool:
+        # Members that could not be read are run so that their errors
+        # show up in the report.
+        return self.scripts is None or script_name in self.scripts
+
+
+def __pattern_base(root: str, pattern: str) -> str:
+    static = []
+    for part in pattern.replace(os.sep, "/").split("/"):
+        if glob.has_magic(part):
+            break
+        static.append(part)
+    return os.path.normpath(os.path.join(root, *static))
+
+
+def __mtime(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def __discover(root: str, patterns: list[str]) -> tuple[list[tuple], dict]:
+    """
+    Expands the member patterns into (path, file location) pairs, and
+    returns them along with the modification times of the directories
+    whose contents determine them.
+    """
+    members = {}
+    directories = {}
+
+    for pattern in patterns:
+        base = __pattern_base(root, pattern)
+        directories[base] = __mtime(base)
+
+        for match in sorted(glob.glob(pattern, root_dir=root, recursive=True)):
+            directory = os.path.normpath(os.path.join(root, match))
+            if not os.path.isdir(directory):
+                continue
+            directories[directory] = __mtime(directory)
+            directories[os.path.dirname(directory)] = __mtime(
+                os.path.dirname(directory)
+            )
+
+            file_location = pyss_file_in(directory)
+            if file_location is not None:
+                path = os.path.relpath(directory, root).replace(os.sep, "/")
+                members.setdefault(path, file_location)
+
+    return sorted(members.items()), directories
+
+
+def __scripts(file_location: str, use_cache: bool) -> list[str] | None:
+    try:
+        pyss_file = load_pyss_file(file_location, use_cache)
+        names = [
+            script["name"]
+            for script in pyss_file.get("scripts") or []
+            if not script.get("internal", False)
+        ]
+        if pyss_file.header.include:
+            from pyss._include import Includes
+
+            names += [name for name in Includes(pyss_file).names() if name not in names]
+        return names
+    except Exception:
+        return None
+
+
+def __index_location(root_location: str) -> str:
+    name = hashlib.sha256(root_location.encode("utf-8")).hexdigest()
+    return os.path.join(get_cache_directory(), "workspace", f"{name}.json")
+
+
+def __load_index(root: PySSFile) -> dict | None:
+    try:
+        with open(__index_location(root.file_location)) as index_file:
+            index = json.load(index_file)
+    except (OSError, ValueError):
+        return None
+
+    if index.get("format") != WORKSPACE_INDEX_FORMAT:
+        return None
+    if index.get("patterns") != root["workspace"]["members"]:
+        return None
+    return index
+
+
+def __store_index(root: PySSFile, index: dict):
+    import tempfile
+
+    index_location = __index_location(root.file_location)
+    try:
+        os.makedirs(os.path.dirname(index_location), exist_ok=True)
+        fd, temp_location = tempfile.mkstemp(
+            dir=os.path.dirname(index_location), prefix=".tmp-"
+        )
+        with os.fdopen(fd, "w") as temp_file:
+            json.dump(index, temp_file)
+        os.replace(temp_location, index_location)
+    except OSError:
+        pass
+
+
+def workspace_members(root: PySSFile, use_cache: bool = True) -> list[WorkspaceMember]:
+    """
+    Returns the members of the workspace declared by the configuration
+    file, in the order of their paths.
+
+    The members and the names of their scripts are kept in an index in
+    the cache directory. The patterns are only expanded again when one of
+    the directories they depend on has changed, and the configuration of
+    a member is only read again when its file has changed.
+    """
+    root_directory = os.path.dirname(root.file_location)
+    patterns = root["workspace"]["members"]
+
+    index = __load_index(root) if use_cache else None
+    changed = index is None
+
+    if index is not None and any(
+        __mtime(directory) != mtime for directory, mtime in index["directories"].items()
+    ):
+        changed = True
+
+    known = {}
+    if index is not None:
+        known = {member["path"]: member for member in index["members"]}
+
+    if changed:
+        discovered, directories = __discover(root_directory, patterns)
+    else:
+        directories = index["directories"]
+        discovered = [
+            (member["path"], os.path.join(root_directory, member["file"]))
+            for member in index["members"]
+        ]
+
+    members = []
+    for path, file_location in discovered:
+        try:
+            stat = os.stat(file_location)
+        except OSError:
+            changed = True
+            continue
+
+        entry = known.get(path)
+        if (
+            entry is not None
+            and os.path.join(root_directory, entry["file"]) == file_location
+            and entry["mtime"] == stat.st_mtime_ns
+            and entry["size"] == stat.st_size
+        ):
+            scripts = entry["scripts"]
+        else:
+            scripts = __scripts(file_location, use_cache)
+            changed = True
+
+        members.append(
+            WorkspaceMember(
+                path, file_location, stat.st_mtime_ns, stat.st_size, scripts
+            )
+        )
+
+    if changed and use_cache:
+        __store_index(
+            root,
+            {
+                "format": WORKSPACE_INDEX_FORMAT,
+                "patterns": patterns,
+                "directories": directories,
+                "members": [
+                    {
+                        "path": member.path,
+                        "file": os.path.relpath(member.file_location, root_directory),
+                        "mtime": member.mtime,
+                        "size": member.size,
+                        "scripts": member.scripts,
+                    }
+                    for member in members
+                ],
+            },
+        )
+
+    return members
+
+
+def __run_member(
+    member: WorkspaceMember, script_name: str, use_cache: bool, options: dict
+) -> int:
+    from pyss._execution import run_pyss
+
+    try:
+        pyss_file = load_pyss_file(member.file_location, use_cache)
+        scripts = get_scripts(pyss_file, scoped=True)
+        return run_pyss(PyssCfg(scripts, script_name, member=member.path, **options))
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 1
+    except Exception as e:
+        log_error(f"{member.path}: {e}")
+        return 1
+
+
+def run_workspace(
+    root: PySSFile,
+    script_name: str,
+    filters: list[str] | None = None,
+    use_cache: bool = True,
+    **options,
+) -> int:
+    """
+    Runs the script in every member of the workspace that defines it and
+    whose path matches one of the filters (all members by default), then
+    logs a report of the runs. options are passed on to PyssCfg.
+
+    Members run in parallel, at most as many at a time as the job limit,
+    and the commands of all members share the job slots. Each member runs
+    in its own directory with its own environment. Returns the exit code
+    of the first member that failed, in the order of their paths.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    members = [
+        member
+        for member in workspace_members(root, use_cache)
+        if member.defines(script_name)
+        and (not filters or any(fnmatch.fnmatch(member.path, f) for f in filters))
+    ]
+    if not members:
+        log_error(f"Script '{script_name}' is not defined by any workspace member.")
+        return 1
+
+    jobs = options.get("jobs")
+    limit = jobs if jobs is not None else (os.cpu_count() or 1) + 2
+    slots = threading.BoundedSemaphore(limit)
+    workers = min(len(members), limit)
+    if workers > 1 and not options.get("disable_output"):
+        options = {**options, "prefix": script_name}
+
+    if not options.get("quiet") and not options.get("disable_output"):
+        log_info(
+            "workspace",
+            f"Running '{script_name}' in {len(members)} member(s)...",
+            DETAIL_COLOR,
+        )
+
+    started = time.perf_counter()
+    results = {}
+
+    def run(member: WorkspaceMember):
+        member_started = time.perf_counter()
+        exit_code = __run_member(
+            member, script_name, use_cache, {**options, "job_slots": slots}
+        )
+        results[member.path] = (exit_code, time.perf_counter() - member_started)
+
+    if workers <= 1:
+        for member in members:
+            run(member)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, run, member)
+                for member in members
+            ]
+            for future in futures:
+                future.result()
+
+    if not options.get("disable_output"):
+        log_summary(
+            "workspace",
+            script_name,
+            [(member.path, *results[member.path]) for member in members],
+            time.perf_counter() - started,
+        )
+
+    for member in members:
+        if results[member.path][0] != 0:
+            return results[member.path][0]
+    return 0
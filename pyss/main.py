@@ -1,38 +1,131 @@
 import sys
 import os
 
-from jsonschema import ValidationError
-from termcolor import colored
-
-from pyss._logging import log_error, log_info
+from pyss._logging import log_error, log_info, colored
 from pyss._arguments import parse_arguments
-from pyss._scripts import get_scripts, print_scripts, validate_pyss_data, get_pyss_file
-from pyss._execution import run_pyss, PyssCfg
-from pyss._environment import prime_environment
 from pyss._constants import (
     NOT_FOUND_COLOR,
     FOUND_COLOR,
 )
 
+# The modules of each command are imported where it runs, so that the
+# built-in commands, --version and --list do not pay for the others.
 
-def main():
-    args, print_help = parse_arguments()
+# Built-in commands are prefixed with ':' so that they never shadow the
+# scripts of a configuration file.
+BUILTIN_COMMANDS = [":cache", ":daemon", ":stats", ":worker"]
 
-    pyss_file = get_pyss_file()
 
-    file_location = pyss_file.file_location
+def run_cache_command(arguments: list[str]) -> int:
+    if arguments != ["clear"]:
+        log_error("Usage: pyss :cache clear")
+        return 1
+
+    from pyss._cache import clear_cache
+
+    removed = clear_cache()
+    log_info("cache", f"Removed {removed} cached configuration(s).")
+    return 0
+
+
+def main(argv: list[str] | None = None, pyss_file=None):
+    args, print_help = parse_arguments(argv)
+
+    if args.script_name == ":cache":
+        sys.exit(run_cache_command(args.arguments))
+
+    if args.script_name == ":daemon":
+        from pyss._daemon import run_daemon_command
+
+        sys.exit(run_daemon_command(args.arguments))
+
+    if args.script_name == ":stats":
+        from pyss._history import run_stats_command
+
+        sys.exit(run_stats_command(args.arguments))
+
+    if args.script_name == ":worker":
+        from pyss._workers import run_worker_command
+
+        sys.exit(run_worker_command(args.arguments, args.insecure))
+
+    if args.script_name is not None and args.script_name.startswith(":"):
+        log_error(
+            f"Unknown command '{args.script_name}'. The built-in commands are "
+            f"{', '.join(BUILTIN_COMMANDS)}."
+        )
+        sys.exit(1)
+
+    # A configuration file is passed in when running inside the daemon.
+    if pyss_file is None and not args.no_daemon:
+        from pyss._daemon import run_in_daemon
+
+        exit_code = run_in_daemon(sys.argv[1:] if argv is None else argv)
+        if exit_code is not None:
+            sys.exit(exit_code)
+
+    if args.output == "silent":
+        args.silent = True
+
+    if args.jobs is not None and args.jobs < 1:
+        log_error("The number of jobs must be at least 1.")
+        sys.exit(1)
+
+    if args.arguments:
+        log_error(f"Unexpected arguments: {' '.join(args.arguments)}")
+        print_help()
+        sys.exit(1)
+
+    executor = None
+    if args.executor is not None:
+        from pyss._workers import WorkerPool
 
-    if args.test:
         try:
-            log_info("validate", f"Validating configuration file '{file_location}'...")
-            validate_pyss_data(dict(pyss_file))
-            log_info("validate", f"Configuration file '{file_location}' is valid.")
-            sys.exit(0)
-        except ValidationError as e:
-            log_error(e.message, title="Validation Error")
+            executor = WorkerPool.from_executor(args.executor)
+        except ValueError as e:
+            log_error(e)
             sys.exit(1)
 
-    scripts = get_scripts(pyss_file)
+    from pyss._history import history_enabled
+
+    # The run history is recorded from the spans of the profiler.
+    profiler = None
+    if args.profile or args.trace_file or history_enabled():
+        from pyss._profile import Profiler
+
+        profiler = Profiler()
+
+    if args.all or args.filter:
+        run_workspace_command(args, print_help, profiler, executor)
+
+    from pyss._profile import span
+    from pyss._scripts import get_scripts, print_scripts, get_pyss_file
+
+    if pyss_file is None:
+        with span(profiler, "load config", "pyss"):
+            pyss_file = get_pyss_file(use_cache=not args.no_cache)
+
+    file_location = pyss_file.file_location
+
+    if args.test:
+        from pyss._validator import is_valid_pyss_data
+
+        log_info("validate", f"Validating configuration file '{file_location}'...")
+        if not is_valid_pyss_data(dict(pyss_file)):
+            from jsonschema import ValidationError
+            from pyss._validator import validate_pyss_data
+
+            try:
+                validate_pyss_data(dict(pyss_file))
+            except ValidationError as e:
+                log_error(e.message, title="Validation Error")
+                sys.exit(1)
+        log_info("validate", f"Configuration file '{file_location}' is valid.")
+        sys.exit(0)
+
+    with span(profiler, "validate", "pyss"):
+        # Runs only validate the scripts they need; the list shows them all.
+        scripts = get_scripts(pyss_file, scoped=not args.list)
     if args.list:
         print_scripts(scripts)
 
@@ -43,39 +136,156 @@ def main():
 
     desired_script = args.script_name
 
-    if not any(script["name"] == desired_script for script in scripts):
-        script_name_colored = colored(desired_script, NOT_FOUND_COLOR)
+    from pyss._plan import Plan
+
+    with span(profiler, "plan", "pyss"):
+        plan = Plan(scripts)
+        node = resolve_script(plan, desired_script, file_location)
+
+    if args.plan:
+        from pyss._history import history_location
+        from pyss._schedule import Estimates, print_plan
+
+        location = None
+        if history_enabled():
+            location = history_location(os.path.dirname(file_location))
+        # Without -j, only lists marked 'parallel' run in parallel.
+        estimates = Estimates(location, parallel=(args.jobs or 1) > 1)
+        jobs = args.jobs if args.jobs is not None else (os.cpu_count() or 1) + 2
+        print_plan(estimates, node, jobs)
+        sys.exit(0)
+
+    def run(report) -> int:
+        from pyss._types import PyssCfg
+        from pyss._execution import run_pyss
+
+        cfg = PyssCfg(
+            scripts=scripts,
+            script_name=desired_script,
+            quiet=args.quiet,
+            disable_output=args.silent,
+            jobs=args.jobs,
+            force=args.force,
+            result_cache=args.result_cache,
+            plan=plan,
+            profiler=profiler,
+            executor=executor,
+            output_on_failure=args.output == "on-failure",
+        )
+
+        if args.watch:
+            from pyss._watch import run_watch
+
+            return run_watch(cfg, report)
+        return run_pyss(cfg)
+
+    run_and_report(args, profiler, run, os.path.dirname(file_location))
+
+
+def resolve_script(plan, script_name: str, file_location: str):
+    """
+    Compiles the script to run, exiting if it can not be run.
+    """
+    from pyss._plan import PlanError
+
+    try:
+        script = plan.get(script_name)
+    except PlanError as e:
+        log_error(e, title="Plan Error")
+        sys.exit(1)
+
+    if script is None:
+        script_name_colored = colored(script_name, NOT_FOUND_COLOR)
         file_location_colored = colored(file_location, FOUND_COLOR)
         log_error(
             f"Script '{script_name_colored}' not found in {file_location_colored}."
         )
         sys.exit(1)
 
-    script = next(script for script in scripts if script["name"] == desired_script)
-    if script is not None:
-        if "internal" in script:
-            if script["internal"]:
-                script_name_colored = colored(desired_script, NOT_FOUND_COLOR)
-                log_error(f"Script '{script_name_colored}' is internal.")
-                sys.exit(1)
+    if "internal" in script:
+        if script["internal"]:
+            script_name_colored = colored(script_name, NOT_FOUND_COLOR)
+            log_error(f"Script '{script_name_colored}' is internal.")
+            sys.exit(1)
+
+    try:
+        return plan.resolve(script_name)
+    except PlanError as e:
+        log_error(e, title="Plan Error")
+        sys.exit(1)
 
-    if pyss_file.env is not None:
-        prime_environment(pyss_file.env)
+
+def run_workspace_command(args, print_help, profiler, executor):
+    from pyss._profile import span
+    from pyss._workspace import find_workspace, run_workspace
+
+    if not args.script_name:
+        log_error("No script name provided.")
+        print_help()
+        sys.exit(1)
+
+    with span(profiler, "load config", "pyss"):
+        root = find_workspace(os.getcwd(), use_cache=not args.no_cache)
+    if root is None:
+        log_error(
+            "No workspace found: no PySS file in the current directory or its "
+            "parents declares 'workspace'."
+        )
+        sys.exit(1)
+
+    run_and_report(
+        args,
+        profiler,
+        lambda report: run_workspace(
+            root,
+            args.script_name,
+            args.filter,
+            use_cache=not args.no_cache,
+            quiet=args.quiet,
+            disable_output=args.silent,
+            jobs=args.jobs,
+            force=args.force,
+            result_cache=args.result_cache,
+            profiler=profiler,
+            executor=executor,
+            output_on_failure=args.output == "on-failure",
+        ),
+        os.path.dirname(root.file_location),
+    )
+
+
+def run_and_report(args, profiler, run, project_directory: str):
+    """
+    Runs the scripts, silencing their output if requested, then records
+    the run in the history of the project, reports its profile and exits
+    with its exit code. Watch mode reports each of its runs on its own
+    through the function passed to run.
+    """
+    # The profile is reported even if the scripts run silently.
+    report_stream = sys.stderr
+
+    from pyss._history import history_enabled
+
+    def report(profiler):
+        if history_enabled():
+            from pyss._history import history_location, record_history
+
+            record_history(history_location(project_directory), profiler)
+        if args.profile:
+            profiler.print_summary(report_stream)
+        if args.trace_file:
+            profiler.write_trace(args.trace_file)
 
     if args.silent:
         sys.stdout = open(os.devnull, "w")
         sys.stderr = open(os.devnull, "w")
 
-    sys.exit(
-        run_pyss(
-            PyssCfg(
-                scripts=scripts,
-                script_name=desired_script,
-                quiet=args.quiet,
-                disable_output=args.silent,
-            )
-        )
-    )
+    exit_code = run(report)
+
+    if profiler is not None and not args.watch:
+        report(profiler)
+
+    sys.exit(exit_code)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,88 @@
+import time
+import asyncio
+
+import pyss
+from pyss._types import PySSFile, Scripts, PyssCfg
+
+
+def __cfg(tmp_path, scripts: list[dict], script_name: str, **kwargs) -> PyssCfg:
+    pyss_file = PySSFile({"scripts": scripts}, str(tmp_path / "pyss.yaml"))
+    return PyssCfg(
+        Scripts(pyss_file, scripts),
+        script_name,
+        quiet=True,
+        disable_output=True,
+        **kwargs,
+    )
+
+
+def test_run_pyss_async(tmp_path):
+    scripts = [
+        {
+            "name": "build",
+            "description": "build",
+            "env": {"TARGET": "app"},
+            "before": {
+                "parallel": True,
+                "dependencies": ["sleep 0.5 && echo a > a.txt", "lint"],
+            },
+            "after": ["exit 0"],
+            "command": "echo ${TARGET} > build.txt",
+        },
+        {
+            "name": "lint",
+            "internal": True,
+            "commands": ["sleep 0.5", "echo lint > lint.txt"],
+        },
+        {
+            "name": "broken",
+            "description": "broken",
+            "before": ["exit 4"],
+            "command": "echo unreachable > broken.txt",
+        },
+    ]
+
+    async def run_all():
+        return await asyncio.gather(
+            *(
+                pyss.run_pyss_async(__cfg(tmp_path, scripts, name))
+                for name in ["build", "broken", "missing"]
+            )
+        )
+
+    started = time.monotonic()
+    assert asyncio.run(run_all()) == [0, 4, 1]
+    assert time.monotonic() - started < 1.5
+
+    assert (tmp_path / "build.txt").read_text() == "app\n"
+    assert (tmp_path / "a.txt").exists() and (tmp_path / "lint.txt").exists()
+    assert not (tmp_path / "broken.txt").exists()
+
+
+def test_run_pyss_async_cancellation(tmp_path):
+    scripts = [
+        {
+            "name": "slow",
+            "description": "slow",
+            "commands": ["sleep 30", "echo unreachable > slow.txt"],
+        }
+    ]
+
+    async def run_and_cancel():
+        task = asyncio.create_task(
+            pyss.run_pyss_async(
+                __cfg(tmp_path, scripts, "slow", job_slots=asyncio.Semaphore(1))
+            )
+        )
+        await asyncio.sleep(0.5)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    started = time.monotonic()
+    assert asyncio.run(run_and_cancel())
+    assert time.monotonic() - started < 10
+    assert not (tmp_path / "slow.txt").exists()
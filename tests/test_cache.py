@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from pyss._cache import clear_cache, get_cache_directory
+from pyss._scripts import get_pyss_file, get_scripts
+
+PYSS_YAML = """
+scripts:
+  - name: greet
+    description: Says hello.
+    command: echo hello
+"""
+
+
+def __write_config(directory, content):
+    with open(os.path.join(directory, "pyss.yaml"), "w") as pyss_yaml:
+        pyss_yaml.write(content)
+
+
+def test_config_cache_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYSS_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.chdir(tmp_path)
+    __write_config(tmp_path, PYSS_YAML)
+
+    cold = get_pyss_file()
+    assert not cold.validated
+    get_scripts(cold)
+
+    warm = get_pyss_file()
+    assert warm.validated
+    assert warm == cold
+    assert [script["name"] for script in get_scripts(warm)] == ["greet"]
+
+    config_directory = os.path.join(get_cache_directory(), "config")
+    assert not any(entry.startswith(".tmp-") for entry in os.listdir(config_directory))
+
+
+def test_config_cache_invalidated_on_change(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYSS_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.chdir(tmp_path)
+    __write_config(tmp_path, PYSS_YAML)
+    get_scripts(get_pyss_file())
+
+    __write_config(tmp_path, PYSS_YAML.replace("greet", "wave"))
+
+    changed = get_pyss_file()
+    assert not changed.validated
+    assert changed["scripts"][0]["name"] == "wave"
+
+
+def test_config_cache_disabled_and_cleared(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYSS_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.chdir(tmp_path)
+    __write_config(tmp_path, PYSS_YAML)
+
+    get_scripts(get_pyss_file(use_cache=False))
+    assert clear_cache() == 0
+
+    get_scripts(get_pyss_file())
+    assert get_pyss_file(use_cache=False).validated is False
+    assert clear_cache() == 1
+    assert not get_pyss_file().validated
+
+
+def test_script_named_like_a_builtin_command(tmp_path, monkeypatch, capfd):
+    monkeypatch.setenv("PYSS_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.chdir(tmp_path)
+    __write_config(tmp_path, PYSS_YAML.replace("greet", "cache"))
+
+    from pyss.main import main
+
+    with pytest.raises(SystemExit) as exit_info:
+        main(["--no-daemon", "-q", "cache"])
+    assert exit_info.value.code == 0
+    assert capfd.readouterr().out == "hello\n"
+
+    with pytest.raises(SystemExit) as exit_info:
+        main(["--no-daemon", ":cache", "clear"])
+    assert exit_info.value.code == 0
+    assert not os.path.exists(os.path.join(get_cache_directory(), "config"))
+
+
+def test_config_cache_invalidated_on_included_change(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYSS_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.chdir(tmp_path)
+    __write_config(tmp_path, "pyss:\n  include: [fragment.yaml]\n" + PYSS_YAML)
+    fragment = tmp_path / "fragment.yaml"
+    fragment.write_text("scripts: []\n")
+    get_scripts(get_pyss_file())
+    assert get_pyss_file().validated
+
+    fragment.write_text("scripts:\n  - name: lint\n    command: ruff check\n")
+    assert not get_pyss_file().validated
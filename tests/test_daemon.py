@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+import subprocess
+
+import pytest
+
+PYSS_YAML = """
+scripts:
+  - name: greet
+    description: Says hello.
+    env:
+      GREETING: hello
+    commands:
+      - echo ${GREETING} ${NAME}
+      - exit 3
+"""
+
+
+def __pyss(cwd, env, *arguments, **kwargs) -> subprocess.CompletedProcess:
+    if "stdout" not in kwargs:
+        kwargs["capture_output"] = True
+    return subprocess.run(
+        [sys.executable, "-c", "from pyss.main import main; main()", *arguments],
+        cwd=cwd,
+        env=env,
+        text=True,
+        **kwargs,
+    )
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "fork") or not hasattr(__import__("socket"), "send_fds"),
+    reason="the daemon requires fork() and file descriptor passing",
+)
+def test_daemon_runs_scripts(tmp_path):
+    with open(tmp_path / "pyss.yaml", "w") as pyss_yaml:
+        pyss_yaml.write(PYSS_YAML)
+
+    env = dict(os.environ)
+    env["PYSS_CACHE_DIR"] = str(tmp_path / ".cache")
+    env["PYSS_DAEMON_SOCKET"] = str(tmp_path / "daemon.sock")
+
+    assert __pyss(tmp_path, env, ":daemon", "status").returncode == 1
+
+    daemon = subprocess.Popen(
+        [sys.executable, "-c", "from pyss.main import main; main()", ":daemon", "run"],
+        cwd=tmp_path,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 10
+        while __pyss(tmp_path, env, ":daemon", "status").returncode != 0:
+            assert time.monotonic() < deadline, "the daemon did not start"
+            time.sleep(0.05)
+
+        env["NAME"] = "Heisenberg"
+        results = [
+            __pyss(tmp_path, env, "-q", "greet"),
+            __pyss(tmp_path, env, "-q", "greet"),
+            __pyss(tmp_path, env, "-q", "--no-daemon", "greet"),
+        ]
+        for result in results:
+            assert result.returncode == 3
+            assert result.stdout == "hello Heisenberg\n"
+
+        # The configuration file was loaded once and kept by the daemon.
+        status = __pyss(tmp_path, env, ":daemon", "status")
+        assert str(tmp_path / "pyss.yaml") in status.stdout
+
+        assert __pyss(tmp_path, env, ":daemon", "stop").returncode == 0
+        assert daemon.wait(timeout=10) == 0
+        assert not os.path.exists(tmp_path / "daemon.sock")
+    finally:
+        if daemon.poll() is None:
+            daemon.kill()
+            daemon.wait()
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "fork") or not hasattr(__import__("socket"), "send_fds"),
+    reason="the daemon requires fork() and file descriptor passing",
+)
+def test_daemon_keeps_output_order(tmp_path):
+    with open(tmp_path / "pyss.yaml", "w") as pyss_yaml:
+        pyss_yaml.write(PYSS_YAML)
+
+    env = dict(os.environ)
+    env["PYSS_CACHE_DIR"] = str(tmp_path / ".cache")
+    env["PYSS_DAEMON_SOCKET"] = str(tmp_path / "daemon.sock")
+    env["NAME"] = "Heisenberg"
+    # The output of pyss is block-buffered when piped.
+    env.pop("PYTHONUNBUFFERED", None)
+
+    def piped(*arguments) -> str:
+        return __pyss(
+            tmp_path, env, *arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+        ).stdout
+
+    expected = piped("--no-daemon", "greet")
+    assert expected.index("[pyss][run script] greet") < expected.index("hello")
+
+    daemon = subprocess.Popen(
+        [sys.executable, "-c", "from pyss.main import main; main()", ":daemon", "run"],
+        cwd=tmp_path,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 10
+        while __pyss(tmp_path, env, ":daemon", "status").returncode != 0:
+            assert time.monotonic() < deadline, "the daemon did not start"
+            time.sleep(0.05)
+
+        assert piped("greet") == expected
+    finally:
+        __pyss(tmp_path, env, ":daemon", "stop")
+        if daemon.poll() is None:
+            daemon.kill()
+        daemon.wait()
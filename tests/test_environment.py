@@ -0,0 +1,39 @@
+import pytest
+
+from pyss._environment import Environment, evaluate_environment_variables
+
+
+def test_environment_layers():
+    base = Environment({"PATH": "/bin", "NAME": "base"})
+    file_scope = base.layer({"NAME": "file", "PORT": 8080})
+    script_scope = file_scope.layer({"NAME": "script"})
+
+    assert base.layer(None) is base
+    assert base.layer({}) is base
+
+    assert script_scope["NAME"] == "script"
+    assert script_scope["PORT"] == "8080"
+    assert script_scope.get("MISSING") is None
+    assert file_scope["NAME"] == "file"
+    assert base["NAME"] == "base"
+
+    assert script_scope.materialize() == {
+        "PATH": "/bin",
+        "NAME": "script",
+        "PORT": "8080",
+    }
+    assert script_scope.materialize() is script_scope.materialize()
+    assert base.materialize() == {"PATH": "/bin", "NAME": "base"}
+
+
+def test_evaluate_environment_variables():
+    env = Environment({"NAME": "Heisenberg"}).layer({"AGE": 52})
+
+    assert (
+        evaluate_environment_variables("echo ${NAME} is ${AGE}", env)
+        == "echo Heisenberg is 52"
+    )
+
+    with pytest.raises(ValueError) as exception:
+        evaluate_environment_variables("echo ${MISSING}", env)
+    assert str(exception.value) == "Environment variable 'MISSING' not set."
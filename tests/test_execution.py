@@ -0,0 +1,261 @@
+import os
+import sys
+
+import pytest
+
+from pyss._types import PySSFile, Scripts, PyssCfg, Command
+from pyss._environment import Environment
+from pyss._execution import direct_argv, run_pyss
+
+
+def __cfg(tmp_path, scripts: list[dict], script_name: str, header: dict = {}):
+    pyss_file = PySSFile(
+        {"pyss": header, "scripts": scripts}, str(tmp_path / "pyss.yaml")
+    )
+    return PyssCfg(
+        Scripts(pyss_file, scripts), script_name, quiet=True, disable_output=True
+    )
+
+
+@pytest.mark.skipif(os.name != "posix", reason="commands always use a shell")
+def test_direct_argv(tmp_path):
+    cfg = __cfg(tmp_path, [], "")
+    env = Environment.from_os()
+
+    def argv(command, value=None):
+        return direct_argv(cfg, Command(value or command), command, env)
+
+    assert argv("python -m pytest -q 'tests dir'") == [
+        "python",
+        "-m",
+        "pytest",
+        "-q",
+        "tests dir",
+    ]
+    for command in [
+        "echo a | cat",
+        "echo a > out.txt",
+        "ls *.py",
+        "echo $HOME",
+        "echo `date`",
+        "true && false",
+        "cd tests",
+        "FOO=1 env",
+        "missing-program --version",
+        "echo 'unterminated",
+    ]:
+        assert argv(command) is None, command
+
+    assert argv("echo a", {"cmd": "echo a", "shell": True}) is None
+    assert argv("echo a", {"cmd": "echo a", "exec": False}) is None
+    assert argv("echo 'a;b'", {"cmd": "echo 'a;b'", "exec": True}) == ["echo", "a;b"]
+    assert argv("ls *", {"cmd": "ls *", "shell": False}) == ["ls", "*"]
+
+    # Programs of commands that run elsewhere are looked up there.
+    command = "missing-program --version"
+    assert direct_argv(cfg, Command(command), command, env, resolve=False) == [
+        "missing-program",
+        "--version",
+    ]
+
+    # A custom shell is always used unless the command object opts out.
+    cfg = __cfg(tmp_path, [], "", header={"shell": "/bin/sh"})
+    assert argv("echo a") is None
+    assert argv("echo a", {"cmd": "echo a", "exec": True}) == ["echo", "a"]
+
+
+def test_run_direct(tmp_path):
+    scripts = [
+        {
+            "name": "write",
+            "description": "write",
+            "env": {"VALUE": "a b;c"},
+            "commands": [
+                {"cmd": f"{sys.executable} write.py out.txt ${{VALUE}}", "exec": True},
+                f"{sys.executable} write.py plain.txt 'x y'",
+            ],
+        },
+        {
+            "name": "missing",
+            "description": "missing",
+            "command": {"cmd": "missing-program", "exec": True},
+        },
+    ]
+    (tmp_path / "write.py").write_text(
+        "import sys\nopen(sys.argv[1], 'w').write(repr(sys.argv[2:]))\n"
+    )
+
+    assert run_pyss(__cfg(tmp_path, scripts, "write")) == 0
+    assert (tmp_path / "out.txt").read_text() == "['a', 'b;c']"
+    assert (tmp_path / "plain.txt").read_text() == "['x y']"
+
+    assert run_pyss(__cfg(tmp_path, scripts, "missing")) == 127
+
+
+@pytest.mark.skipif(os.name != "posix", reason="sessions need a POSIX shell")
+def test_session(tmp_path):
+    import asyncio
+    from pyss._async_execution import run_pyss_async
+
+    (tmp_path / "sub").mkdir()
+    scripts = [
+        {
+            "name": "state",
+            "description": "state",
+            "session": True,
+            "commands": [
+                "cd sub",
+                "VALUE=kept",
+                'echo "$VALUE $$" > state.txt',
+                'echo "$$" >> state.txt',
+                {"cmd": "echo $$ > shell.txt", "exec": False},
+                {"cmd": 'echo "$SCOPED $VALUE" > env.txt', "env": {"SCOPED": "a b"}},
+                'echo "${SCOPED:-unset}" >> env.txt',
+                {"cmd": "touch own.txt", "exec": True},
+                "exit 3",
+                "echo unreachable > unreachable.txt",
+            ],
+        },
+    ]
+
+    for run in [run_pyss, lambda cfg: asyncio.run(run_pyss_async(cfg))]:
+        assert run(__cfg(tmp_path, scripts, "state")) == 3
+
+        # The commands ran in the same shell, in the directory it changed
+        # to; commands that need a process of their own run on their own.
+        first, second = (tmp_path / "sub" / "state.txt").read_text().splitlines()
+        assert first == f"kept {second}"
+        assert (tmp_path / "sub" / "shell.txt").read_text() == f"{second}\n"
+        assert (tmp_path / "sub" / "env.txt").read_text() == "a b kept\nunset\n"
+        assert (tmp_path / "own.txt").exists()
+        assert not (tmp_path / "sub" / "unreachable.txt").exists()
+
+
+@pytest.mark.skipif(os.name != "posix", reason="the commands use a POSIX shell")
+def test_output_on_failure(tmp_path, capfdbinary):
+    import asyncio
+    from pyss._async_execution import run_pyss_async
+
+    scripts = [
+        {
+            "name": "pass",
+            "description": "pass",
+            "before": [{"command": "echo streamed", "output": "stream"}],
+            "command": "echo hidden; echo hidden >&2",
+        },
+        {
+            "name": "fail",
+            "description": "fail",
+            "before": ["pass"],
+            "command": "echo shown; echo error >&2; exit 2",
+        },
+    ]
+
+    for run in [run_pyss, lambda cfg: asyncio.run(run_pyss_async(cfg))]:
+        cfg = __cfg(tmp_path, scripts, "fail").derive(
+            disable_output=False, output_on_failure=True
+        )
+        assert run(cfg) == 2
+
+        stdout, stderr = capfdbinary.readouterr()
+        assert stdout.splitlines() == [b"streamed", b"shown", b"error"]
+        assert stderr == b""
+
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_parallel_dependencies(tmp_path, engine):
+    import time
+    import asyncio
+    from pyss._async_execution import run_pyss_async
+
+    def run(cfg) -> int:
+        if engine == "sync":
+            return run_pyss(cfg)
+        return asyncio.run(run_pyss_async(cfg))
+
+    sleep = f'{sys.executable} -c "import time; time.sleep(0.6)"'
+    scripts = [
+        {
+            "name": "sleep",
+            "description": "sleep",
+            "before": {"parallel": True, "dependencies": [sleep, sleep]},
+            "command": f"{sys.executable} -c pass",
+        },
+        {
+            "name": "fail",
+            "description": "fail",
+            "before": [
+                f'{sys.executable} -c "import sys; sys.exit(4)"',
+                sleep,
+                f"{sys.executable} -c \"open('started.txt', 'w')\"",
+            ],
+            "command": f"{sys.executable} -c \"open('ran.txt', 'w')\"",
+        },
+    ]
+
+    # The entries run at the same time rather than one after the other.
+    start = time.perf_counter()
+    assert run(__cfg(tmp_path, scripts, "sleep")) == 0
+    assert 0.6 <= time.perf_counter() - start < 1.1
+
+    # Once an entry fails, the entries waiting for a job are not started
+    # and the script does not run.
+    cfg = __cfg(tmp_path, scripts, "fail").derive(jobs=2)
+    assert run(cfg) == 4
+    assert not (tmp_path / "started.txt").exists()
+    assert not (tmp_path / "ran.txt").exists()
+
+
+@pytest.mark.skipif(os.name != "posix", reason="process groups are POSIX only")
+@pytest.mark.parametrize("output", ["stream", "captured"])
+def test_cancel_terminates_process_group(tmp_path, output):
+    import time
+    import asyncio
+    from pyss._async_execution import run_pyss_async
+
+    # The shell waits for a child of its own, which has to be terminated
+    # along with it.
+    scripts = [
+        {
+            "name": "serve",
+            "description": "serve",
+            "command": "sleep 30 & echo $! > child.txt; wait",
+        },
+    ]
+    cfg = __cfg(tmp_path, scripts, "serve").derive(
+        disable_output=output == "stream", output_on_failure=output == "captured"
+    )
+
+    async def cancel() -> float:
+        task = asyncio.ensure_future(run_pyss_async(cfg))
+        while not (tmp_path / "child.txt").exists():
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.1)
+        started = time.perf_counter()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return time.perf_counter() - started
+
+    assert asyncio.run(cancel()) < 5
+    child = int((tmp_path / "child.txt").read_text())
+    for _ in range(50):
+        try:
+            os.kill(child, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.1)
+    else:
+        pytest.fail("the child of the cancelled command is still running")
+
+
+def test_engine_is_abstract():
+    from pyss._execution import Engine
+
+    class IncompleteEngine(Engine):
+        async def blocking(self, function, *args):
+            return function(*args)
+
+    for engine in [Engine, IncompleteEngine]:
+        with pytest.raises(TypeError):
+            engine()
@@ -0,0 +1,77 @@
+import os
+
+from pyss._freshness import is_up_to_date, record_state
+
+
+def __touch(path, content, mtime):
+    with open(path, "w") as file:
+        file.write(content)
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_mtime_freshness(tmp_path):
+    file_location = str(tmp_path / "pyss.yaml")
+    script = {"name": "build", "inputs": ["src/*.txt"], "outputs": ["out.txt"]}
+
+    os.mkdir(tmp_path / "src")
+    __touch(tmp_path / "src" / "a.txt", "a", 1_000_000_000)
+    assert not is_up_to_date(script, file_location)
+
+    __touch(tmp_path / "out.txt", "a", 2_000_000_000)
+    assert is_up_to_date(script, file_location)
+
+    __touch(tmp_path / "src" / "a.txt", "b", 3_000_000_000)
+    assert not is_up_to_date(script, file_location)
+
+    assert not is_up_to_date({"name": "build", "inputs": ["src/*.txt"]}, file_location)
+
+
+def test_hash_freshness(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYSS_CACHE_DIR", str(tmp_path / "cache"))
+    file_location = str(tmp_path / "pyss.yaml")
+    script = {
+        "name": "build",
+        "inputs": ["src/*.txt"],
+        "outputs": ["out.txt"],
+        "freshness": "hash",
+    }
+
+    os.mkdir(tmp_path / "src")
+    __touch(tmp_path / "src" / "a.txt", "a", 3_000_000_000)
+    __touch(tmp_path / "out.txt", "a", 1_000_000_000)
+    assert not is_up_to_date(script, file_location)
+
+    record_state(script, file_location)
+    assert is_up_to_date(script, file_location)
+
+    __touch(tmp_path / "src" / "a.txt", "a", 4_000_000_000)
+    assert is_up_to_date(script, file_location)
+
+    __touch(tmp_path / "src" / "a.txt", "b", 4_000_000_000)
+    assert not is_up_to_date(script, file_location)
+
+
+def test_outputs_without_inputs(tmp_path):
+    file_location = str(tmp_path / "pyss.yaml")
+    script = {"name": "download", "outputs": ["data.bin"]}
+
+    assert not is_up_to_date(script, file_location)
+    __touch(tmp_path / "data.bin", "a", 1_000_000_000)
+    assert is_up_to_date(script, file_location)
+
+
+def test_record_state_concurrently(tmp_path, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    monkeypatch.setenv("PYSS_CACHE_DIR", str(tmp_path / "cache"))
+    file_location = str(tmp_path / "pyss.yaml")
+    script = {"name": "build", "outputs": ["out.txt"], "freshness": "hash"}
+    __touch(tmp_path / "out.txt", "a", 1_000_000_000)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for _ in range(64):
+            executor.submit(record_state, script, file_location)
+
+    assert is_up_to_date(script, file_location)
+    # One state file is left, and no temporary files.
+    assert len(os.listdir(tmp_path / "cache" / "freshness")) == 1
@@ -0,0 +1,197 @@
+import os
+import sqlite3
+
+import pytest
+
+from pyss._profile import Profiler, Span
+from pyss._types import PySSFile, Scripts, PyssCfg
+from pyss._execution import run_pyss
+from pyss._history import (
+    history_enabled,
+    history_location,
+    history_stats,
+    record_history,
+)
+
+
+def __run(tmp_path, script_name: str, profiler: Profiler) -> int:
+    scripts = [
+        {
+            "name": "build",
+            "description": "build",
+            "before": ["lint"],
+            "command": "python -c pass",
+        },
+        {"name": "lint", "internal": True, "command": "exit 3"},
+        {"name": "fast", "description": "fast", "command": "true"},
+    ]
+    pyss_file = PySSFile({"scripts": scripts}, str(tmp_path / "pyss.yaml"))
+    cfg = PyssCfg(
+        Scripts(pyss_file, scripts),
+        script_name,
+        quiet=True,
+        disable_output=True,
+        profiler=profiler,
+    )
+    return run_pyss(cfg)
+
+
+def test_record_history(tmp_path):
+    location = history_location(str(tmp_path))
+    for script_name in ["build", "fast", "fast"]:
+        profiler = Profiler()
+        __run(tmp_path, script_name, profiler)
+        record_history(location, profiler)
+
+    assert (tmp_path / ".pyss" / ".gitignore").read_text() == "*\n"
+
+    with sqlite3.connect(location) as connection:
+        rows = connection.execute(
+            "SELECT kind, name, script, exit_code FROM runs ORDER BY id"
+        ).fetchall()
+    assert rows[:4] == [
+        ("command", "exit 3", "lint", 3),
+        ("script", "lint", "build", 3),
+        ("dependency", "lint", "build", 3),
+        ("script", "build", None, 3),
+    ]
+    assert rows.count(("script", "fast", None, 0)) == 2
+
+    stats = {row["name"]: row for row in history_stats(location)}
+    assert set(stats) == {"build", "fast", "lint"}
+    assert stats["build"]["failure_rate"] == 1.0
+    assert stats["fast"]["count"] == 2
+    assert stats["fast"]["failure_rate"] == 0.0
+
+    # The statistics of a script include what it ran.
+    names = [(row["kind"], row["name"]) for row in history_stats(location, "build")]
+    assert names == [
+        ("script", "build"),
+        ("script", "lint"),
+        ("dependency", "lint"),
+    ]
+
+
+def test_history_stats(tmp_path):
+    location = history_location(str(tmp_path))
+    profiler = Profiler()
+    # Eight runs whose duration doubles halfway through.
+    for n, duration in enumerate([1, 1, 1, 1, 2, 2, 2, 2]):
+        script = Span(profiler, "slow", "script")
+        command = Span(profiler, "sleep", "command")
+        for span in [script, command]:
+            span.start, span.end = float(n * 10), float(n * 10 + duration)
+            span.set(exit_code=0 if n else 1)
+            profiler.record(span)
+        command.parent = script
+    record_history(location, profiler)
+
+    # Spans of scripts that did not finish, without an exit code, are
+    # left out.
+    profiler = Profiler()
+    with Span(profiler, "slow", "script"):
+        pass
+    record_history(location, profiler)
+
+    stats, command = history_stats(location, "slow")
+    assert (stats["name"], command["name"]) == ("slow", "sleep")
+    assert stats["count"] == 8
+    assert stats["failure_rate"] == pytest.approx(1 / 8)
+    assert (stats["p50"], stats["p95"], stats["max"]) == (1.0, 2.0, 2.0)
+    assert stats["trend"] == pytest.approx(1.0)
+
+    # Only the last runs are considered.
+    stats, _ = history_stats(location, "slow", last=4)
+    assert stats["count"] == 8
+    assert stats["failure_rate"] == 0.0
+    assert stats["trend"] == pytest.approx(0.0)
+
+
+def test_history_is_opt_in(monkeypatch):
+    monkeypatch.delenv("PYSS_HISTORY", raising=False)
+    assert not history_enabled()
+    monkeypatch.setenv("PYSS_HISTORY", "0")
+    assert not history_enabled()
+    monkeypatch.setenv("PYSS_HISTORY", "1")
+    assert history_enabled()
+
+
+def test_history_of_a_newer_format_is_kept(tmp_path):
+    location = history_location(str(tmp_path))
+    profiler = Profiler()
+    assert __run(tmp_path, "fast", profiler) == 0
+    record_history(location, profiler)
+
+    with sqlite3.connect(location) as connection:
+        connection.execute("PRAGMA user_version=99")
+        (rows,) = connection.execute("SELECT COUNT(*) FROM runs").fetchone()
+    connection.close()
+
+    record_history(location, profiler)
+    with pytest.raises(sqlite3.DatabaseError, match="format 99"):
+        history_stats(location)
+
+    with sqlite3.connect(location) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM runs").fetchone() == (rows,)
+    connection.close()
+
+
+def test_history_records_skipped_runs(tmp_path):
+    scripts = [
+        {
+            "name": "build",
+            "description": "build",
+            "inputs": ["src.txt"],
+            "outputs": ["out.txt"],
+            "command": "cp src.txt out.txt",
+        },
+    ]
+    (tmp_path / "src.txt").write_text("a")
+    pyss_file = PySSFile({"scripts": scripts}, str(tmp_path / "pyss.yaml"))
+    location = history_location(str(tmp_path))
+
+    for _ in range(2):
+        profiler = Profiler()
+        cfg = PyssCfg(
+            Scripts(pyss_file, scripts),
+            "build",
+            quiet=True,
+            disable_output=True,
+            profiler=profiler,
+        )
+        assert run_pyss(cfg) == 0
+        record_history(location, profiler)
+
+    with sqlite3.connect(location) as connection:
+        rows = connection.execute(
+            "SELECT kind, name, exit_code, outcome FROM runs "
+            "WHERE kind = 'script' ORDER BY id"
+        ).fetchall()
+    connection.close()
+    assert rows == [("script", "build", 0, None), ("script", "build", 0, "up-to-date")]
+
+    (stats,) = history_stats(location)
+    assert (stats["count"], stats["skip_rate"]) == (2, 0.5)
+
+
+def test_history_of_an_older_format_is_migrated(tmp_path):
+    location = history_location(str(tmp_path))
+    os.makedirs(os.path.dirname(location))
+    with sqlite3.connect(location) as connection:
+        connection.executescript(
+            "CREATE TABLE runs (id INTEGER PRIMARY KEY, kind TEXT NOT NULL, "
+            "name TEXT NOT NULL, script TEXT, command_hash TEXT, "
+            "started REAL NOT NULL, duration REAL NOT NULL, exit_code INTEGER, "
+            "cpu_time REAL, max_rss INTEGER); "
+            "INSERT INTO runs (kind, name, started, duration, exit_code) "
+            "VALUES ('script', 'fast', 0, 1, 0); "
+            "PRAGMA user_version=1;"
+        )
+    connection.close()
+
+    profiler = Profiler()
+    assert __run(tmp_path, "fast", profiler) == 0
+    record_history(location, profiler)
+
+    (stats,) = history_stats(location)
+    assert (stats["name"], stats["count"], stats["skip_rate"]) == ("fast", 2, 0.0)
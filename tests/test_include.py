@@ -0,0 +1,147 @@
+import pytest
+
+from pyss._scripts import load_pyss_file, get_scripts, print_scripts
+from pyss._plan import Plan, PlanError
+from pyss._include import load_fragment
+
+
+def __write(path, content: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+def __plan(tmp_path, content: str) -> Plan:
+    __write(tmp_path / "pyss.yaml", content)
+    return Plan(get_scripts(load_pyss_file(str(tmp_path / "pyss.yaml"), False)))
+
+
+def test_include(tmp_path):
+    __write(
+        tmp_path / "shared" / "python.yaml",
+        "env:\n"
+        "  TOOL: python\n"
+        "  LEVEL: fragment\n"
+        "scripts:\n"
+        "  - name: lint\n"
+        "    description: lint\n"
+        "    env:\n"
+        "      LEVEL: script\n"
+        "    command: ruff check\n"
+        "    before: format\n"
+        "  - name: format\n"
+        "    internal: true\n"
+        "    command: ruff format\n",
+    )
+    # Fragments that are not needed are never read.
+    __write(tmp_path / "shared" / "broken.yaml", "scripts: [{}]\n")
+
+    plan = __plan(
+        tmp_path,
+        "pyss:\n"
+        "  include:\n"
+        "    - path: shared/broken.yaml\n"
+        "      scripts: [docs]\n"
+        "    - shared/python.yaml\n"
+        "scripts:\n"
+        "  - name: test\n"
+        "    description: test\n"
+        "    command: pytest\n"
+        "    before: [lint, echo done]\n",
+    )
+
+    lint = plan.resolve("test").before.entries[0].script
+    assert lint.name == "lint"
+    assert lint.env == {"TOOL": "python", "LEVEL": "script"}
+    assert lint.before.entries[0].script.name == "format"
+    assert plan.resolve("test").before.entries[1].commands[0].get() == "echo done"
+    assert plan.get("missing") is None
+
+    with pytest.raises(PlanError, match="is not valid"):
+        plan.resolve("docs")
+
+
+def test_include_memoized(tmp_path):
+    fragment = tmp_path / "fragment.yaml"
+    __write(fragment, "scripts:\n  - name: a\n    internal: true\n    command: a\n")
+
+    first = load_fragment(str(fragment), False)
+    assert load_fragment(str(fragment), False) is first
+
+    __write(fragment, "scripts:\n  - name: b\n    internal: true\n    command: bb\n")
+    assert list(load_fragment(str(fragment), False).index) == ["b"]
+
+
+def test_list_included_scripts(tmp_path, capsys):
+    __write(
+        tmp_path / "fragment.yaml",
+        "scripts:\n"
+        "  - name: lint\n"
+        "    description: Lints the code.\n"
+        "    command: ruff check\n"
+        "  - name: test\n"
+        "    description: Shadowed.\n"
+        "    command: pytest\n"
+        "  - name: format\n"
+        "    internal: true\n"
+        "    command: ruff format\n",
+    )
+    __write(
+        tmp_path / "pyss.yaml",
+        "pyss:\n"
+        "  include: [fragment.yaml]\n"
+        "scripts:\n"
+        "  - name: test\n"
+        "    description: Runs the tests.\n"
+        "    command: pytest -q\n",
+    )
+
+    with pytest.raises(SystemExit):
+        print_scripts(get_scripts(load_pyss_file(str(tmp_path / "pyss.yaml"), False)))
+
+    listed = [line.split()[2:] for line in capsys.readouterr().out.splitlines()[2:]]
+    assert listed == [
+        [":", "Runs", "the", "tests."],
+        [":", "Lints", "the", "code."],
+    ]
+
+
+def test_extends(tmp_path):
+    __write(
+        tmp_path / "base.yaml",
+        "scripts:\n"
+        "  - name: pytest\n"
+        "    internal: true\n"
+        "    env: {ARGS: -q, PYTHONHASHSEED: '0'}\n"
+        "    command: pytest $ARGS\n"
+        "    inputs: ['src/**']\n",
+    )
+    plan = __plan(
+        tmp_path,
+        "pyss:\n"
+        "  include: [base.yaml]\n"
+        "scripts:\n"
+        "  - name: test\n"
+        "    description: test\n"
+        "    extends: pytest\n"
+        "    env: {ARGS: -x}\n"
+        "  - name: ci\n"
+        "    extends: test\n"
+        "    commands: [tox]\n"
+        "  - name: a\n"
+        "    extends: b\n"
+        "  - name: b\n"
+        "    extends: a\n",
+    )
+
+    test = plan.resolve("test")
+    assert test.internal is False
+    assert test.env == {"ARGS": "-x", "PYTHONHASHSEED": "0"}
+    assert [command.get() for command in test.commands] == ["pytest $ARGS"]
+    assert test.definition["inputs"] == ["src/**"]
+
+    ci = plan.resolve("ci")
+    assert ci.description == "test"
+    assert [command.get() for command in ci.commands] == ["tox"]
+
+    with pytest.raises(PlanError, match="Extends cycle detected: a -> b -> a"):
+        plan.resolve("a")
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from pyss._types import PySSFile, Scripts, PyssCfg
+from pyss._execution import run_pyss
+from pyss._async_execution import run_pyss_async
+from pyss._matrix import matrix_combinations
+
+
+def __cfg(tmp_path, scripts: list[dict], script_name: str, **kwargs) -> PyssCfg:
+    pyss_file = PySSFile({"scripts": scripts}, str(tmp_path / "pyss.yaml"))
+    return PyssCfg(
+        Scripts(pyss_file, scripts),
+        script_name,
+        quiet=True,
+        disable_output=True,
+        **kwargs,
+    )
+
+
+def __script(**matrix) -> dict:
+    return {
+        "name": "test",
+        "description": "test",
+        "env": {"PYTHON": "default"},
+        "matrix": {
+            "env": {"PYTHON": ["3.11", "3.12"], "DB": ["sqlite", "postgres"]},
+            **matrix,
+        },
+        "commands": [
+            "test ${PYTHON}-${DB} != 3.11-postgres",
+            "echo ${PYTHON} > ${PYTHON}-${DB}.txt",
+        ],
+    }
+
+
+def test_matrix_combinations():
+    matrix = {
+        "env": {"PYTHON": ["3.11", 3.12], "DB": ["sqlite", "postgres"]},
+        "exclude": [{"PYTHON": 3.12, "DB": "postgres"}, {"DB": "mysql"}],
+    }
+    assert matrix_combinations(matrix) == [
+        {"PYTHON": "3.11", "DB": "sqlite"},
+        {"PYTHON": "3.11", "DB": "postgres"},
+        {"PYTHON": "3.12", "DB": "sqlite"},
+    ]
+
+
+def test_matrix_collect_all(tmp_path):
+    scripts = [__script(fail_fast=False)]
+    assert run_pyss(__cfg(tmp_path, scripts, "test", jobs=4)) == 1
+
+    # Every other combination runs, with the matrix overriding the env of
+    # the script.
+    outputs = sorted(path.name for path in tmp_path.glob("*.txt"))
+    assert outputs == ["3.11-sqlite.txt", "3.12-postgres.txt", "3.12-sqlite.txt"]
+    assert (tmp_path / "3.12-postgres.txt").read_text() == "3.12\n"
+
+
+def test_matrix_fail_fast(tmp_path):
+    scripts = [__script(max_parallel=1)]
+    assert run_pyss(__cfg(tmp_path, scripts, "test")) == 1
+
+    # No combinations are started after the first failure.
+    assert sorted(path.name for path in tmp_path.glob("*.txt")) == ["3.11-sqlite.txt"]
+
+
+def test_matrix_as_dependency_async(tmp_path):
+    scripts = [
+        __script(exclude=[{"PYTHON": "3.11", "DB": "postgres"}]),
+        {
+            "name": "all",
+            "description": "all",
+            "before": ["test"],
+            "command": "echo done > done.txt",
+        },
+    ]
+    assert asyncio.run(run_pyss_async(__cfg(tmp_path, scripts, "all"))) == 0
+    assert len(list(tmp_path.glob("*.txt"))) == 4
+
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_matrix_dependencies_run_once(tmp_path, engine):
+    script = __script(exclude=[{"PYTHON": "3.11", "DB": "postgres"}])
+    scripts = [
+        {
+            **script,
+            "before": ["echo ${PYTHON} >> before.log"],
+            "after": ["echo ${PYTHON} >> after.log"],
+        },
+    ]
+    cfg = __cfg(tmp_path, scripts, "test", jobs=4)
+    if engine == "sync":
+        assert run_pyss(cfg) == 0
+    else:
+        assert asyncio.run(run_pyss_async(cfg)) == 0
+
+    # The dependencies see the env of the script, not of a combination.
+    assert (tmp_path / "before.log").read_text() == "default\n"
+    assert (tmp_path / "after.log").read_text() == "default\n"
+    assert len(list(tmp_path.glob("3.1*.txt"))) == 3
+
+    # No 'after' dependencies run once a combination has failed.
+    (tmp_path / "after.log").unlink()
+    scripts[0]["matrix"].pop("exclude")
+    assert run_pyss(__cfg(tmp_path, scripts, "test", jobs=4)) == 1
+    assert (tmp_path / "before.log").read_text() == "default\ndefault\n"
+    assert not (tmp_path / "after.log").exists()
@@ -0,0 +1,90 @@
+import io
+import os
+
+from pyss._output import PrefixedOutput, CapturedOutput, pump
+from pyss._constants import OUTPUT_LINE_LIMIT
+
+
+class __Stream(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.buffer = io.BytesIO()
+
+
+def test_prefixed_output(monkeypatch):
+    monkeypatch.setenv("NO_COLOR", "1")
+    stream = __Stream()
+    output = PrefixedOutput("build", stream)
+
+    output.feed(b"first line\nsecond ")
+    assert stream.buffer.getvalue() == b"[build] first line\n"
+
+    output.feed(b"line\nthird\r\n")
+    output.feed(b"unterminated")
+    output.close()
+    assert stream.buffer.getvalue() == (
+        b"[build] first line\n"
+        b"[build] second line\n"
+        b"[build] third\r\n"
+        b"[build] unterminated\n"
+    )
+
+
+def test_prefixed_output_is_bounded(monkeypatch):
+    monkeypatch.setenv("NO_COLOR", "1")
+    stream = __Stream()
+    output = PrefixedOutput("chatty", stream)
+
+    for _ in range(3):
+        output.feed(b"x" * (OUTPUT_LINE_LIMIT // 2))
+        assert len(output.pending) < OUTPUT_LINE_LIMIT
+
+    output.close()
+    lines = stream.buffer.getvalue().splitlines()
+    assert len(lines) == 2
+    assert sum(len(line) - len(b"[chatty] ") for line in lines) == (
+        3 * (OUTPUT_LINE_LIMIT // 2)
+    )
+
+
+def test_pump():
+    received = {"a": bytearray(), "b": bytearray()}
+    pipes = []
+    for name in received:
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, name.encode() * 1000)
+        os.close(write_fd)
+        pipes.append((os.fdopen(read_fd, "rb"), received[name].extend))
+
+    pump(pipes)
+    for pipe, _ in pipes:
+        pipe.close()
+
+    assert received == {"a": bytearray(b"a" * 1000), "b": bytearray(b"b" * 1000)}
+
+
+def test_captured_output(monkeypatch):
+    monkeypatch.setattr("pyss._output.OUTPUT_CAPTURE_MEMORY", 8)
+
+    output = CapturedOutput(limit=64)
+    output.write(b"small")
+    assert output.file is None
+    assert b"".join(output.chunks()) == b"small"
+
+    # Beyond the memory limit the output spills to a file, of which only
+    # the last `limit` bytes are kept.
+    lines = [f"line {n:03}\n".encode() for n in range(100)]
+    for line in lines:
+        output.write(line)
+    assert output.file is not None
+    assert os.fstat(output.file.fileno()).st_size == 64
+
+    kept = b"".join(lines)[-64:]
+    omitted = len(b"small") + 100 * len(lines[0]) - 64
+    assert output.omitted() == omitted
+    assert b"".join(output.chunks()) == (
+        f"[... {omitted} bytes of output omitted ...]\n".encode() + kept
+    )
+
+    output.close()
+    assert output.file is None
@@ -0,0 +1,140 @@
+from pyss._plan import Plan, PlanError
+from pyss._types import PySSFile, Scripts
+
+
+def __plan(scripts: list[dict]) -> Plan:
+    pyss_file = PySSFile({"scripts": scripts}, "pyss.yaml")
+    return Plan(Scripts(pyss_file, scripts))
+
+
+def test_plan_resolves_references():
+    plan = __plan(
+        [
+            {
+                "name": "build",
+                "description": "build",
+                "before": ["codegen", "echo prepare", {"script": "lint"}],
+                "after": {"parallel": True, "dependencies": ["lint"]},
+                "command": "echo build",
+            },
+            {"name": "codegen", "internal": True, "before": "lint", "command": "a"},
+            {"name": "lint", "internal": True, "commands": ["b", "c"]},
+            {
+                "name": "unrelated",
+                "internal": True,
+                "before": "missing",
+                "command": "d",
+            },
+        ]
+    )
+
+    build = plan.resolve("build")
+    codegen, prepare, lint = build.before.entries
+
+    assert codegen.script is plan.nodes["codegen"]
+    assert prepare.script is None and prepare.commands[0].get() == "echo prepare"
+    assert lint.script is plan.nodes["lint"]
+    assert codegen.script.before.entries[0].script is lint.script
+    assert build.after.parallel
+    assert [command.get() for command in lint.script.commands] == ["b", "c"]
+    assert "unrelated" not in plan.nodes
+
+
+def test_plan_errors():
+    failure_cases = [
+        (
+            [
+                {"name": "a", "description": "a", "before": "b", "command": "a"},
+                {"name": "b", "internal": True, "after": ["c"], "command": "b"},
+                {
+                    "name": "c",
+                    "internal": True,
+                    "before": {"script": "a"},
+                    "command": "c",
+                },
+            ],
+            "Dependency cycle detected: a -> b -> c -> a",
+        ),
+        (
+            [{"name": "a", "description": "a", "before": "a", "command": "a"}],
+            "Dependency cycle detected: a -> a",
+        ),
+        (
+            [
+                {
+                    "name": "a",
+                    "description": "a",
+                    "before": {"script": "b"},
+                    "command": "a",
+                }
+            ],
+            "Script 'b' not found (referenced by 'a').",
+        ),
+    ]
+
+    for scripts, message in failure_cases:
+        exception: PlanError = None
+        try:
+            __plan(scripts).resolve("a")
+        except PlanError as e:
+            exception = e
+        assert exception is not None
+        assert str(exception) == message
+
+
+def test_plan_deep_chain():
+    depth = 5000
+    scripts = [
+        {
+            "name": f"step-{index}",
+            "internal": True,
+            "before": f"step-{index + 1}",
+            "command": "true",
+        }
+        for index in range(depth)
+    ]
+    scripts.append({"name": f"step-{depth}", "internal": True, "command": "true"})
+
+    plan = __plan(scripts)
+    node = plan.resolve("step-0")
+    assert len(plan.nodes) == depth + 1
+
+    for _ in range(depth):
+        node = node.before.entries[0].script
+    assert node.name == f"step-{depth}"
+
+
+def test_plan_scoped_validation(tmp_path, monkeypatch):
+    import pytest
+    from pyss._scripts import load_pyss_file, get_scripts
+
+    monkeypatch.setenv("PYSS_CACHE_DIR", str(tmp_path / "cache"))
+    (tmp_path / "pyss.yaml").write_text(
+        "scripts:\n"
+        "  - name: build\n"
+        "    description: build\n"
+        "    command: make\n"
+        "    before: codegen\n"
+        "  - name: codegen\n"
+        "    internal: true\n"
+        "    command: gen\n"
+        "  - name: broken\n"
+        "    description: broken\n"
+        "    command: 1\n"
+        "  - description: nameless\n"
+    )
+    file_location = str(tmp_path / "pyss.yaml")
+
+    # Scripts that are not reachable from the one being run do not fail it.
+    for run in range(2):
+        pyss_file = load_pyss_file(file_location)
+        assert not pyss_file.validated
+        # The scripts validated by the first run are not validated again.
+        assert pyss_file.valid_scripts == (None if run == 0 else {"build", "codegen"})
+        plan = Plan(get_scripts(pyss_file, scoped=True))
+        assert plan.resolve("build").before.entries[0].script.name == "codegen"
+        with pytest.raises(PlanError, match="Script 'broken' is not valid"):
+            plan.resolve("broken")
+
+    with pytest.raises(SystemExit):
+        get_scripts(load_pyss_file(file_location))
@@ -0,0 +1,94 @@
+import os
+import json
+
+import pytest
+
+from pyss._profile import Profiler, Span, span
+from pyss._types import PySSFile, Scripts, PyssCfg
+from pyss._execution import run_pyss
+
+
+def __span(profiler, name, category, start, end, parent=None) -> Span:
+    result = Span(profiler, name, category)
+    result.start, result.end, result.parent = start, end, parent
+    profiler.record(result)
+    return result
+
+
+def test_profile_summary():
+    profiler = Profiler()
+    build = __span(profiler, "build", "script", 0.0, 10.0)
+    # Two children running in parallel during [1, 7].
+    __span(profiler, "sleep 5", "command", 1.0, 6.0, build)
+    __span(profiler, "sleep 6", "command", 1.0, 7.0, build)
+    __span(profiler, "load config", "pyss", 0.0, 0.5)
+
+    rows = {row["name"]: row for row in profiler.summary()}
+    assert rows["build"]["self"] == pytest.approx(4.0)
+    assert rows["build"]["total"] == pytest.approx(10.0)
+    assert [row["name"] for row in profiler.summary()] == [
+        "sleep 6",
+        "sleep 5",
+        "build",
+        "load config",
+    ]
+
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_profile_run(tmp_path, engine):
+    import asyncio
+    from pyss._async_execution import run_pyss_async
+
+    scripts = [
+        {
+            "name": "build",
+            "description": "build",
+            "before": {"parallel": True, "dependencies": ["true", "lint"]},
+            "command": "exit 0",
+        },
+        {"name": "lint", "internal": True, "command": "true"},
+    ]
+    pyss_file = PySSFile({"scripts": scripts}, str(tmp_path / "pyss.yaml"))
+    profiler = Profiler()
+    cfg = PyssCfg(
+        Scripts(pyss_file, scripts),
+        "build",
+        quiet=True,
+        disable_output=True,
+        profiler=profiler,
+    )
+
+    with span(profiler, "load config", "pyss"):
+        pass
+    if engine == "sync":
+        assert run_pyss(cfg) == 0
+    else:
+        assert asyncio.run(run_pyss_async(cfg)) == 0
+
+    categories = sorted({(s.category, s.name) for s in profiler.spans})
+    assert ("script", "build") in categories
+    assert ("script", "lint") in categories
+    assert ("dependency", "true") in categories
+    assert ("command", "exit 0") in categories
+
+    # Spans of parallel dependencies are nested in the script that runs them.
+    lint = next(
+        s for s in profiler.spans if s.name == "lint" and s.category == "script"
+    )
+    assert lint.parent.category == "dependency"
+    assert lint.parent.parent.name == "build"
+
+    commands = [s for s in profiler.spans if s.category == "command"]
+    assert all(s.args["exit_code"] == 0 for s in commands)
+    if hasattr(os, "wait4"):
+        assert all(s.args["max_rss"] > 0 for s in commands)
+
+    trace_file = tmp_path / "trace.json"
+    profiler.write_trace(str(trace_file))
+    events = json.loads(trace_file.read_text())["traceEvents"]
+    complete = [event for event in events if event["ph"] == "X"]
+    assert len(complete) == len(profiler.spans)
+    assert all(event["dur"] >= 0 for event in complete)
+    assert {event["tid"] for event in events if event["ph"] == "M"} == {
+        event["tid"] for event in complete
+    }
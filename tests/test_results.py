@@ -0,0 +1,103 @@
+import os
+import time
+
+import pytest
+
+from pyss._results import (
+    DirectoryBackend,
+    HttpBackend,
+    ResultCacheBackend,
+    result_key,
+    restore_result,
+    store_result,
+)
+
+
+def test_result_round_trip(tmp_path):
+    backend = DirectoryBackend(str(tmp_path / "results"), 1 << 20)
+    root = tmp_path / "project"
+    os.makedirs(root / "src")
+    (root / "src" / "a.txt").write_text("a")
+
+    key = result_key([("echo a", None)], {"NAME": "x"}, ["src/*.txt"], str(root))
+    assert key == result_key(
+        [("echo a", None)], {"NAME": "x"}, ["src/*.txt"], str(root)
+    )
+    assert key != result_key(
+        [("echo a", None)], {"NAME": "y"}, ["src/*.txt"], str(root)
+    )
+    assert restore_result(backend, key, str(root)) is None
+
+    os.makedirs(root / "out")
+    (root / "out" / "a.txt").write_text("output")
+    store_result(backend, key, str(root), ["out/*.txt"], 0, b"a\n")
+
+    os.remove(root / "out" / "a.txt")
+    assert restore_result(backend, key, str(root)) == (0, b"a\n")
+    assert (root / "out" / "a.txt").read_text() == "output"
+
+    (root / "src" / "a.txt").write_text("b")
+    assert key != result_key(
+        [("echo a", None)], {"NAME": "x"}, ["src/*.txt"], str(root)
+    )
+
+
+def test_result_eviction(tmp_path):
+    root = tmp_path / "project"
+    os.makedirs(root)
+    (root / "out.bin").write_bytes(os.urandom(4096))
+
+    # Each archive occupies 10240 bytes, so only two of them fit.
+    backend = DirectoryBackend(str(tmp_path / "results"), 25000)
+    for index, key in enumerate(["a" * 64, "b" * 64, "c" * 64]):
+        store_result(backend, key, str(root), ["out.bin"], 0, None)
+        for entry in os.scandir(tmp_path / "results" / key[:2]):
+            os.utime(entry.path, ns=(index, index))
+
+    backend.evict()
+    assert restore_result(backend, "a" * 64, str(root)) is None
+    assert restore_result(backend, "b" * 64, str(root)) == (0, None)
+    assert restore_result(backend, "c" * 64, str(root)) == (0, None)
+
+
+def test_result_server_timeout(tmp_path):
+    import socket
+
+    # Connections to the server are accepted but never answered.
+    server = socket.create_server(("127.0.0.1", 0))
+    with server:
+        url = f"http://127.0.0.1:{server.getsockname()[1]}"
+        backend = HttpBackend(url, timeout=0.2)
+
+        start = time.monotonic()
+        assert not backend.get("0" * 64, str(tmp_path / "archive.tar"))
+        assert not backend.available
+        backend.put("0" * 64, str(tmp_path / "archive.tar"))
+        assert time.monotonic() - start < 2
+
+    with pytest.raises(TypeError):
+        ResultCacheBackend()
+
+
+def test_result_eviction_threshold(tmp_path, monkeypatch):
+    root = tmp_path / "project"
+    os.makedirs(root)
+    (root / "out.bin").write_bytes(os.urandom(4096))
+
+    walks = []
+    walk = os.walk
+    monkeypatch.setattr(os, "walk", lambda *args: walks.append(args) or walk(*args))
+
+    backend = DirectoryBackend(str(tmp_path / "results"), 25000)
+    for key in ["a" * 64, "b" * 64]:
+        store_result(backend, key, str(root), ["out.bin"], 0, None)
+    # Only the first result counts the directory; the second one fits.
+    assert len(walks) == 1
+    assert (tmp_path / "results" / "size").read_text() == "20480"
+
+    store_result(backend, "b" * 64, str(root), ["out.bin"], 0, None)
+    assert len(walks) == 1
+
+    store_result(backend, "c" * 64, str(root), ["out.bin"], 0, None)
+    assert len(walks) == 2
+    assert (tmp_path / "results" / "size").read_text() == "20480"
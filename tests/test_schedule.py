@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from pyss._types import PySSFile, Scripts, PyssCfg
+from pyss._plan import Plan
+from pyss._profile import Profiler
+from pyss._execution import run_pyss
+from pyss._async_execution import run_pyss_async
+from pyss._history import history_location, record_history
+from pyss._schedule import Estimates, parse_duration
+
+SCRIPTS = [
+    {
+        "name": "build",
+        "description": "build",
+        "before": {
+            "parallel": True,
+            "dependencies": ["short", "long", "echo command >> order.txt"],
+        },
+        "command": "echo build >> order.txt",
+        "estimate": "5s",
+    },
+    {
+        "name": "short",
+        "internal": True,
+        "command": "echo short >> order.txt",
+        "estimate": 10,
+    },
+    {
+        "name": "long",
+        "internal": True,
+        "before": ["codegen"],
+        "command": "echo long >> order.txt",
+        "estimate": "1m30s",
+    },
+    {
+        "name": "codegen",
+        "internal": True,
+        "command": "echo codegen >> order.txt",
+        "estimate": "20s",
+    },
+]
+
+
+def __cfg(tmp_path, **options) -> PyssCfg:
+    pyss_file = PySSFile({"scripts": SCRIPTS}, str(tmp_path / "pyss.yaml"))
+    return PyssCfg(
+        Scripts(pyss_file, SCRIPTS),
+        "build",
+        quiet=True,
+        disable_output=True,
+        **options,
+    )
+
+
+def test_parse_duration():
+    assert parse_duration("90s") == 90
+    assert parse_duration("1m30s") == 90
+    assert parse_duration("1.5h") == 5400
+    assert parse_duration("250ms") == 0.25
+    assert parse_duration(12) == 12.0
+    with pytest.raises(ValueError):
+        parse_duration("soon")
+
+
+def test_critical_path(tmp_path):
+    build = Plan(__cfg(tmp_path).scripts).resolve("build")
+
+    estimates = Estimates(None)
+    assert estimates.critical_path(build) == [
+        ("codegen", 20.0),
+        ("long", 90.0),
+        ("build", 5.0),
+    ]
+    assert estimates.total(build) == 115.0
+    assert estimates.work(build) == 125.0
+    assert estimates.unknown == {"echo command >> order.txt"}
+
+    # The longest entries of a parallel list start first.
+    order = estimates.order(build.before.entries)
+    assert [entry.script.name if entry.script else None for entry in order] == [
+        "long",
+        "short",
+        None,
+    ]
+
+
+def test_estimates_from_history(tmp_path):
+    location = history_location(str(tmp_path))
+    profiler = Profiler()
+    assert run_pyss(__cfg(tmp_path, profiler=profiler)) == 0
+    record_history(location, profiler)
+
+    # Recorded durations take precedence over declared ones.
+    build = Plan(__cfg(tmp_path).scripts).resolve("build")
+    estimates = Estimates(location)
+    assert estimates.own(build) < 5
+    assert estimates.own(build.before.entries[1].script) < 90
+    assert estimates.unknown == set()
+
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_longest_path_first(tmp_path, engine):
+    cfg = __cfg(tmp_path, jobs=1)
+    if engine == "sync":
+        assert run_pyss(cfg) == 0
+    else:
+        assert asyncio.run(run_pyss_async(cfg)) == 0
+
+    assert (tmp_path / "order.txt").read_text().split() == [
+        "codegen",
+        "long",
+        "short",
+        "command",
+        "build",
+    ]
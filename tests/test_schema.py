@@ -491,3 +491,202 @@ def test_scripts_dependency_requirements():
             exception = e
         assert exception is not None
         assert exception.message == "{} is not valid under any of the given schemas"
+
+
+def test_scripts_parallel_dependencies():
+    happy_cases = [
+        {
+            "parallel": True,
+            "dependencies": ["test2", {"command": "echo 'hello'"}],
+        },
+        {
+            "dependencies": [{"script": "test2"}],
+        },
+    ]
+
+    for dependencies in happy_cases:
+        data = {
+            "pyss": {},
+            "scripts": [
+                {
+                    "name": "test",
+                    "description": "test",
+                    "command": "echo 'hello world'",
+                    "before": dependencies,
+                    "after": dependencies,
+                },
+                {
+                    "name": "test2",
+                    "internal": True,
+                    "command": "echo 'hello world'",
+                },
+            ],
+        }
+
+        exception: Exception = None
+        try:
+            validate_pyss_data(data)
+        except Exception as e:
+            exception = e
+        assert exception is None
+
+    failure_cases = [
+        (
+            {"parallel": True},
+            "{'parallel': True} is not valid under any of the given schemas",
+        ),
+        (
+            {"parallel": "yes", "dependencies": ["test2"]},
+            "'yes' is not of type 'boolean'",
+        ),
+    ]
+
+    for dependencies, message in failure_cases:
+        data = {
+            "pyss": {},
+            "scripts": [
+                {
+                    "name": "test",
+                    "description": "test",
+                    "command": "echo 'hello world'",
+                    "before": dependencies,
+                },
+            ],
+        }
+
+        exception: ValidationError = None
+        try:
+            validate_pyss_data(data)
+        except ValidationError as e:
+            exception = e
+        assert exception is not None
+        assert exception.message == message
+
+
+def test_scripts_matrix():
+    happy_cases = [
+        {"env": {"PYTHON": ["3.11", "3.12"], "DB": ["sqlite", "postgres"]}},
+        {
+            "env": {"PYTHON": ["3.11", 3.12], "DEBUG": [True, False]},
+            "exclude": [{"PYTHON": "3.11", "DEBUG": True}],
+            "max_parallel": 2,
+            "fail_fast": False,
+        },
+    ]
+
+    for matrix in happy_cases:
+        data = {
+            "scripts": [
+                {
+                    "name": "test",
+                    "description": "test",
+                    "command": "echo ${PYTHON}",
+                    "matrix": matrix,
+                },
+            ],
+        }
+
+        exception: Exception = None
+        try:
+            validate_pyss_data(data)
+        except Exception as e:
+            exception = e
+        assert exception is None
+
+    failure_cases = [
+        ({"exclude": []}, "'env' is a required property"),
+        ({"env": {"PYTHON": "3.11"}}, "'3.11' is not of type 'array'"),
+        (
+            {"env": {"PYTHON": [["3.11"]]}},
+            "['3.11'] is not of type 'string', 'number', 'boolean'",
+        ),
+        (
+            {"env": {"PYTHON": ["3.11"]}, "max_parallel": 0},
+            "0 is less than the minimum of 1",
+        ),
+    ]
+
+    for matrix, message in failure_cases:
+        data = {
+            "scripts": [
+                {
+                    "name": "test",
+                    "description": "test",
+                    "command": "echo ${PYTHON}",
+                    "matrix": matrix,
+                },
+            ],
+        }
+
+        exception: ValidationError = None
+        try:
+            validate_pyss_data(data)
+        except ValidationError as e:
+            exception = e
+        assert exception is not None
+        assert exception.message == message
+
+
+def test_fast_check_agrees_with_jsonschema():
+    import pyss._validator
+    from pyss._validator import is_valid_pyss_data
+
+    schema = vars(pyss._validator)["__schema"]
+    validator = vars(pyss._validator)["__jsonschema_validator"]("pyss", schema)
+
+    def is_valid(data) -> bool:
+        # The version format check raises its error itself.
+        try:
+            return validator.is_valid(data)
+        except ValidationError:
+            return False
+
+    script = {"name": "a", "description": "a", "command": "true"}
+    cases = [
+        {"scripts": []},
+        {},
+        {"scripts": [script], "env": {"A": 1}},
+        {"scripts": [script], "env": []},
+        {"scripts": [script], "pyss": {"min_version": "1.0.0", "shell": "bash"}},
+        {"scripts": [script], "pyss": {"min_version": "1.0"}},
+        {"scripts": [script], "pyss": {"shell": {"linux": "bash", "win32": "cmd"}}},
+        {"scripts": [script], "pyss": {"include": ["a.yaml", {"path": "b.yaml"}]}},
+        {"scripts": [script], "pyss": {"include": [{"scripts": ["a"]}]}},
+        {"scripts": [script], "workspace": {"members": ["packages/*"]}},
+        {"scripts": [script], "workspace": {}},
+        {"scripts": [{"name": "a", "command": "true"}]},
+        {"scripts": [{"name": "a", "internal": True, "command": "true"}]},
+        {"scripts": [{"name": "a", "description": "a"}]},
+        {"scripts": [{"name": "a", "extends": "b"}]},
+        {"scripts": [{"name": "a", "extends": "b", "command": "x", "commands": []}]},
+        {"scripts": [{**script, "commands": ["true"]}]},
+        {"scripts": [{**script, "command": {"cmd": "true", "shell": False}}]},
+        {"scripts": [{**script, "command": {"linux": "true", "darwin": "true"}}]},
+        {"scripts": [{**script, "command": {"cmd": "true", "linux": "true"}}]},
+        {"scripts": [{**script, "command": {"aix": "true"}}]},
+        {"scripts": [{**script, "command": {"cmd": "true", "exec": "yes"}}]},
+        {"scripts": [{**script, "before": "lint", "after": ["a", {"script": "b"}]}]},
+        {"scripts": [{**script, "before": {"command": "x", "env": {}}}]},
+        {"scripts": [{**script, "before": {"command": "x", "commands": ["y"]}}]},
+        {"scripts": [{**script, "before": {"parallel": True, "dependencies": ["a"]}}]},
+        {"scripts": [{**script, "before": {"parallel": 1, "dependencies": ["a"]}}]},
+        {"scripts": [{**script, "before": [{"silent": True}]}]},
+        {"scripts": [{**script, "inputs": ["src/**"], "freshness": "hash"}]},
+        {"scripts": [{**script, "freshness": "content"}]},
+        {"scripts": [{**script, "cache": {"env": ["A"], "replay": False}}]},
+        {"scripts": [{**script, "cache": "yes"}]},
+        {"scripts": [{**script, "matrix": {"env": {"A": [1, "b", True]}}}]},
+        {"scripts": [{**script, "matrix": {"env": {"A": []}}}]},
+        {"scripts": [{**script, "matrix": {"env": {"A": [1]}, "max_parallel": 2}}]},
+        {"scripts": [{**script, "matrix": {"env": {"A": [1]}, "max_parallel": True}}]},
+        {"scripts": [{**script, "matrix": {"env": {"A": [1]}, "exclude": [{"A": 1}]}}]},
+        {"scripts": [{**script, "session": "yes"}]},
+        {"scripts": [{**script, "estimate": "1m30s"}]},
+        {"scripts": [{**script, "estimate": 90}]},
+        {"scripts": [{**script, "estimate": -1}]},
+        {"scripts": [{**script, "estimate": True}]},
+        {"scripts": [{**script, "estimate": "soon"}]},
+    ]
+
+    for case in cases:
+        assert is_valid_pyss_data(case) == is_valid(case), case
@@ -0,0 +1,57 @@
+import json
+
+import yaml
+
+from pyss._scripts import find_pyss_file, load_pyss_file, get_scripts
+
+PYSS_YAML = """
+scripts:
+  - name: greet
+    description: Says hello.
+    command: echo hello
+"""
+
+PYPROJECT_TOML = """
+[project]
+name = "example"
+
+[tool.pyss.pyss]
+min_version = "0.0.1"
+
+[[tool.pyss.scripts]]
+name = "greet"
+description = "Says hello."
+command = "echo hello"
+"""
+
+
+def __names(file_location: str) -> list[str]:
+    scripts = get_scripts(load_pyss_file(file_location, use_cache=False))
+    return [script["name"] for script in scripts]
+
+
+def test_config_formats(tmp_path):
+    project = tmp_path / "project"
+    (project / "src").mkdir(parents=True)
+
+    # A pyproject.toml without a [tool.pyss] table is not a configuration.
+    (tmp_path / "pyproject.toml").write_text("[project]\nname = 'root'\n")
+    assert find_pyss_file(str(project / "src")) != str(tmp_path / "pyproject.toml")
+
+    (project / "pyproject.toml").write_text(PYPROJECT_TOML)
+    file_location = find_pyss_file(str(project / "src"))
+    assert file_location == str(project / "pyproject.toml")
+    assert __names(file_location) == ["greet"]
+    assert load_pyss_file(file_location, False).header.min_version == "0.0.1"
+
+    data = yaml.safe_load(PYSS_YAML)
+    (project / "pyss.json").write_text(json.dumps(data))
+    file_location = find_pyss_file(str(project / "src"))
+    assert file_location == str(project / "pyss.json")
+    assert __names(file_location) == ["greet"]
+
+
+def test_yaml_without_libyaml(tmp_path, monkeypatch):
+    (tmp_path / "pyss.yaml").write_text(PYSS_YAML)
+    monkeypatch.delattr(yaml, "CSafeLoader", raising=False)
+    assert __names(str(tmp_path / "pyss.yaml")) == ["greet"]
@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import subprocess
+
+# The time a pyss invocation takes on top of starting the interpreter.
+STARTUP_BUDGET_MS = float(os.environ.get("PYSS_STARTUP_BUDGET_MS", "50"))
+
+HEAVY_MODULES = ["jsonschema", "packaging", "yaml", "sqlite3"]
+
+PYSS_YAML = """
+scripts:
+  - name: greet
+    description: Says hello.
+    command: echo hello
+"""
+
+
+def __env(cwd) -> dict[str, str]:
+    env = dict(os.environ)
+    env["PYSS_CACHE_DIR"] = os.path.join(cwd, ".cache")
+    env["PYSS_DAEMON_SOCKET"] = os.path.join(cwd, "daemon.sock")
+    env.pop("PYSS_HISTORY", None)
+    # Installed packages are compiled, so the modules are not compiled
+    # again by every run.
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def __run_with_importtime(cwd, *arguments) -> tuple[int, dict[str, int]]:
+    proc = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "from pyss.main import main; main()",
+            *arguments,
+        ],
+        cwd=cwd,
+        env=__env(cwd),
+        capture_output=True,
+        text=True,
+    )
+
+    imports = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        imports[name.strip()] = int(cumulative)
+
+    return proc.returncode, imports
+
+
+def __run_ms(cwd, *arguments) -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, *arguments],
+        cwd=cwd,
+        env=__env(cwd),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def __startup_ms(cwd, *arguments) -> float:
+    # The runs alternate so that both are measured under the same load,
+    # and the fastest ones are compared to leave out noise.
+    interpreter, pyss = [], []
+    for _ in range(9):
+        interpreter.append(__run_ms(cwd, "-c", "pass"))
+        pyss.append(__run_ms(cwd, "-m", "pyss.main", *arguments))
+    return min(pyss) - min(interpreter)
+
+
+def __assert_lightweight(cwd, imports: dict[str, int], *arguments):
+    for module in HEAVY_MODULES:
+        assert module not in imports, f"'{module}' was imported during startup"
+
+    # The whole invocation is timed, as in the shell, from which the time
+    # it takes to start the interpreter is taken out.
+    startup_ms = __startup_ms(cwd, *arguments)
+    assert startup_ms <= STARTUP_BUDGET_MS, (
+        f"'pyss {' '.join(arguments)}' took {startup_ms:.1f}ms on top of the "
+        f"interpreter (budget: {STARTUP_BUDGET_MS}ms)"
+    )
+
+
+def test_version_startup(tmp_path):
+    exit_code, imports = __run_with_importtime(str(tmp_path), "--version")
+    assert exit_code == 0
+    __assert_lightweight(str(tmp_path), imports, "--version")
+
+
+def test_warm_startup(tmp_path):
+    with open(tmp_path / "pyss.yaml", "w") as pyss_yaml:
+        pyss_yaml.write(PYSS_YAML)
+
+    # The first run populates the configuration cache.
+    exit_code, _ = __run_with_importtime(str(tmp_path), "greet")
+    assert exit_code == 0
+
+    for arguments in [["--list"], ["greet"]]:
+        exit_code, imports = __run_with_importtime(str(tmp_path), *arguments)
+        assert exit_code == 0
+        __assert_lightweight(str(tmp_path), imports, *arguments)
@@ -0,0 +1,96 @@
+import sys
+import time
+import threading
+
+import pytest
+
+from pyss._plan import Plan
+from pyss._types import PySSFile, Scripts, PyssCfg, Cancellation
+from pyss._execution import run_pyss
+from pyss._watch import watch_patterns, create_watcher, PollingWatcher
+
+
+def __scripts(scripts: list[dict], file_location: str = "pyss.yaml") -> Scripts:
+    return Scripts(PySSFile({"scripts": scripts}, file_location), scripts)
+
+
+def test_watch_patterns():
+    plan = Plan(
+        __scripts(
+            [
+                {
+                    "name": "build",
+                    "description": "build",
+                    "inputs": ["src/**/*.py"],
+                    "watch": ["src/**/*.py", "setup.cfg"],
+                    "before": ["codegen", "echo prepare"],
+                    "command": "echo build",
+                },
+                {
+                    "name": "codegen",
+                    "internal": True,
+                    "inputs": ["schema/*.json", "setup.cfg"],
+                    "command": "echo codegen",
+                },
+            ]
+        )
+    )
+
+    patterns = watch_patterns(plan.resolve("build"))
+    assert sorted(patterns) == ["schema/*.json", "setup.cfg", "src/**/*.py"]
+
+
+@pytest.mark.parametrize("polling", [True, False])
+def test_watcher_detects_changes(tmp_path, monkeypatch, polling):
+    if polling:
+        monkeypatch.setenv("PYSS_WATCH_POLL", "1")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.txt").write_text("a")
+    (tmp_path / "notes.md").write_text("notes")
+    pyss_yaml = tmp_path / "pyss.yaml"
+    pyss_yaml.write_text("scripts: []")
+
+    watcher = create_watcher(str(tmp_path), ["src/**/*.txt"], str(pyss_yaml))
+    if not polling and sys.platform.startswith("linux"):
+        assert type(watcher) is not PollingWatcher
+
+    try:
+        snapshot = watcher.snapshot()
+        assert sorted(snapshot) == [str(pyss_yaml), str(tmp_path / "src" / "a.txt")]
+
+        def change():
+            time.sleep(0.2)
+            (tmp_path / "notes.md").write_text("unrelated")
+            time.sleep(0.2)
+            (tmp_path / "src" / "nested").mkdir()
+            for index in range(50):
+                (tmp_path / "src" / "nested" / f"{index}.txt").write_text("b")
+
+        thread = threading.Thread(target=change)
+        thread.start()
+        current = watcher.wait(snapshot)
+        thread.join()
+
+        # The burst of changes is reported at once.
+        assert len(current) == len(snapshot) + 50
+    finally:
+        watcher.close()
+
+
+def test_cancelled_run(tmp_path):
+    scripts = __scripts(
+        [{"name": "slow", "description": "slow", "commands": ["sleep 30", "exit 0"]}],
+        str(tmp_path / "pyss.yaml"),
+    )
+    cancellation = Cancellation()
+    cfg = PyssCfg(scripts, "slow", quiet=True, disable_output=True)
+
+    timer = threading.Timer(0.5, cancellation.cancel)
+    timer.start()
+    started = time.monotonic()
+    exit_code = run_pyss(cfg.derive(cancellation=cancellation))
+    timer.join()
+
+    assert exit_code != 0
+    assert time.monotonic() - started < 10
+    assert run_pyss(cfg.derive(cancellation=cancellation)) == 1
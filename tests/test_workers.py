@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+import subprocess
+
+import pytest
+
+from pyss._types import PySSFile, Scripts, PyssCfg
+from pyss._workers import Worker, WorkerPool, _is_loopback
+from pyss._execution import run_pyss
+
+pytestmark = pytest.mark.skipif(
+    os.name != "posix", reason="the test workers listen on Unix sockets"
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def __cfg(tmp_path, scripts: list[dict], script_name: str, executor: WorkerPool):
+    pyss_file = PySSFile({"scripts": scripts}, str(tmp_path / "pyss.yaml"))
+    return PyssCfg(
+        Scripts(pyss_file, scripts),
+        script_name,
+        quiet=True,
+        disable_output=True,
+        jobs=4,
+        executor=executor,
+    )
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """
+    Starts two workers in tmp_path, listening on Unix sockets.
+    """
+    env = {**os.environ, "PYTHONPATH": ROOT, "PYSS_WORKER_TOKEN": "secret"}
+    addresses = [f"unix:{tmp_path / name}.sock" for name in ["a", "b"]]
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-m", "pyss.main", "--no-daemon", ":worker", address],
+            cwd=tmp_path,
+            env=env,
+            stdout=subprocess.DEVNULL,
+        )
+        for address in addresses
+    ]
+
+    deadline = time.monotonic() + 10
+    while not all(os.path.exists(address[5:]) for address in addresses):
+        assert time.monotonic() < deadline, "the workers did not start"
+        time.sleep(0.05)
+
+    yield addresses
+
+    for process in processes:
+        process.kill()
+        process.wait()
+
+
+def test_worker_runs_commands(tmp_path, workers):
+    pool = WorkerPool(workers, "secret")
+    stdout, stderr = bytearray(), bytearray()
+    request = {
+        "command": "echo $A $PYSS_WORKER; pwd; echo error >&2; exit 3",
+        "argv": None,
+        "shell": None,
+        "cwd": ".",
+        "env": [{"A": "1"}, {"A": "2"}],
+    }
+
+    assert pool.run(request, stdout.extend, stderr.extend) == 3
+    assert stdout.decode().splitlines() == [f"2 {workers[0]}", str(tmp_path)]
+    assert stderr == b"error\n"
+
+    # Programs are looked up on the worker, which falls back to a shell.
+    tool = tmp_path / "tool"
+    tool.write_text("#!/bin/sh\necho tool\n")
+    tool.chmod(0o755)
+    for program, exit_code, output in [
+        ("./tool", 0, b"tool\n"),
+        ("./missing", 127, b""),
+    ]:
+        stdout.clear()
+        stderr.clear()
+        direct = {**request, "command": program, "argv": [program], "resolve": True}
+        assert pool.run(direct, stdout.extend, stderr.extend) == exit_code
+        assert stdout == output
+    # The shell, rather than the worker, reports the missing program.
+    assert b"not found" in stderr
+
+    # Commands from clients without the token, or with a working directory
+    # outside the root of the worker, are refused.
+    assert WorkerPool(workers).run(request, stdout.extend, stderr.extend) == 1
+    assert pool.run({**request, "cwd": ".."}, stdout.extend, stderr.extend) == 1
+
+
+def test_run_on_workers(tmp_path, workers):
+    pool = WorkerPool(workers, "secret")
+    scripts = [
+        {
+            "name": "shards",
+            "description": "shards",
+            "command": "true",
+            "before": {
+                "parallel": True,
+                "dependencies": [
+                    {"command": f"sleep 0.5; echo $PYSS_WORKER > shard-{n}.txt"}
+                    for n in range(4)
+                ],
+            },
+        },
+        {
+            "name": "die",
+            "description": "die",
+            # Kills the first worker, so the command runs again on the other.
+            "command": f'if [ "$PYSS_WORKER" = "{workers[0]}" ]; then kill -9 $PPID; '
+            "sleep 5; else echo $PYSS_WORKER > die.txt; fi",
+        },
+    ]
+
+    assert run_pyss(__cfg(tmp_path, scripts, "shards", pool)) == 0
+    shards = {(tmp_path / f"shard-{n}.txt").read_text().strip() for n in range(4)}
+    assert shards == set(workers)
+
+    assert run_pyss(__cfg(tmp_path, scripts, "die", pool)) == 0
+    assert (tmp_path / "die.txt").read_text().strip() == workers[1]
+    assert pool.unavailable == {workers[0]}
+
+
+def test_worker_requires_token_on_reachable_addresses(tmp_path):
+    assert _is_loopback("127.0.0.1:7341")
+    assert _is_loopback("[::1]:7341")
+    assert _is_loopback(f"unix:{tmp_path / 'worker.sock'}")
+    assert not _is_loopback("0.0.0.0:7341")
+    assert not _is_loopback(":7341")
+
+    with pytest.raises(ValueError, match="without a token"):
+        Worker("0.0.0.0:0", str(tmp_path)).serve()
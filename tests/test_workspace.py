@@ -0,0 +1,76 @@
+from pyss._scripts import load_pyss_file
+from pyss._workspace import find_workspace, workspace_members, run_workspace
+
+
+def __write(path, content: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+def __member(tmp_path, path: str, command: str):
+    __write(
+        tmp_path / path / "pyss.yaml",
+        "scripts:\n"
+        "  - name: test\n"
+        "    description: test\n"
+        f"    command: '{command}'\n",
+    )
+
+
+def test_workspace_members(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYSS_CACHE_DIR", str(tmp_path / "cache"))
+    __write(
+        tmp_path / "repo" / "pyss.yaml",
+        "workspace:\n  members: ['packages/*', 'tools/**']\nscripts: []\n",
+    )
+    __member(tmp_path, "repo/packages/a", "true")
+    __member(tmp_path, "repo/tools/lint/ruff", "true")
+    (tmp_path / "repo" / "packages" / "empty").mkdir()
+
+    assert find_workspace(str(tmp_path / "repo" / "packages" / "a")) is not None
+    root = load_pyss_file(str(tmp_path / "repo" / "pyss.yaml"))
+
+    members = workspace_members(root)
+    assert [member.path for member in members] == ["packages/a", "tools/lint/ruff"]
+    assert members[0].scripts == ["test"]
+
+    # New members and changed configurations are picked up from the index.
+    __member(tmp_path, "repo/packages/empty", "true")
+    __write(
+        tmp_path / "repo" / "packages" / "a" / "pyss.yaml",
+        "scripts:\n  - name: build\n    description: build\n    command: 'true'\n",
+    )
+    members = workspace_members(root)
+    assert [member.path for member in members] == [
+        "packages/a",
+        "packages/empty",
+        "tools/lint/ruff",
+    ]
+    assert members[0].scripts == ["build"]
+
+
+def test_run_workspace(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYSS_CACHE_DIR", str(tmp_path / "cache"))
+    __write(
+        tmp_path / "pyss.yaml",
+        "workspace:\n  members: ['packages/*', 'services/*']\nscripts: []\n",
+    )
+    __member(tmp_path, "packages/a", "pwd > out.txt")
+    __member(tmp_path, "packages/b", "exit 3")
+    __member(tmp_path, "services/api", "pwd > out.txt")
+    root = load_pyss_file(str(tmp_path / "pyss.yaml"))
+
+    options = dict(quiet=True, disable_output=True, jobs=4)
+    assert run_workspace(root, "test", ["services/*"], **options) == 0
+    assert (tmp_path / "services" / "api" / "out.txt").read_text().strip() == str(
+        tmp_path / "services" / "api"
+    )
+    assert not (tmp_path / "packages" / "a" / "out.txt").exists()
+
+    # Every member runs, in its own directory, even if one of them fails.
+    assert run_workspace(root, "test", **options) == 3
+    assert (tmp_path / "packages" / "a" / "out.txt").read_text().strip() == str(
+        tmp_path / "packages" / "a"
+    )
+
+    assert run_workspace(root, "missing", **options) == 1